@@ -11,33 +11,31 @@ import tempfile
 import os
 import re
 from datetime import datetime
-from cortex_xml_parser import parse_cortex_xml
+from cortex_xml_parser import parse_cortex_xml_frame, build_csv_filename
+from cpet_logging import configure_logging, env_config
 
 # ════════════════════════════════════════════════════════
-# LAZY ENGINE LOADING (deferred to avoid HF health check timeout)
+# SILNIK — import lekki (scipy / matplotlib / report ładowane przy pierwszym użyciu,
+# patrz bench_import.py), więc nie trzeba go odkładać przed health checkiem
 # ════════════════════════════════════════════════════════
 
-_engine_loaded = False
-
-def _load_engine():
-    global _engine_loaded
-    if _engine_loaded:
-        return
-    import engine_core as ec
-    globals()['AnalysisConfig'] = ec.AnalysisConfig
-    globals()['LactateInput'] = ec.LactateInput
-    globals()['RAW_PROTOCOLS'] = ec.RAW_PROTOCOLS
-    globals()['compile_protocol_for_apply'] = ec.compile_protocol_for_apply
-    globals()['CPET_Orchestrator'] = ec.CPET_Orchestrator
-    # Compile protocols
-    for pname, psegs in ec.RAW_PROTOCOLS.items():
-        try:
-            PROTOCOLS_DB[pname] = ec.compile_protocol_for_apply(psegs)
-        except Exception:
-            pass
-    _engine_loaded = True
+import engine_core as ec
+from engine_core import (AnalysisConfig, LactateInput, RAW_PROTOCOLS,
+                         compile_protocol_for_apply, CPET_Orchestrator)
+
+# logi pipeline'u (CPET_LOG_LEVEL / CPET_LOG_JSON) — konfiguruje aplikacja, nie import silnika
+configure_logging(**env_config())
+
+# pandas Copy-on-Write dla całej aplikacji (aliasy kolumn bez kopii danych) —
+# włączane tutaj, w punkcie wejścia; sam import engine_core trybu nie zmienia
+ec.enable_copy_on_write()
 
 PROTOCOLS_DB = {}
+for _pname, _psegs in RAW_PROTOCOLS.items():
+    try:
+        PROTOCOLS_DB[_pname] = compile_protocol_for_apply(_psegs)
+    except Exception:
+        pass
 
 # ════════════════════════════════════════════════════════
 # KONFIGURACJA STRONY
@@ -151,20 +149,20 @@ with st.sidebar:
     )
 
     auto_info = {}
-    _csv_tmp_from_xml = None
+    _xml_df, _xml_meta = None, None
     if uploaded_file is not None:
-        # ── XML → CSV conversion (Cortex MetaSoft) ──
+        # ── XML → DataFrame (Cortex MetaSoft), no intermediate CSV ──
         _is_xml = uploaded_file.name.lower().endswith('.xml')
         if _is_xml:
             try:
                 with tempfile.NamedTemporaryFile(suffix='.xml', delete=False, mode='wb') as _xf:
                     _xf.write(uploaded_file.getvalue())
                     _xml_tmp = _xf.name
-                _csv_tmp_from_xml = parse_cortex_xml(_xml_tmp, tempfile.gettempdir())
-                st.success("✅ XML Cortex → CSV skonwertowany automatycznie")
+                _xml_df, _xml_meta, _ = parse_cortex_xml_frame(_xml_tmp, streaming=True)
+                _xml_name = build_csv_filename(uploaded_file.name, _xml_meta)
+                st.success("✅ XML Cortex wczytany automatycznie")
                 # Auto-extract spirometry from XML header
                 try:
-                    from engine_core import CPET_Orchestrator
                     _spiro_from_xml = CPET_Orchestrator.extract_spirometry_from_xml(_xml_tmp)
                     if _spiro_from_xml:
                         st.session_state['_xml_spirometry'] = _spiro_from_xml
@@ -177,9 +175,8 @@ with st.sidebar:
                 st.stop()
 
         try:
-            if _csv_tmp_from_xml:
-                df_preview = pd.read_csv(_csv_tmp_from_xml, nrows=2)
-                auto_info = auto_extract_from_csv(df_preview, os.path.basename(_csv_tmp_from_xml))
+            if _xml_df is not None:
+                auto_info = auto_extract_from_csv(_xml_df.head(2), _xml_name)
             else:
                 df_preview = pd.read_csv(uploaded_file, nrows=2)
                 uploaded_file.seek(0)
@@ -246,7 +243,7 @@ with st.sidebar:
         kinetics_speeds = [ks1, ks2, ks3, ks4]
 
     # ── Interactive protocol chart ──
-    if protocol not in ("AUTO", "KINETICS") and _engine_loaded:
+    if protocol not in ("AUTO", "KINETICS"):
         _raw_segs = ec.RAW_PROTOCOLS.get(protocol, [])
         if _raw_segs:
             _chart_t, _chart_v, _chart_label = [], [], []
@@ -470,14 +467,10 @@ st.markdown(f"""
 
 if st.button("🚀 START — Uruchom analizę CPET", type="primary", use_container_width=True):
 
-    with st.spinner("⏳ Ładuję silnik analityczny..."):
-        _load_engine()
-
     with st.spinner("⏳ Analizuję dane CPET..."):
 
-        if _csv_tmp_from_xml:
-            tmp_path = _csv_tmp_from_xml
-        else:
+        tmp_path = None
+        if _xml_df is None:
             with tempfile.NamedTemporaryFile(suffix='.csv', delete=False, mode='wb') as tmp:
                 tmp.write(uploaded_file.getvalue())
                 tmp_path = tmp.name
@@ -520,16 +513,33 @@ if st.button("🚀 START — Uruchom analizę CPET", type="primary", use_contain
                     RAW_PROTOCOLS[protocol], t_stop_manual
                 )
 
-            import engine_core
-            engine_core.PROTOCOLS_DB = PROTOCOLS_DB
-
-            app = CPET_Orchestrator(config)
+            ec.PROTOCOLS_DB = PROTOCOLS_DB
 
-            if lactate_data:
-                app._lactate_input = LactateInput(manual_data=lactate_data)
+            _lactate_input = LactateInput(manual_data=lactate_data) if lactate_data else None
 
+            # Ten sam plik i ustawienia, zmienione tylko progi VT / laktaty → reanalyze
+            # (bez preprocessingu; silniki o niezmienionych wejściach z memo)
+            import hashlib
+            _run_key = (
+                hashlib.sha1(uploaded_file.getvalue()).hexdigest(),
+                repr(sorted((k, v) for k, v in vars(config).items()
+                            if k not in CPET_Orchestrator.INCREMENTAL_INPUTS)),
+            )
+            app = st.session_state.get("cpet_orchestrator")
             progress = st.progress(0, text="Uruchamiam pipeline...")
-            results = app.process_file(tmp_path)
+            if app is not None and st.session_state.get("cpet_orchestrator_key") == _run_key:
+                results = app.reanalyze(vt1_manual=config.vt1_manual, vt2_manual=config.vt2_manual,
+                                        lactate_input=_lactate_input)
+            else:
+                app = CPET_Orchestrator(config)
+                app._lactate_input = _lactate_input
+                if _xml_df is not None:
+                    results = app.process_frame(_xml_df, _xml_meta)
+                else:
+                    results = app.process_file(tmp_path)
+                _ok = isinstance(results, dict) and "html_report" in results
+                st.session_state["cpet_orchestrator"] = app if _ok else None
+                st.session_state["cpet_orchestrator_key"] = _run_key if _ok else None
             progress.progress(100, text="✅ Analiza zakończona!")
 
             if isinstance(results, dict) and "html_report" in results:
@@ -587,7 +597,8 @@ if st.button("🚀 START — Uruchom analizę CPET", type="primary", use_contain
                 st.code(traceback.format_exc())
         finally:
             try:
-                os.unlink(tmp_path)
+                if tmp_path:
+                    os.unlink(tmp_path)
             except Exception:
                 pass
 
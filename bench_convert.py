@@ -0,0 +1,116 @@
+"""
+bench_convert.py — Cortex cell conversion vs column-by-column to_numeric
+========================================================================
+Checks that ``cortex_xml_parser._convert_types`` (one bulk parse of the
+whole cell block) gives the same dtypes and the same bits as the previous
+per-column ``pd.to_numeric(errors='coerce')`` conversion — on edge cases
+(trailing empty cells, '-' placeholders, True/False text, '-0', decimal
+commas, stray text) and on synthetic BxB blocks — and times both.
+
+Usage:
+    python bench_convert.py           # exit code 1 on any mismatch
+"""
+
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from cortex_xml_parser import _convert_types
+
+SKIP = ("Time_str", "Faza", "Marker")
+
+# single value column each (+ one text column, as in a real export)
+EDGE_CASES = {
+    "trailing empty": ["1", "2", ""],
+    "dash + trailing empty": ["-", "-", ""],
+    "all empty": ["", "", ""],
+    "bool text": ["True", "False", "True"],
+    "negative zero": ["-0", "-", "0", "1"],
+    "decimal comma": ["1,5", "-2,25", "-", "3"],
+    "stray text": ["1", "x", "2,5"],
+    "single row empty": [""],
+}
+
+
+def convert_reference(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-column implementation (_convert_types before the bulk parse)."""
+    df = df.copy()
+    for col in df.columns:
+        if col in SKIP:
+            continue
+        s = df[col].replace("-", np.nan).replace("", np.nan)
+        if s.dtype == object:
+            s = s.str.replace(",", ".", regex=False)
+        df[col] = pd.to_numeric(s, errors="coerce")
+    return df
+
+
+def make_block(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {"Time_str": [f"0:{i // 60:02d}:{i % 60:02d}" for i in range(n)]}
+    for j in range(30):
+        v = np.round(rng.normal(100 * (j + 1), 10, n), j % 4)
+        cells = [f"{x:.{j % 4}f}".replace(".", ",") if j % 3 == 0 else f"{x:.{j % 4}f}" for x in v]
+        for k in np.flatnonzero(rng.random(n) < 0.05):
+            cells[k] = "-"
+        data[f"C{j}"] = cells
+    data["Marker"] = [""] * n
+    return pd.DataFrame(data)
+
+
+def same(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    if list(a.columns) != list(b.columns) or list(a.dtypes) != list(b.dtypes):
+        return False
+    for c in a.columns:
+        x, y = a[c].to_numpy(), b[c].to_numpy()
+        if x.dtype.kind == "f":
+            if not np.array_equal(x.view(np.int64), y.view(np.int64)):
+                return False
+        elif not np.array_equal(x, y):
+            return False
+    return True
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> int:
+    warnings.simplefilter("ignore", FutureWarning)   # pandas replace() downcasting notice
+    bad = 0
+    for name, cells in EDGE_CASES.items():
+        df = pd.DataFrame({"Time_str": ["0:00:00"] * len(cells), "V": cells})
+        for frame in (df, df[["V"]]):
+            try:
+                ok = same(_convert_types(frame), convert_reference(frame))
+            except Exception as e:  # noqa: BLE001 — a crash is a mismatch
+                print(f"  ERROR {name}: {type(e).__name__}: {e}")
+                ok = False
+            if not ok:
+                print(f"  MISMATCH edge case: {name} ({list(frame.columns)})")
+                bad += 1
+
+    print(f"{'rows':>8} {'per-col ms':>11} {'bulk ms':>8} {'x':>6}  match")
+    for n in (600, 3000, 20000):
+        df = make_block(n, seed=n)
+        ok = same(_convert_types(df), convert_reference(df))
+        bad += 0 if ok else 1
+        t_ref = best_of(lambda: convert_reference(df), 3)
+        t_new = best_of(lambda: _convert_types(df), 3)
+        print(f"{n:>8} {t_ref * 1e3:>11.1f} {t_new * 1e3:>8.1f} {t_ref / t_new:>6.1f}  "
+              f"{'OK' if ok else 'MISMATCH'}")
+
+    print("identical to per-column to_numeric: " + ("OK" if bad == 0 else f"{bad} mismatch(es)"))
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
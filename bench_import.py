@@ -0,0 +1,106 @@
+"""
+bench_import.py — Cold-start import cost of engine_core
+=======================================================
+Imports ``engine_core`` in fresh interpreters (``python -X importtime``) and
+fails when cold start regresses:
+
+- modules that must load on first use only (scipy, matplotlib, report
+  rendering, E22, XML parser) are already in ``sys.modules`` after
+  ``import engine_core``,
+- the median import cost of engine_core *on top of* numpy + pandas (which the
+  pipeline needs anyway and whose cost depends on the machine and versions)
+  exceeds ``--budget-ms``.
+
+Bytecode caches are written by one warm-up import first (PYTHONDONTWRITEBYTECODE
+is dropped for the child processes), so the numbers match a container that
+ships ``__pycache__`` and not the one-off compile of a 15k-line module.
+
+Usage:
+    python bench_import.py                    # exit code 1 on regression
+    python bench_import.py --runs 9 --budget-ms 200
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+MODULE = "engine_core"
+BASE_MODULES = ("numpy", "pandas")
+# heavy dependencies that engine_core must load lazily (first use)
+LAZY_PREFIXES = ("scipy", "matplotlib", "report", "e22_cross_correlation", "cortex_xml_parser")
+DEFAULT_BUDGET_MS = 250.0
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+
+def _env():
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    here = os.path.dirname(os.path.abspath(__file__))
+    env["PYTHONPATH"] = here + (os.pathsep + env["PYTHONPATH"] if env.get("PYTHONPATH") else "")
+    return env
+
+
+def importtime(module: str = MODULE):
+    """One fresh interpreter → (cumulative µs of module, {direct import: cumulative µs}, loaded modules)."""
+    code = f"import {module}; import sys, json; print(json.dumps(sorted(sys.modules)))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, env=_env(), check=True)
+    children, total = {}, 0
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        depth = len(m.group(3)) // 2          # importtime indents 2 spaces per level
+        if depth == 1:                        # direct import of the top-level module being timed
+            children[m.group(4)] = int(m.group(2))
+        elif depth == 0:
+            if m.group(4) == module:
+                total = int(m.group(2))
+                break
+            children = {}                     # interpreter start-up imports (site, encodings, ...)
+    return total, children, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--runs", type=int, default=5, help="timed fresh-interpreter imports (median)")
+    ap.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                    help="max engine_core import cost on top of numpy + pandas")
+    args = ap.parse_args(argv)
+
+    importtime()                                   # warm-up: write __pycache__
+    total, own, loaded = [], [], set()
+    for _ in range(max(1, args.runs)):
+        t, children, modules = importtime()
+        base = sum(children.get(m, 0) for m in BASE_MODULES)
+        total.append(t / 1000.0)
+        own.append((t - base) / 1000.0)
+        loaded.update(modules)
+    rest = sorted(((v, k) for k, v in children.items() if k not in BASE_MODULES), reverse=True)
+
+    med_total, med_own = statistics.median(total), statistics.median(own)
+    print(f"import {MODULE}: {med_total:7.1f} ms total, {med_own:7.1f} ms on top of "
+          f"{' + '.join(BASE_MODULES)} (median of {len(total)}, budget {args.budget_ms:.0f} ms)")
+    print("  largest direct imports: " + ", ".join(f"{k} {v / 1000:.1f} ms" for v, k in rest[:5]))
+
+    eager = sorted(m for m in loaded if m.split(".")[0] in LAZY_PREFIXES)
+    fail = 0
+    if eager:
+        roots = sorted({m.split(".")[0] for m in eager})
+        print(f"  FAIL loaded eagerly (must be first-use imports): {', '.join(roots)}")
+        fail += 1
+    if med_own > args.budget_ms:
+        print(f"  FAIL import cost {med_own:.1f} ms > budget {args.budget_ms:.0f} ms")
+        fail += 1
+    if not fail:
+        print("  OK")
+    return 1 if fail else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
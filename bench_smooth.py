@@ -0,0 +1,119 @@
+"""
+bench_smooth.py — DataTools.smooth vs pandas rolling median
+===========================================================
+Checks that ``DataTools.rolling_median_centered`` (used by
+``DataTools.smooth``) reproduces
+``rolling(window, min_periods=1, center=True).median()`` bit for bit and
+times both on synthetic breath-by-breath frames (irregular dt, NaN gaps or
+none, odd/even windows, window longer than the test).
+
+Usage:
+    python bench_smooth.py            # exit code 1 on any mismatch
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from engine_core import AnalysisConfig, DataTools
+
+MAIN_COLS = [
+    "VO2_mlmin", "VCO2_mlmin", "VE_Lmin", "HR_bpm", "RER", "O2Pulse",
+    "PetCO2_mmHg", "PetO2_mmHg", "Speed_kmh", "Power_W",
+]
+HEAVY_COLS = ["FAT_g_min", "CHO_g_min", "SmO2_pct", "Lactate_mmol"]
+
+
+def make_frame(n: int, seed: int = 0, nan_frac: float = 0.03) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    t = np.cumsum(rng.uniform(1.5, 4.0, n))
+    data = {"Time_sec": t}
+    for j, c in enumerate(MAIN_COLS + HEAVY_COLS):
+        v = 100.0 * (j + 1) + np.linspace(0, 50, n) + rng.normal(0, 5, n)
+        v = np.round(v, 2)
+        v[rng.random(n) < nan_frac] = np.nan
+        data[c] = v
+    data["Lactate_mmol"][:] = np.nan
+    data["Lactate_mmol"][:: max(1, n // 8)] = np.round(rng.uniform(1, 10, len(range(0, n, max(1, n // 8)))), 1)
+    return pd.DataFrame(data)
+
+
+def smooth_reference(df: pd.DataFrame, cfg) -> pd.DataFrame:
+    """Per-column pandas implementation (DataTools.smooth before the multi-column engine)."""
+    out = df.sort_values("Time_sec").reset_index(drop=True)
+    t = pd.to_numeric(out["Time_sec"], errors="coerce")
+    dt = float(np.nanmedian(np.diff(t))) if len(t) > 2 else np.nan
+    if not np.isfinite(dt) or dt <= 0:
+        dt = 1.0
+    win_main = max(3, int(round(float(cfg.smooth_seconds) / dt)))
+    win_heavy = max(win_main, int(round(float(cfg.fatcho_smooth_seconds) / dt)))
+    for cols, win in ((MAIN_COLS, win_main), (HEAVY_COLS, win_heavy)):
+        for c in cols:
+            s = pd.to_numeric(out[c], errors="coerce")
+            out[c] = s.rolling(window=win, min_periods=1, center=True).median()
+    return out
+
+
+def same_bits(a: np.ndarray, b: np.ndarray) -> bool:
+    a = np.ascontiguousarray(a, dtype=np.float64)
+    b = np.ascontiguousarray(b, dtype=np.float64)
+    return a.shape == b.shape and np.array_equal(a.view(np.int64), b.view(np.int64))
+
+
+def check_kernel(rng) -> int:
+    """Random arrays × windows 1..40 (incl. window > n, ties, ±0), compared column by column."""
+    bad = 0
+    for n in (0, 1, 2, 5, 17, 200):
+        for w in (1, 2, 3, 4, 7, 8, 25, 40):
+            X = rng.normal(0, 1, (n, 3)).round(1)
+            X[:, 1] = rng.choice([-0.0, 0.0, 1.0, -1.0], n)  # remisy i ±0
+            X[rng.random((n, 3)) < 0.25] = np.nan
+            if n:
+                X[: n // 3, 2] = np.nan  # długa dziura
+            got = DataTools.rolling_median_centered(X, w)
+            for j in range(3):
+                ref = pd.Series(X[:, j]).rolling(w, min_periods=1, center=True).median().to_numpy()
+                if not same_bits(got[:, j], ref):
+                    print(f"  MISMATCH kernel n={n} w={w} col={j}")
+                    bad += 1
+    return bad
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> int:
+    bad = check_kernel(np.random.default_rng(42))
+
+    print(f"{'rows':>8} {'smooth s':>9} {'fatcho s':>9} {'NaN %':>6} {'pandas ms':>10} {'new ms':>8} {'x':>6}  match")
+    for n, smooth_s, fatcho_s, nan_frac in ((600, 15, 60, 0.03), (3000, 15, 60, 0.03), (3000, 20, 90, 0.03),
+                                            (20000, 15, 60, 0.03), (20000, 15, 60, 0.0)):
+        cfg = AnalysisConfig()
+        cfg.smooth_seconds = smooth_s
+        cfg.fatcho_smooth_seconds = fatcho_s
+        df = make_frame(n, seed=n, nan_frac=nan_frac)
+
+        ref = smooth_reference(df, cfg)
+        got = DataTools.smooth(df, cfg)
+        ok = all(same_bits(got[c].to_numpy(), ref[c].to_numpy()) for c in MAIN_COLS + HEAVY_COLS)
+        bad += 0 if ok else 1
+
+        t_ref = best_of(lambda: smooth_reference(df, cfg))
+        t_new = best_of(lambda: DataTools.smooth(df, cfg))
+        print(f"{n:>8} {smooth_s:>9} {fatcho_s:>9} {100 * nan_frac:>6.0f} {t_ref * 1e3:>10.1f} {t_new * 1e3:>8.1f} "
+              f"{t_ref / t_new:>6.1f}  {'OK' if ok else 'MISMATCH'}")
+
+    print("bit-for-bit: " + ("OK" if bad == 0 else f"{bad} mismatch(es)"))
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+block_bootstrap.py — Moving-block resampling shared by the CI estimators
+========================================================================
+Breath-by-breath residuals are autocorrelated (smoothing, breathing
+pattern), so the uncertainty estimators resample them in moving blocks of
+consecutive rows instead of row by row:
+
+- ``vt_bootstrap``  — VT1/VT2 CIs (E02),
+- ``kinetics_fit``  — Monte Carlo τ CIs (E14).
+
+Both import the helpers from here, so a change to one estimator cannot
+silently change the resampling of the other.
+
+Usage:
+    block = block_rows(block_sec=30.0, dt=1.0)
+    idx = block_indices(len(resid), block, np.random.default_rng(seed))
+    y_b = trend + resid[idx]
+"""
+
+import numpy as np
+
+
+def block_rows(block_sec: float, dt: float) -> int:
+    """Block length in rows for a block of ``block_sec`` seconds at sampling step ``dt`` (≥ 1)."""
+    if not np.isfinite(dt) or dt <= 0:
+        return 1
+    return max(1, int(round(float(block_sec) / dt)))
+
+
+def block_indices(n: int, block: int, rng: np.random.Generator) -> np.ndarray:
+    """Moving-block bootstrap row indices (length n, blocks of ``block`` consecutive rows)."""
+    block = int(min(max(1, block), max(1, n)))
+    n_blocks = -(-n // block)
+    starts = rng.integers(0, n - block + 1, n_blocks)
+    return (starts[:, None] + np.arange(block)).ravel()[:n]
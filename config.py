@@ -6,6 +6,30 @@ import pandas as pd
 from dataclasses import dataclass, field
 from typing import Optional, Union, Dict, List, Tuple
 
+# Copy-on-Write (domyślne od pandas 3.0): płytkie kopie i kolumny-aliasy
+# współdzielą bufory aż do pierwszego zapisu — kanoniczna ramka trzyma
+# każdy sygnał raz (patrz DataTools.canonicalize / apply_global_aliases).
+# Import NIE zmienia trybu pandas w procesie: CoW włączają punkty wejścia
+# (app.py, cpet_batch) przez enable_copy_on_write() — wymagane dla oszczędności
+# pamięci. Bez CoW cow_copy() robi pełne kopie (jak wcześniej), wyniki te same.
+def copy_on_write_enabled() -> bool:
+    """Czy pandas Copy-on-Write jest aktywne (pandas ≥ 3.0 — zawsze)."""
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    return pd.get_option("mode.copy_on_write") is True
+
+
+def enable_copy_on_write() -> None:
+    """Włącza Copy-on-Write dla całego procesu — wywoływać w punktach wejścia, nie w bibliotece."""
+    if not copy_on_write_enabled():
+        pd.set_option("mode.copy_on_write", True)
+
+
+def cow_copy(obj):
+    """Kopia ramki/serii: płytka przy CoW (bufory do pierwszego zapisu), pełna bez CoW."""
+    return obj.copy(deep=not copy_on_write_enabled())
+
+
 @dataclass
 class AnalysisConfig:
     # --- USTAWIENIA ANALIZY ---
@@ -46,6 +70,10 @@ class AnalysisConfig:
     # --- KONTEKST ---
     notes: str = ""
 
+    # --- WYGŁADZANIE (DataTools.smooth, E02) ---
+    smooth_mode: str = "rows"             # "rows" (okno z mediany dt) | "time" (okno na osi Time_sec)
+    resample_dt: Optional[float] = None   # krok siatki jednorodnej [s] po wygładzeniu (None = bez)
+
     @property
     def t_stop_seconds(self) -> Optional[float]:
         return parse_time_str(self.force_manual_t_stop)
@@ -9,6 +9,13 @@ Usage:
     csv_path = parse_cortex_xml("input.xml", output_dir="/tmp")
     # → returns path to the generated CSV
 
+    # or in memory, without the CSV round-trip
+    from cortex_xml_parser import parse_cortex_xml_frame
+    df, meta, summary = parse_cortex_xml_frame("input.xml")
+
+    # long recordings: single-pass iterparse, rows cleared as they are read
+    csv_path = parse_cortex_xml("input.xml", output_dir="/tmp", streaming=True)
+
 XML Structure (SpreadsheetML format):
     - Rows 0-20:    Facility header
     - Rows 21-32:   Patient data (name, sex, DOB, etc.)
@@ -27,6 +34,8 @@ The parser extracts:
 """
 
 import xml.etree.ElementTree as ET
+import csv
+import io
 import pandas as pd
 import numpy as np
 import re
@@ -42,6 +51,10 @@ from typing import Dict, Any, Optional, Tuple
 
 NS = '{urn:schemas-microsoft-com:office:spreadsheet}'
 
+# Bump when the produced frame changes (columns, dtypes, values);
+# invalidates frame_cache entries built from older parser output.
+PARSER_VERSION = '1.1'
+
 # XML BxB column → CSV column rename map
 COLUMN_RENAME = {
     't':        'Time_str',
@@ -156,7 +169,7 @@ def _parse_datetime_dmy(s: str) -> Optional[datetime]:
 # MAIN PARSER
 # ═══════════════════════════════════════════════════════════════════════
 
-def parse_cortex_xml(xml_path: str, output_dir: str = None) -> str:
+def parse_cortex_xml(xml_path: str, output_dir: str = None, streaming: bool = False) -> str:
     """
     Parse a Cortex MetaSoft Studio XML export and produce a CPET CSV file.
 
@@ -166,6 +179,10 @@ def parse_cortex_xml(xml_path: str, output_dir: str = None) -> str:
         Path to the .xml file
     output_dir : str, optional
         Directory for output CSV. Defaults to same dir as input.
+    streaming : bool, optional
+        Use the single-pass ``iterparse`` reader (see ``_read_rows_streaming``)
+        instead of building the full ElementTree. Output is identical; peak
+        memory no longer grows with the XML tree of long recordings.
 
     Returns
     -------
@@ -178,24 +195,47 @@ def parse_cortex_xml(xml_path: str, output_dir: str = None) -> str:
         If the XML doesn't contain expected data structures
     """
     xml_path = str(xml_path)
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
+    df, meta, summary = parse_cortex_xml_frame(xml_path, streaming=streaming)
 
-    ws = root.find(f'.//{NS}Worksheet')
-    if ws is None:
-        raise ValueError("No Worksheet found in XML — not a MetaSoft export?")
+    # ── 8. WRITE CSV ─────────────────────────────────────────────────
+    csv_path = _build_output_path(xml_path, output_dir, meta)
+    df.to_csv(csv_path, index=False)
 
-    table = ws.find(f'{NS}Table')
-    rows = table.findall(f'{NS}Row')
+    return csv_path
 
-    # ── 1. EXTRACT PATIENT METADATA ──────────────────────────────────
-    meta = _extract_metadata(rows)
 
-    # ── 2. EXTRACT SUMMARY TABLE (VT1/VT2/Peak) ─────────────────────
-    summary = _extract_summary_table(rows)
+def parse_cortex_xml_frame(xml_path: str, streaming: bool = False
+                           ) -> Tuple[pd.DataFrame, Dict[str, Any], Dict[str, Dict]]:
+    """
+    Parse a Cortex MetaSoft Studio XML export straight into a DataFrame.
 
-    # ── 3. EXTRACT BxB DATA ──────────────────────────────────────────
-    df = _extract_bxb_data(rows)
+    Same columns as the CSV written by ``parse_cortex_xml``, without the
+    text round-trip: numeric columns stay float, empty text cells are NaN
+    (as ``pd.read_csv`` would give). Feed the frame to
+    ``CPET_Orchestrator.process_frame``.
+
+    Returns
+    -------
+    (df, meta, summary)
+        df      — BxB data with derived + broadcast metadata columns
+        meta    — patient/test metadata (see ``_extract_metadata``)
+        summary — summary table (see ``_extract_summary_table``)
+    """
+    xml_path = str(xml_path)
+
+    # ── 1-3. METADATA, SUMMARY TABLE, BxB DATA ───────────────────────
+    if streaming:
+        head, headers, data_rows = _read_rows_streaming(xml_path)
+    else:
+        head = _read_rows(xml_path)
+        headers, data_rows = None, None
+
+    meta = _extract_metadata(head)
+    summary = _extract_summary_table(head)
+    if streaming:
+        df = pd.DataFrame(data_rows, columns=headers)
+    else:
+        df = _extract_bxb_data(head)
 
     # ── 4. RENAME COLUMNS ────────────────────────────────────────────
     # Handle duplicate 'v' column (first = Speed_kmh, second = v_2)
@@ -222,12 +262,113 @@ def parse_cortex_xml(xml_path: str, output_dir: str = None) -> str:
 
     # ── 7. ADD METADATA COLUMNS ──────────────────────────────────────
     df = _add_metadata_columns(df, meta, summary)
+    df = _finalize_dtypes(df)
 
-    # ── 8. WRITE CSV ─────────────────────────────────────────────────
-    csv_path = _build_output_path(xml_path, output_dir, meta)
-    df.to_csv(csv_path, index=False)
+    return df, meta, summary
 
-    return csv_path
+
+# ═══════════════════════════════════════════════════════════════════════
+# ROW READERS (full tree / streaming)
+# ═══════════════════════════════════════════════════════════════════════
+
+# Rows kept in memory by the streaming reader for metadata + summary lookup.
+# Summary header is searched in rows 100-240 and read for 130 rows after it.
+HEAD_ROWS = 400
+
+
+def _read_rows(xml_path: str) -> list:
+    """Parse the whole XML tree and return cell values of every Row."""
+    tree = ET.parse(xml_path)
+    root = tree.getroot()
+
+    ws = root.find(f'.//{NS}Worksheet')
+    if ws is None:
+        raise ValueError("No Worksheet found in XML — not a MetaSoft export?")
+
+    table = ws.find(f'{NS}Table')
+    return [_row_vals(r) for r in table.findall(f'{NS}Row')]
+
+
+def _iter_row_vals(xml_path: str):
+    """Yield cell values of each Row of the first Worksheet via iterparse.
+
+    Every Row is cleared and detached from its Table once read, so the
+    tree never holds more than one row at a time.
+    """
+    in_ws = False
+    table = None
+    for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == f'{NS}Worksheet':
+                in_ws = True
+            elif in_ws and elem.tag == f'{NS}Table':
+                table = elem
+            continue
+
+        if elem.tag == f'{NS}Row' and in_ws:
+            vals = _row_vals(elem)
+            elem.clear()
+            if table is not None:
+                table.remove(elem)
+            yield vals
+        elif elem.tag == f'{NS}Worksheet':
+            return
+
+    if not in_ws:
+        raise ValueError("No Worksheet found in XML — not a MetaSoft export?")
+
+
+def _read_rows_streaming(xml_path: str) -> Tuple[list, list, list]:
+    """
+    Single-pass reader: metadata/summary rows, BxB header and BxB rows.
+
+    Header selection matches ``_find_bxb_header``: a 't' + 'Faza' row in
+    rows 200-300 wins, otherwise the first 't' row (>= 10 cells) from row 100.
+
+    Returns
+    -------
+    (head, headers, data_rows)
+        head      — values of the first HEAD_ROWS rows
+        headers   — BxB column names
+        data_rows — BxB rows padded/truncated to len(headers)
+    """
+    head = []
+    header_idx = None
+    fallback_idx = None
+    headers = None
+    data_rows = []
+
+    def _start_data(idx, header_vals):
+        nonlocal header_idx, headers
+        header_idx = idx
+        headers = header_vals
+        # rows after the header that are already buffered in head
+        for vals in head[idx + 2:]:
+            _append_bxb_row(data_rows, vals, headers)
+
+    for i, vals in enumerate(_iter_row_vals(xml_path)):
+        if i < HEAD_ROWS:
+            head.append(vals)
+
+        if header_idx is None:
+            if i == 300 and fallback_idx is not None:
+                _start_data(fallback_idx, head[fallback_idx])
+            elif 200 <= i < 300 and _is_bxb_header(vals):
+                _start_data(i, vals)
+            elif i >= 100 and fallback_idx is None and _is_bxb_header_fallback(vals):
+                fallback_idx = i
+                if i >= 300:
+                    _start_data(i, vals)
+        elif i >= header_idx + 2:
+            _append_bxb_row(data_rows, vals, headers)
+
+    if header_idx is None and fallback_idx is not None:
+        _start_data(fallback_idx, head[fallback_idx])
+
+    if header_idx is None:
+        raise ValueError("Could not find BxB data header in XML")
+
+    return head, headers, data_rows
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -235,7 +376,7 @@ def parse_cortex_xml(xml_path: str, output_dir: str = None) -> str:
 # ═══════════════════════════════════════════════════════════════════════
 
 def _extract_metadata(rows) -> Dict[str, Any]:
-    """Extract patient and test metadata from the header section."""
+    """Extract patient and test metadata from the header section (row values)."""
     meta = {}
 
     # Scan rows 0-100 for key-value pairs
@@ -272,7 +413,7 @@ def _extract_metadata(rows) -> Dict[str, Any]:
     }
 
     for i in range(min(100, len(rows))):
-        vals = _row_vals(rows[i])
+        vals = rows[i]
         if len(vals) >= 2 and vals[0]:
             key = vals[0].strip()
             value = vals[1].strip() if len(vals) > 1 else ''
@@ -321,7 +462,7 @@ def _extract_summary_table(rows) -> Dict[str, Dict]:
     # Find summary table header row
     header_idx = None
     for i in range(100, min(240, len(rows))):
-        vals = _row_vals(rows[i])
+        vals = rows[i]
         if vals and 'Zmienna' in vals[0]:
             header_idx = i
             break
@@ -329,7 +470,7 @@ def _extract_summary_table(rows) -> Dict[str, Dict]:
     if header_idx is None:
         return summary
 
-    header = _row_vals(rows[header_idx])
+    header = rows[header_idx]
 
     # Map header positions
     col_map = {}
@@ -351,7 +492,7 @@ def _extract_summary_table(rows) -> Dict[str, Dict]:
 
     # Parse variable rows
     for i in range(header_idx + 1, min(header_idx + 130, len(rows))):
-        vals = _row_vals(rows[i])
+        vals = rows[i]
         if not vals or not vals[0]:
             continue
 
@@ -373,45 +514,56 @@ def _extract_summary_table(rows) -> Dict[str, Dict]:
     return summary
 
 
-def _extract_bxb_data(rows) -> pd.DataFrame:
-    """Extract breath-by-breath data starting from the BxB header row."""
+def _is_bxb_header(vals) -> bool:
+    """BxB header: 't' as first cell and 'Faza' as second."""
+    return bool(vals) and vals[0] == 't' and len(vals) > 1 and 'Faz' in vals[1]
+
+
+def _is_bxb_header_fallback(vals) -> bool:
+    return bool(vals) and vals[0] == 't' and len(vals) >= 10
+
+
+def _append_bxb_row(data_rows: list, vals: list, headers: list) -> None:
+    """Append a BxB data row (time in first column), padded to header length."""
+    if not vals or not vals[0]:
+        return
+    # BxB rows have time in first column (contains ':')
+    if ':' not in vals[0]:
+        return
+    # Pad to header length
+    while len(vals) < len(headers):
+        vals.append('')
+    data_rows.append(vals[:len(headers)])
 
+
+def _find_bxb_header(rows) -> Optional[int]:
     # Find BxB header (row with 't' as first cell and 'Faza' as second)
-    header_idx = None
     for i in range(200, min(300, len(rows))):
-        vals = _row_vals(rows[i])
-        if vals and vals[0] == 't' and len(vals) > 1 and 'Faz' in vals[1]:
-            header_idx = i
-            break
+        if _is_bxb_header(rows[i]):
+            return i
 
-    if header_idx is None:
-        # Fallback: look more broadly
-        for i in range(100, len(rows)):
-            vals = _row_vals(rows[i])
-            if vals and vals[0] == 't' and len(vals) >= 10:
-                header_idx = i
-                break
+    # Fallback: look more broadly
+    for i in range(100, len(rows)):
+        if _is_bxb_header_fallback(rows[i]):
+            return i
+
+    return None
 
+
+def _extract_bxb_data(rows) -> pd.DataFrame:
+    """Extract breath-by-breath data starting from the BxB header row."""
+    header_idx = _find_bxb_header(rows)
     if header_idx is None:
         raise ValueError("Could not find BxB data header in XML")
 
-    headers = _row_vals(rows[header_idx])
+    headers = rows[header_idx]
     # Units row is header_idx + 1, skip it
     data_start = header_idx + 2
 
     # Collect data rows
     data_rows = []
     for i in range(data_start, len(rows)):
-        vals = _row_vals(rows[i])
-        if not vals or not vals[0]:
-            continue
-        # BxB rows have time in first column (contains ':')
-        if ':' not in vals[0]:
-            continue
-        # Pad to header length
-        while len(vals) < len(headers):
-            vals.append('')
-        data_rows.append(vals[:len(headers)])
+        _append_bxb_row(data_rows, rows[i], headers)
 
     df = pd.DataFrame(data_rows, columns=headers)
     return df
@@ -421,28 +573,103 @@ def _extract_bxb_data(rows) -> pd.DataFrame:
 # DATA TRANSFORMATION
 # ═══════════════════════════════════════════════════════════════════════
 
+# Cell/row separators for the bulk numeric parse. Both are control
+# characters that XML 1.0 does not allow, so they never occur in cell text.
+_CELL_SEP = '\x1f'
+_ROW_SEP = '\x1e'
+
+
 def _convert_types(df: pd.DataFrame) -> pd.DataFrame:
-    """Convert string columns to numeric where possible."""
+    """Convert string columns to numeric where possible.
+
+    All value columns go through one C-level parse: the cell block is
+    joined into a single buffer, decimal commas are swapped once and
+    ``pd.read_csv`` infers int64/float64 per column ('-'/'' → NaN).
+    Only int/float columns of a parse that kept every row are taken from
+    it; anything else (object or bool columns, a single-column block whose
+    trailing empty row read_csv drops, parser errors) falls back to
+    per-column ``pd.to_numeric``, so results match a column-by-column
+    conversion.
+    """
     skip = {'Time_str', 'Faza', 'Marker'}
 
-    for col in df.columns:
-        if col in skip:
+    pos = [i for i, c in enumerate(df.columns) if c not in skip]
+    if not pos:
+        return df
+
+    block = df.iloc[:, pos]
+    parsed = None
+    if len(df):
+        cells = block.fillna('').astype(str).to_numpy()
+        text = _ROW_SEP.join(_CELL_SEP.join(r) for r in cells.tolist()).replace(',', '.')
+        try:
+            parsed = pd.read_csv(
+                io.StringIO(text), sep=_CELL_SEP, lineterminator=_ROW_SEP,
+                header=None, names=range(len(pos)), na_values=['-'],
+                quoting=csv.QUOTE_NONE, skip_blank_lines=False,
+                float_precision='round_trip',
+            )
+        except (pd.errors.ParserError, ValueError):
+            parsed = None
+        if parsed is not None and len(parsed) != len(df):
+            parsed = None
+
+    cols = {i: df.iloc[:, i] for i in range(df.shape[1])}
+    for k, i in enumerate(pos):
+        if parsed is not None and parsed[k].dtype.kind in 'if':
+            arr = parsed[k].to_numpy()
+            if arr.dtype == np.float64:
+                # int-looking '-0' in a column with NaNs loses its sign in read_csv
+                zero = np.flatnonzero(arr == 0)
+                neg = zero[[c.startswith('-') for c in cells[zero, k]]]
+                if len(neg):
+                    arr = arr.copy()
+                    arr[neg] = -0.0
+            cols[i] = pd.Series(arr, index=df.index)
             continue
         # Replace '-' with NaN, replace comma with dot
-        df[col] = df[col].replace('-', np.nan)
-        df[col] = df[col].replace('', np.nan)
-        if df[col].dtype == object:
-            df[col] = df[col].str.replace(',', '.', regex=False)
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+        s = df.iloc[:, i].replace('-', np.nan).replace('', np.nan)
+        if s.dtype == object:
+            s = s.str.replace(',', '.', regex=False)
+        cols[i] = pd.to_numeric(s, errors='coerce')
 
-    return df
+    out = pd.DataFrame(cols, index=df.index)
+    out.columns = df.columns
+    return out
+
+
+def _parse_time_series(t: pd.Series) -> pd.Series:
+    """Vectorized ``_parse_time_str`` for a column of Cortex time strings.
+
+    Same single-buffer parse as ``_convert_types`` with ':' as the field
+    separator. Anything the fast path cannot type exactly (non-integer
+    h/mm, extra fields, non-string cells) goes through ``_parse_time_str``.
+    """
+    vals = t.tolist()
+    if vals and all(isinstance(v, str) for v in vals):
+        text = _ROW_SEP.join(vals).replace(',', '.').replace(':', _CELL_SEP)
+        try:
+            parts = pd.read_csv(
+                io.StringIO(text), sep=_CELL_SEP, lineterminator=_ROW_SEP,
+                header=None, names=range(3), quoting=csv.QUOTE_NONE,
+                skip_blank_lines=False, float_precision='round_trip',
+            )
+        except (pd.errors.ParserError, ValueError):
+            parts = None
+        if (parts is not None and len(parts) == len(vals)
+                and parts[0].dtype == np.int64 and parts[1].dtype == np.int64
+                and parts[2].dtype == np.float64):
+            sec = parts[0].to_numpy() * 3600 + parts[1].to_numpy() * 60 + parts[2].to_numpy()
+            return pd.Series(sec, index=t.index)
+
+    return t.apply(_parse_time_str)
 
 
 def _add_derived_columns(df: pd.DataFrame, meta: Dict) -> pd.DataFrame:
     """Add computed columns needed by the CPET pipeline."""
 
     # Time_s: parse time string to seconds
-    df['Time_s'] = df['Time_str'].apply(_parse_time_str)
+    df['Time_s'] = _parse_time_series(df['Time_str'])
 
     # VO2 in ml/min (pipeline expects both L/min and ml/min)
     if 'VO2_L_min' in df.columns:
@@ -515,17 +742,35 @@ def _add_metadata_columns(df: pd.DataFrame, meta: Dict, summary: Dict) -> pd.Dat
     return df
 
 
+def _finalize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Give the frame the dtypes a CSV round-trip would: '' → NaN, None-only → float."""
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        s = df[col].replace('', np.nan)
+        if s.isna().all():
+            df[col] = s.astype(float)
+        else:
+            df[col] = s.infer_objects()
+    return df
+
+
 # ═══════════════════════════════════════════════════════════════════════
 # OUTPUT FILE NAMING
 # ═══════════════════════════════════════════════════════════════════════
 
 def _build_output_path(xml_path: str, output_dir: Optional[str], meta: Dict) -> str:
-    """Build standardised CSV filename from metadata."""
+    """Build standardised CSV path from metadata."""
     if output_dir is None:
         output_dir = os.path.dirname(xml_path) or '.'
 
     os.makedirs(output_dir, exist_ok=True)
 
+    return os.path.join(output_dir, build_csv_filename(xml_path, meta))
+
+
+def build_csv_filename(xml_path: str, meta: Dict) -> str:
+    """Standardised CSV filename (no directory) for a parsed export."""
     # Try to build from metadata
     last = meta.get('LastName', '').strip().replace(' ', '_')
     first = meta.get('FirstName', '').strip().replace(' ', '_')
@@ -543,7 +788,7 @@ def _build_output_path(xml_path: str, output_dir: Optional[str], meta: Dict) ->
         base = Path(xml_path).stem
         fname = f"{base}__CPET.csv"
 
-    return os.path.join(output_dir, fname)
+    return fname
 
 
 # ═══════════════════════════════════════════════════════════════════════
@@ -0,0 +1,417 @@
+"""
+cpet_batch.py — Batch re-analysis of CPET exports on a process pool
+====================================================================
+Finds MetaSoft/Cortex XML and CSV exports under the given paths and runs one
+``CPET_Orchestrator.process_file`` per file, each file in a worker process.
+For every test the output tree gets::
+
+    <out>/<relative path of the input>/
+        trainer_canon_flat.json   # flat trainer/canon metrics
+        report.html               # full HTML report (as save_html_report)
+        report_lite.html          # LITE report
+        report.txt                # text report
+        report_kinetics.html      # only for CWR/KINETICS tests
+        profile.json              # only with --profile (engine_profiler)
+        pipeline.log              # pipeline log (console format, --log-level)
+        pipeline.jsonl            # only with --log-json (structured records)
+
+plus ``<out>/batch_summary.jsonl`` (one record per file, appended as files
+finish, so an interrupted run keeps its progress) and
+``<out>/batch_summary.json`` (totals + throughput).
+
+Failure isolation: an exception inside the pipeline is caught in the worker
+and recorded as FAILED. A worker that dies (segfault, OOM kill) breaks the
+pool — the files that were in flight are then re-run one by one, each in its
+own single-worker pool, so only the culprit is recorded as CRASHED and the
+batch continues.
+
+Report failures are not successes: when a requested report cannot be
+rendered (the orchestrator keeps a placeholder and lists the error in
+``report_errors``) the placeholder is not written, the file is recorded as
+OK_WITH_REPORT_ERRORS and listed under ``failed`` in the summary, and the
+batch exits with code 1.
+
+No nested pools: every file already has its own worker process, so the
+in-test process pools (``vt_bootstrap_workers``, ``kinetics_mc_workers``,
+whose default 0 means one process per core) run in-process (= 1) unless
+``--config`` sets them explicitly.
+
+Workers enable pandas Copy-on-Write (``engine_core.enable_copy_on_write``), so
+alias columns of the canonical frame share their source buffers.
+
+Usage:
+    python cpet_batch.py season_2024/ -o out/ -j 8
+    python cpet_batch.py a.xml b.csv -o out/ --protocol RUN_STEP_1KMH --reports html,text
+    python cpet_batch.py season_2024/ -o out/ --config cfg.json --skip-existing
+    python cpet_batch.py season_2024/ -o out/ --profile     # + per-engine timing
+    python cpet_batch.py season_2024/ -o out/ --log-level OFF   # no pipeline diagnostics
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import fields
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cpet_logging import capture, configure_logging, env_config, json_handler, parse_level
+
+INPUT_SUFFIXES = (".xml", ".csv")
+REPORT_KINDS = ("html", "lite", "text", "kinetics")
+SUMMARY_JSONL = "batch_summary.jsonl"
+SUMMARY_JSON = "batch_summary.json"
+CANON_FILE = "trainer_canon_flat.json"
+PROFILE_FILE = "profile.json"
+# AnalysisConfig pool sizes forced to 1 inside batch workers (unless given in --config)
+INNER_POOL_FIELDS = ("vt_bootstrap_workers", "kinetics_mc_workers")
+LOG_JSON_FILE = "pipeline.jsonl"
+
+# statuses listed under "failed" in batch_summary.json (→ exit code 1)
+FAILED_STATUSES = ("FAILED", "CRASHED", "OK_WITH_REPORT_ERRORS")
+
+# (source path, output dir) per file
+Task = Tuple[str, str]
+
+_OPTS: Dict[str, Any] = {}   # per-process batch options (set by _init_worker)
+
+
+# ─── DISCOVERY ───
+
+def find_inputs(paths: Iterable[str], out_dir: Optional[str] = None,
+                recursive: bool = True) -> List[Tuple[Path, Path]]:
+    """
+    Input files → [(source, relative output path)], sorted, without duplicates.
+    Directories are scanned for *.xml / *.csv (case-insensitive, hidden entries
+    and ``out_dir`` skipped); files given explicitly are taken as they are.
+    """
+    out_root = Path(out_dir).resolve() if out_dir else None
+    seen, found = set(), []
+    for p in paths:
+        root = Path(p)
+        if root.is_file():
+            cand = [(root, Path(root.name))]
+        elif root.is_dir():
+            it = root.rglob("*") if recursive else root.glob("*")
+            cand = []
+            for f in it:
+                rel = f.relative_to(root)
+                if any(part.startswith(".") for part in rel.parts):
+                    continue
+                if out_root is not None and out_root in f.resolve().parents:
+                    continue
+                if f.is_file() and f.suffix.lower() in INPUT_SUFFIXES:
+                    cand.append((f, Path(root.name) / rel))
+        else:
+            raise FileNotFoundError(p)
+        for src, rel in cand:
+            key = src.resolve()
+            if key not in seen:
+                seen.add(key)
+                found.append((src, rel))
+    return sorted(found, key=lambda x: str(x[1]))
+
+
+# ─── WORKER ───
+
+def _json_safe(o):
+    """numpy/pandas scalars → Python, NaN/inf → None (strict JSON)."""
+    if isinstance(o, dict):
+        return {str(k): _json_safe(v) for k, v in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [_json_safe(v) for v in o]
+    if hasattr(o, "item") and not hasattr(o, "__len__"):
+        o = o.item()
+    if isinstance(o, float) and not math.isfinite(o):
+        return None
+    if o is None or isinstance(o, (str, int, float, bool)):
+        return o
+    return str(o)
+
+
+def _init_worker(opts: Dict[str, Any]) -> None:
+    from engine_core import enable_copy_on_write
+
+    _OPTS.clear()
+    _OPTS.update(opts)
+    # worker = entry point: console level from --log-level, CPET_LOG_JSON adds a shared sink
+    configure_logging(opts.get("log_level", "INFO"), json_path=env_config()["json_path"])
+    enable_copy_on_write()   # workers are pipeline-only processes: share alias columns
+
+
+def _write(path: Path, text: str) -> str:
+    path.write_text(text, encoding="utf-8")
+    return path.name
+
+
+def process_one(task: Task) -> Dict[str, Any]:
+    """
+    Run the pipeline for one file (in a worker); never raises.
+    In-test pools (INNER_POOL_FIELDS) default to 1 here, not to os.cpu_count().
+    """
+    src, out = task
+    out_dir = Path(out)
+    rec: Dict[str, Any] = {"file": src, "out_dir": out, "status": "FAILED",
+                           "elapsed_sec": None, "engine_errors": [], "report_errors": [], "outputs": [],
+                           "error": None}
+    t0 = time.perf_counter()
+    log = io.StringIO()
+    logs = contextlib.ExitStack()
+    try:
+        from engine_core import AnalysisConfig, CPET_Orchestrator
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        if _OPTS.get("log_json"):
+            logs.enter_context(capture(json_handler(
+                str(out_dir / LOG_JSON_FILE), static={"file": src}, level=_OPTS.get("log_level", "INFO"))))
+        cfg = AnalysisConfig(**{**dict.fromkeys(INNER_POOL_FIELDS, 1), **_OPTS.get("config", {})})
+        orch = CPET_Orchestrator(cfg)
+        with contextlib.redirect_stdout(log):
+            res = orch.process_file(src)
+        profile = (res.get("_debug") or {}).get("profile") if isinstance(res, dict) else None
+        if profile:
+            rec["outputs"].append(_write(out_dir / PROFILE_FILE, json.dumps(
+                _json_safe(profile), ensure_ascii=False, indent=1)))
+            rec["profile_wall_s"] = {s["name"]: s["wall_s"] for s in profile["sections"] if s["depth"] == 0}
+        if not isinstance(res, dict) or "fatal_error" in res:
+            rec["error"] = res.get("fatal_error") if isinstance(res, dict) else "no result"
+        else:
+            reports = _OPTS.get("reports", REPORT_KINDS)
+            rec["outputs"].append(_write(out_dir / CANON_FILE, json.dumps(
+                _json_safe(res.get("trainer_canon_flat") or {}), ensure_ascii=False, indent=1, sort_keys=True)))
+            # placeholders of reports that failed to render are not written
+            failed = {k: v for k, v in (res.get("report_errors") or {}).items() if k in reports}
+            rec["report_errors"] = [f"{k}: {v}" for k, v in failed.items()]
+            if "html" in reports and "html" not in failed:
+                with contextlib.redirect_stdout(log):
+                    path = orch.save_html_report(str(out_dir / "report.html"))
+                if path:
+                    rec["outputs"].append("report.html")
+            if "lite" in reports and "lite" not in failed and res.get("html_report_lite"):
+                rec["outputs"].append(_write(out_dir / "report_lite.html", res["html_report_lite"]))
+            if "text" in reports and "text" not in failed and res.get("text_report"):
+                rec["outputs"].append(_write(out_dir / "report.txt", res["text_report"]))
+            if "kinetics" in reports and "kinetics" not in failed and res.get("html_report_kinetics"):
+                rec["outputs"].append(_write(out_dir / "report_kinetics.html", res["html_report_kinetics"]))
+            rec["engine_errors"] = [
+                f"{e.get('engine')}: {e.get('error')}" for e in (orch._qc_log.get("engine_errors") or [])]
+            rec["status"] = ("OK_WITH_REPORT_ERRORS" if rec["report_errors"]
+                             else "OK_WITH_ENGINE_ERRORS" if rec["engine_errors"] else "OK")
+    except Exception as e:
+        rec["error"] = f"{type(e).__name__}: {e}"
+        log.write("\n" + traceback.format_exc())
+    finally:
+        logs.close()
+        rec["elapsed_sec"] = round(time.perf_counter() - t0, 2)
+        try:
+            out_dir.mkdir(parents=True, exist_ok=True)
+            (out_dir / "pipeline.log").write_text(log.getvalue(), encoding="utf-8")
+        except OSError:
+            pass
+    return rec
+
+
+def profile_means(records: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Mean wall time per profiled section over files (slowest first)."""
+    acc: Dict[str, List[float]] = {}
+    for r in records:
+        for name, sec in (r.get("profile_wall_s") or {}).items():
+            acc.setdefault(name, []).append(sec)
+    means = {name: round(sum(v) / len(v), 4) for name, v in acc.items()}
+    return dict(sorted(means.items(), key=lambda kv: -kv[1]))
+
+
+# ─── POOL ───
+
+def _run_pool(tasks: List[Task], workers: int, opts: Dict[str, Any], on_result) -> Tuple[List[Task], List[Task]]:
+    """
+    Run tasks on one pool, at most 2 × workers in flight.
+    → ([], []) when done, or (in_flight, not_started) if a worker died and broke the pool.
+    """
+    it = iter(tasks)
+    pending: Dict[Any, Task] = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(opts,)) as pool:
+        def fill():
+            for t in it:
+                pending[pool.submit(process_one, t)] = t
+                if len(pending) >= 2 * workers:
+                    break
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = []
+            for fut in done:
+                t = pending.pop(fut)
+                try:
+                    on_result(fut.result())
+                except BrokenProcessPool:
+                    broken.append(t)
+            if broken:
+                return broken + list(pending.values()), list(it)
+            fill()
+    return [], []
+
+
+def run_batch(tasks: List[Task], workers: int = 0, opts: Dict[str, Any] = None,
+              on_result=None) -> List[Dict[str, Any]]:
+    """Process all tasks; returns one record per task (completion order)."""
+    opts = dict(opts or {})
+    workers = max(1, min(int(workers or 0) or (os.cpu_count() or 1), max(1, len(tasks))))
+    records: List[Dict[str, Any]] = []
+
+    def _done(rec):
+        records.append(rec)
+        if on_result:
+            on_result(rec)
+
+    remaining = list(tasks)
+    while remaining:
+        suspects, remaining = _run_pool(remaining, workers, opts, _done)
+        # Pool broken by a dying worker: re-run the in-flight files one by one
+        for t in suspects:
+            again, _ = _run_pool([t], 1, opts, _done)
+            if again:
+                _done({"file": t[0], "out_dir": t[1], "status": "CRASHED", "elapsed_sec": None,
+                       "engine_errors": [], "report_errors": [], "outputs": [],
+                       "error": "worker process died (BrokenProcessPool)"})
+    return records
+
+
+# ─── CLI ───
+
+def _load_config(arg: Optional[str], protocol: str) -> Dict[str, Any]:
+    """--config: path to a JSON file or inline JSON with AnalysisConfig fields."""
+    from engine_core import AnalysisConfig
+
+    cfg = {}
+    if arg:
+        cfg = json.loads(Path(arg).read_text(encoding="utf-8") if os.path.isfile(arg) else arg)
+    if protocol:
+        cfg["protocol_name"] = protocol
+    known = {f.name for f in fields(AnalysisConfig)}
+    unknown = sorted(set(cfg) - known)
+    if unknown:
+        raise SystemExit(f"--config: unknown AnalysisConfig fields: {', '.join(unknown)}")
+    return cfg
+
+
+def _fmt_eta(sec: float) -> str:
+    sec = int(max(0, sec))
+    return f"{sec // 3600:d}:{sec % 3600 // 60:02d}:{sec % 60:02d}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(
+        prog="cpet-batch",
+        description="Batch analysis of CPET exports (XML/CSV) on a process pool.")
+    ap.add_argument("inputs", nargs="+", help="files and/or directories (scanned for *.xml, *.csv)")
+    ap.add_argument("-o", "--out", required=True, help="output directory")
+    ap.add_argument("-j", "--workers", type=int, default=0, help="worker processes (0 = CPU count)")
+    ap.add_argument("--protocol", default=None, help="protocol_name for all files (default: config / AUTO)")
+    ap.add_argument("--config", default=None, help="AnalysisConfig overrides: JSON file or inline JSON")
+    ap.add_argument("--reports", default=",".join(REPORT_KINDS),
+                    help=f"comma list of {','.join(REPORT_KINDS)} or 'none' (default: all)")
+    ap.add_argument("--no-recursive", action="store_true", help="do not descend into subdirectories")
+    ap.add_argument("--skip-existing", action="store_true",
+                    help=f"skip files whose output dir already has {CANON_FILE}")
+    ap.add_argument("--profile", action="store_true",
+                    help="per-engine wall/CPU/memory profile (profile.json per file, means in the summary)")
+    ap.add_argument("--log-level", default=env_config()["level"],
+                    help="pipeline log level in pipeline.log: DEBUG, INFO, WARNING, ERROR or OFF "
+                         "(default: $CPET_LOG_LEVEL or INFO)")
+    ap.add_argument("--log-json", action="store_true",
+                    help=f"also write structured JSON log records to {LOG_JSON_FILE} per file")
+    ap.add_argument("-q", "--quiet", action="store_true", help="no per-file progress lines")
+    args = ap.parse_args(argv)
+
+    reports = [] if args.reports.strip().lower() == "none" else [
+        r.strip().lower() for r in args.reports.split(",") if r.strip()]
+    bad = sorted(set(reports) - set(REPORT_KINDS))
+    if bad:
+        ap.error(f"unknown report kind(s): {', '.join(bad)}")
+
+    out_root = Path(args.out)
+    try:
+        parse_level(args.log_level)
+    except ValueError as e:
+        ap.error(str(e))
+
+    opts = {"config": _load_config(args.config, args.protocol), "reports": reports,
+            "log_level": args.log_level, "log_json": args.log_json}
+    if args.profile:
+        opts["config"]["profile_engines"] = True
+    found = find_inputs(args.inputs, str(out_root), recursive=not args.no_recursive)
+    tasks = [(str(src), str(out_root / rel)) for src, rel in found]
+    n_skipped = 0
+    if args.skip_existing:
+        before = len(tasks)
+        tasks = [t for t in tasks if not (Path(t[1]) / CANON_FILE).exists()]
+        n_skipped = before - len(tasks)
+
+    out_root.mkdir(parents=True, exist_ok=True)
+    workers = max(1, min(args.workers or (os.cpu_count() or 1), max(1, len(tasks))))
+    print(f"cpet-batch: {len(tasks)} files ({n_skipped} skipped), {workers} workers → {out_root}",
+          file=sys.stderr)
+
+    t0 = time.perf_counter()
+    counts: Dict[str, int] = {}
+    jsonl = open(out_root / SUMMARY_JSONL, "a", encoding="utf-8")
+
+    def on_result(rec):
+        counts[rec["status"]] = counts.get(rec["status"], 0) + 1
+        jsonl.write(json.dumps(_json_safe(rec), ensure_ascii=False) + "\n")
+        jsonl.flush()
+        done = sum(counts.values())
+        el = time.perf_counter() - t0
+        rate = done / el if el > 0 else 0.0
+        if not args.quiet:
+            eta = _fmt_eta((len(tasks) - done) / rate) if rate > 0 else "?"
+            notes = []
+            if rec["report_errors"]:
+                notes.append("report error(s): " + ", ".join(rec["report_errors"]))
+            if rec["engine_errors"]:
+                notes.append(f"{len(rec['engine_errors'])} engine error(s)")
+            msg = rec["error"] or "; ".join(notes)
+            print(f"[{done:>{len(str(len(tasks)))}}/{len(tasks)}] {rec['status']:<22} "
+                  f"{rec['elapsed_sec'] if rec['elapsed_sec'] is not None else '-':>7}s  {rec['file']}"
+                  f"  | {rate * 60:.1f} files/min, ETA {eta}" + (f"  — {msg}" if msg else ""),
+                  file=sys.stderr)
+
+    try:
+        records = run_batch(tasks, workers, opts, on_result)
+    finally:
+        jsonl.close()
+
+    elapsed = time.perf_counter() - t0
+    summary = {
+        "n_files": len(tasks),
+        "n_skipped_existing": n_skipped,
+        "workers": workers,
+        "elapsed_sec": round(elapsed, 2),
+        "files_per_min": round(len(records) / elapsed * 60, 2) if elapsed > 0 else None,
+        "mean_file_sec": round(sum(r["elapsed_sec"] or 0 for r in records) / max(len(records), 1), 2),
+        "status_counts": counts,
+        "failed": [{"file": r["file"], "status": r["status"],
+                    "error": r["error"] or "; ".join(r.get("report_errors") or [])}
+                   for r in records if r["status"] in FAILED_STATUSES],
+        "config": opts["config"],
+        "reports": reports,
+    }
+    if args.profile:
+        summary["profile_mean_wall_s"] = profile_means(records)
+    (out_root / SUMMARY_JSON).write_text(
+        json.dumps(_json_safe(summary), ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"cpet-batch: {len(records)} files in {_fmt_eta(elapsed)} "
+          f"({summary['files_per_min']} files/min) — {counts}", file=sys.stderr)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
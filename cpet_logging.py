@@ -0,0 +1,170 @@
+"""
+cpet_logging.py — Logging layer of the CPET pipeline
+====================================================
+All pipeline diagnostics go through the standard ``logging`` tree under the
+``cpet`` logger:
+
+    cpet.pipeline         orchestrator (import, protocol, feedback, reports)
+    cpet.engine.<ID>      one logger per engine (E02, E11, ...)
+    cpet.data_tools       DataTools / SignalStore
+    cpet.report           ReportAdapter / kinetics report
+
+Importing the library configures nothing: the ``cpet`` logger only gets a
+``NullHandler``, so records reach whatever handlers the host (Streamlit, a
+notebook, a service) has installed on the root logger, under its own levels.
+
+Entry points (app.py, cpet_batch workers) call ``configure_logging`` once per
+process. Its console handler keeps the previous behaviour: messages go to the
+*current* ``sys.stdout`` (resolved per record, so ``contextlib.redirect_stdout``
+still captures them) as bare messages. Import banners are DEBUG.
+
+    configure_logging(**env_config())                  # CPET_LOG_LEVEL / CPET_LOG_JSON
+    configure_logging(level="WARNING")                 # quieter console
+    configure_logging(level="OFF")                     # disabled: no record is created
+    configure_logging(json_path="run.jsonl")           # + structured JSON lines sink
+    configure_logging(propagate=False)                 # do not also pass records to root
+
+Environment (read by entry points through ``env_config``): ``CPET_LOG_LEVEL``
+(DEBUG/INFO/WARNING/ERROR/OFF) and ``CPET_LOG_JSON`` (path of the JSON lines sink).
+
+Messages use %-style arguments, so a disabled level costs one cached level
+check and no string formatting; guard larger computations with
+``log.isEnabledFor(logging.INFO)``.
+
+Usage:
+    from cpet_logging import get_logger
+    log = get_logger("engine.E11")
+    log.warning("E11: cannot read %s", path, extra={"engine": "E11"})
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Union
+
+ROOT = "cpet"
+OFF = logging.CRITICAL + 10
+
+# LogRecord attributes that are not user "extra" fields
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def get_logger(name: str = "pipeline") -> logging.Logger:
+    """Logger ``cpet.<name>`` (e.g. "pipeline", "engine.E02", "report")."""
+    return logging.getLogger(f"{ROOT}.{name}" if name else ROOT)
+
+
+def parse_level(level: Union[str, int, None]) -> int:
+    if level is None or level == "":
+        return logging.INFO
+    if isinstance(level, int):
+        return level
+    name = str(level).strip().upper()
+    if name in ("OFF", "NONE", "DISABLED", "0"):
+        return OFF
+    value = logging.getLevelName(name)
+    if not isinstance(value, int):
+        raise ValueError(f"unknown log level: {level!r}")
+    return value
+
+
+class StdoutHandler(logging.StreamHandler):
+    """StreamHandler writing to whatever ``sys.stdout`` is at emit time."""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    def emit(self, record):
+        self.stream = sys.stdout
+        super().emit(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, extra fields (+ static fields)."""
+
+    def __init__(self, static: Optional[Dict[str, Any]] = None):
+        super().__init__()
+        self.static = dict(static or {})
+
+    def format(self, record) -> str:
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage().strip(),
+        }
+        out.update(self.static)
+        for k, v in vars(record).items():
+            if k not in _RECORD_ATTRS and not k.startswith("_"):
+                out[k] = v
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+def json_handler(path: str, static: Optional[Dict[str, Any]] = None,
+                 level: Union[str, int] = logging.DEBUG) -> logging.Handler:
+    """Append-mode JSON lines handler (attach/detach around one run with ``capture``)."""
+    h = logging.FileHandler(path, mode="a", encoding="utf-8", delay=True)
+    h.setFormatter(JsonFormatter(static))
+    h.setLevel(parse_level(level))
+    return h
+
+
+@contextlib.contextmanager
+def capture(handler: logging.Handler):
+    """Extra handler on the ``cpet`` logger for the duration of a block (closed on exit)."""
+    root = logging.getLogger(ROOT)
+    root.addHandler(handler)
+    try:
+        yield handler
+    finally:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def env_config(default_level: str = "INFO") -> Dict[str, Any]:
+    """``configure_logging`` arguments from ``CPET_LOG_LEVEL`` / ``CPET_LOG_JSON``."""
+    return {"level": os.environ.get("CPET_LOG_LEVEL") or default_level,
+            "json_path": os.environ.get("CPET_LOG_JSON") or None}
+
+
+def configure_logging(level: Union[str, int, None] = "INFO", json_path: Optional[str] = None,
+                      json_level: Union[str, int] = logging.DEBUG, console: bool = True,
+                      propagate: Optional[bool] = None) -> logging.Logger:
+    """
+    (Re)configure the ``cpet`` logger: console level, optional JSON lines sink.
+    level="OFF" disables the whole tree (records are not even created).
+    propagate — None leaves ``cpet`` → root propagation as it is; False stops
+    root handlers from receiving (and duplicating) pipeline records.
+    For entry points only: the library never calls it.
+    """
+    root = logging.getLogger(ROOT)
+    for h in list(root.handlers):
+        if getattr(h, "_cpet_default", False):
+            root.removeHandler(h)
+            h.close()
+    if propagate is not None:
+        root.propagate = propagate
+    lvl = parse_level(level)
+    handlers = []
+    if console and lvl < OFF:
+        h = StdoutHandler()
+        h.setFormatter(logging.Formatter("%(message)s"))
+        h.setLevel(lvl)
+        handlers.append(h)
+    if json_path:
+        handlers.append(json_handler(json_path, level=json_level))
+    for h in handlers:
+        h._cpet_default = True
+        root.addHandler(h)
+    # logger level = most verbose handler, so disabled levels stop at isEnabledFor()
+    root.setLevel(min([h.level for h in handlers], default=OFF))
+    return root
+
+
+# library default: no output of its own, records go to the host's root handlers
+logging.getLogger(ROOT).addHandler(logging.NullHandler())
@@ -3,7 +3,9 @@
 # ==========================================
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from config import cow_copy
+from cpet_logging import get_logger
 
 
 def compile_protocol_for_apply(raw_segments, t_stop_manual=None):
@@ -106,8 +108,9 @@ class DataTools:
         Dodaje globalne aliasy kompatybilności wstecznej:
         - jeśli istnieje jedna wersja nazwy kolumny, tworzy pozostałe synonimy,
         - nie nadpisuje istniejących kolumn.
+        Przy Copy-on-Write aliasy to widoki — dane nie są kopiowane.
         """
-        out = df.copy()
+        out = cow_copy(df)
 
         alias_groups = [
             # czas
@@ -156,8 +159,9 @@ class DataTools:
         """
         Standaryzuje nazwy kolumn do formatów canonical używanych przez silniki.
         Zawiera fallbacki jednostek i czasu.
+        Przy Copy-on-Write aliasy kolumn nie kopiują danych (patrz apply_global_aliases).
         """
-        df_new = df.copy()
+        df_new = cow_copy(df)
 
         # --- 1) aliasy kolumn -> canonical ---
         aliases = {
@@ -247,14 +251,30 @@ class DataTools:
         if "Time_sec" not in df.columns:
             return df
 
-        out = df.copy()
-        t = pd.to_numeric(out["Time_sec"], errors="coerce")
+        out = cow_copy(df)  # CoW: kopiowane są tylko nadpisywane kolumny
+        t = pd.to_numeric(out["Time_sec"], errors="coerce").to_numpy(dtype=float)
 
         # upewnij się, że kolumny istnieją
         for col in ["Speed_kmh", "Incline_pct", "Power_W"]:
             if col not in out.columns:
                 out[col] = np.nan
 
+        # jedno sortowanie czasu → zakres wierszy segmentu przez searchsorted
+        order = np.argsort(t, kind="stable")
+        ts = t[order]
+        is_sorted = bool(np.array_equal(order, np.arange(len(t))))
+
+        # zapis do prealokowanych tablic, kolumny podmieniane raz na końcu
+        arrays = {}
+
+        def _arr(col):
+            if col not in arrays:
+                try:
+                    arrays[col] = out[col].to_numpy(dtype=float, copy=True)
+                except (TypeError, ValueError):
+                    arrays[col] = out[col].to_numpy(dtype=object, copy=True)
+            return arrays[col]
+
         for seg in segments:
             s = seg.get("start_sec", seg.get("start", None))
             e = seg.get("end_sec", seg.get("end", None))
@@ -266,22 +286,30 @@ class DataTools:
             if e <= s:
                 continue
 
-            mask = (t >= s) & (t < e)
+            # wiersze z s <= t < e (NaN sortuje się na koniec i nie wpada w zakres)
+            lo, hi = np.searchsorted(ts, [s, e], side="left")
+            if hi <= lo:
+                continue
+            rows = slice(lo, hi) if is_sorted else order[lo:hi]
+            t_seg = ts[lo:hi]
 
             # stałe wartości
             for col in ["Speed_kmh", "Incline_pct", "Power_W"]:
                 if col in seg and seg[col] is not None:
-                    out.loc[mask, col] = float(seg[col])
+                    _arr(col)[rows] = float(seg[col])
 
             # rampa prędkości
             if ("Speed_from" in seg) and ("Speed_to" in seg):
-                frac = (t[mask] - s) / (e - s)
-                out.loc[mask, "Speed_kmh"] = float(seg["Speed_from"]) + frac * (float(seg["Speed_to"]) - float(seg["Speed_from"]))
+                frac = (t_seg - s) / (e - s)
+                _arr("Speed_kmh")[rows] = float(seg["Speed_from"]) + frac * (float(seg["Speed_to"]) - float(seg["Speed_from"]))
 
             # rampa mocy
             if ("Power_from" in seg) and ("Power_to" in seg):
-                frac = (t[mask] - s) / (e - s)
-                out.loc[mask, "Power_W"] = float(seg["Power_from"]) + frac * (float(seg["Power_to"]) - float(seg["Power_from"]))
+                frac = (t_seg - s) / (e - s)
+                _arr("Power_W")[rows] = float(seg["Power_from"]) + frac * (float(seg["Power_to"]) - float(seg["Power_from"]))
+
+        for col, arr in arrays.items():
+            out[col] = arr
 
         return out
 
@@ -291,11 +319,14 @@ class DataTools:
         Wygładzanie pod CPET:
         - metabolizm/gazy: rolling 15-20 s (domyślnie 15)
         - FAT/CHO: heavy smoothing ~60 s
+        - cfg.smooth_mode: "rows" (okno = N wierszy z mediany dt) lub "time"
+          (okno ±s/2 na rzeczywistej osi Time_sec, odporne na zmienny oddech)
+        - cfg.resample_dt: opcjonalny resampling na siatkę co dt [s]
         """
         if df is None or df.empty:
             return df
 
-        out = df.copy()
+        out = cow_copy(df)  # CoW: wygładzone kolumny i tak są podmieniane
         if "Time_sec" not in out.columns:
             return out
 
@@ -318,18 +349,382 @@ class DataTools:
         ]
         cols_heavy = ["FAT_g_min", "CHO_g_min", "SmO2_pct", "Lactate_mmol"]
 
-        for c in cols_main:
-            if c in out.columns:
-                s = pd.to_numeric(out[c], errors="coerce")
-                out[c] = s.rolling(window=win_main, min_periods=1, center=True).median()
+        time_mode = str(getattr(cfg, "smooth_mode", "rows") or "rows").lower() == "time"
+        t_arr = t.to_numpy(dtype=float)
+
+        # wszystkie kolumny grupy w jednym przebiegu (tryb "rows" = pandas rolling median)
+        for cols, win, sec in ((cols_main, win_main, smooth_sec),
+                               (cols_heavy, win_heavy, max(smooth_sec, fatcho_sec))):
+            cols = [c for c in cols if c in out.columns]
+            if not cols:
+                continue
+            X = np.column_stack([
+                pd.to_numeric(out[c], errors="coerce").to_numpy(dtype=float) for c in cols
+            ])
+            if time_mode:
+                M = DataTools.rolling_time_centered(t_arr, X, sec, how="median")
+            else:
+                M = DataTools.rolling_median_centered(X, win)
+            out[cols] = pd.DataFrame(M, columns=cols, index=out.index)
+
+        resample_dt = getattr(cfg, "resample_dt", None)
+        if resample_dt:
+            out = DataTools.resample_uniform(out, float(resample_dt))
+
+        return out
+
+    @staticmethod
+    def rolling_time_centered(t: np.ndarray, X: np.ndarray, window_sec: float,
+                              how: str = "median", min_periods: int = 1,
+                              chunk_elems: int = 4_000_000) -> np.ndarray:
+        """
+        Okno czasowe wyśrodkowane: wiersz i → próbki z t ∈ [t_i - W/2, t_i + W/2]
+        (domknięte, jak okno offsetowe pandas, ale symetryczne i dla wielu kolumn).
+        t musi być rosnące; X (n,) lub (n, k); how = "median" | "mean".
+        NaN są pomijane; mniej niż ``min_periods`` ważnych próbek → NaN.
+        """
+        t = np.asarray(t, dtype=float)
+        X = np.asarray(X, dtype=float)
+        one_d = X.ndim == 1
+        if one_d:
+            X = X[:, None]
+        n, k = X.shape
+        out = np.full((n, k), np.nan)
+        if n == 0 or k == 0:
+            return out[:, 0] if one_d else out
+
+        half = float(window_sec) / 2.0
+        lo = np.searchsorted(t, t - half, side="left")
+        hi = np.searchsorted(t, t + half, side="right")
+        bad_t = ~np.isfinite(t)
+        lo[bad_t] = hi[bad_t] = np.arange(n)[bad_t]
+        hi = np.maximum(hi, lo)
+
+        cs = np.concatenate([np.zeros((1, k), dtype=np.int64),
+                             np.cumsum(~np.isnan(X), axis=0)])
+        cnt_all = cs[hi] - cs[lo]
+        L = int((hi - lo).max())
+        if L == 0:
+            return out[:, 0] if one_d else out
+
+        Xs = np.vstack([X, np.full((1, k), np.nan)])  # wiersz n = wartownik NaN
+        offs = np.arange(L)
+        step = max(1, int(chunk_elems) // max(1, k * L))
+        for a in range(0, n, step):
+            b = min(n, a + step)
+            idx = lo[a:b, None] + offs
+            idx[idx >= hi[a:b, None]] = n
+            G = np.moveaxis(Xs[idx], 1, 2)  # (m, k, L)
+            cnt = cnt_all[a:b]
+            if how == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    res = np.nansum(G, axis=-1) / cnt
+            else:
+                res = DataTools._median_from_sorted(np.sort(G, axis=-1), cnt)
+            res[cnt < max(1, int(min_periods))] = np.nan
+            out[a:b] = res
+
+        return out[:, 0] if one_d else out
+
+    @staticmethod
+    def resample_uniform(df: pd.DataFrame, dt: float, time_col: str = "Time_sec",
+                         dense_min_frac: float = 0.5) -> pd.DataFrame:
+        """
+        Resampling na jednorodną siatkę t0, t0+dt, ... (dla kerneli o stałym kroku).
+        - kolumny liczbowe gęste (≥ dense_min_frac ważnych): interpolacja liniowa
+          między sąsiednimi próbkami (NaN u sąsiada → NaN)
+        - kolumny liczbowe rzadkie (np. Lactate_mmol): każda ważna próbka trafia
+          do najbliższego węzła siatki
+        - pozostałe (Faza, Time_str...): wartość ostatniej próbki ≤ t
+        Krok zapisany w ``out.attrs["resample_dt"]``.
+        """
+        if df is None or df.empty or time_col not in df.columns or not dt or dt <= 0:
+            return df
 
-        for c in cols_heavy:
-            if c in out.columns:
-                s = pd.to_numeric(out[c], errors="coerce")
-                out[c] = s.rolling(window=win_heavy, min_periods=1, center=True).median()
+        src = df[pd.to_numeric(df[time_col], errors="coerce").notna()]
+        src = src.sort_values(time_col, kind="stable").reset_index(drop=True)
+        t = pd.to_numeric(src[time_col], errors="coerce").to_numpy(dtype=float)
+        if len(t) < 2 or t[-1] <= t[0]:
+            return df
 
+        grid = t[0] + np.arange(int(np.floor((t[-1] - t[0]) / dt + 1e-9)) + 1) * dt
+        j = np.clip(np.searchsorted(t, grid, side="right") - 1, 0, len(t) - 1)
+        j1 = np.minimum(j + 1, len(t) - 1)
+        span = t[j1] - t[j]
+        w = np.zeros(len(grid))
+        np.divide(grid - t[j], span, out=w, where=span > 0)
+        w = np.clip(w, 0.0, 1.0)
+
+        cols = {}
+        dense, sparse = [], []
+        for c in src.columns:
+            if c == time_col:
+                continue
+            s = src[c]
+            if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+                (dense if s.notna().mean() >= dense_min_frac else sparse).append(c)
+            else:
+                cols[c] = s.to_numpy()[j]
+
+        if dense:
+            X = src[dense].to_numpy(dtype=float)
+            Y = X[j] * (1.0 - w)[:, None] + X[j1] * w[:, None]
+            exact = w == 0.0
+            Y[exact] = X[j[exact]]
+            for i, c in enumerate(dense):
+                cols[c] = Y[:, i]
+        for c in sparse:
+            v = src[c].to_numpy(dtype=float)
+            ok = np.flatnonzero(~np.isnan(v))
+            y = np.full(len(grid), np.nan)
+            g = np.clip(np.rint((t[ok] - grid[0]) / dt).astype(np.int64), 0, len(grid) - 1)
+            y[g] = v[ok]
+            cols[c] = y
+
+        out = pd.DataFrame({time_col: grid, **cols})[list(src.columns)]
+        out.attrs = dict(df.attrs, resample_dt=float(dt))
         return out
 
+    @staticmethod
+    def rolling_median_centered(X: np.ndarray, window: int, chunk_elems: int = 262_144) -> np.ndarray:
+        """
+        Wielokolumnowy odpowiednik
+        ``pd.Series.rolling(window, min_periods=1, center=True).median()``
+        (bit w bit): X (n,) lub (n, k) → tablica tego samego kształtu.
+
+        Okno wiersza i: [i - (window-1-off), i + off], off = (window-1)//2
+        (jak FixedWindowIndexer w pandas), przycięte do krawędzi; NaN są
+        pomijane, brak ważnych próbek → NaN, parzysta liczba → (a+b)/2.
+        Okna (sliding_window_view) kopiowane są raz, porcjami po ``chunk_elems``
+        (~2 MB, w cache), i porządkowane w miejscu: porcja samych pełnych okien
+        bez NaN i nieparzyste okno → np.partition na środku (mediana = wycinek
+        kolumny), inaczej sort w miejscu + indeksy wg liczby ważnych próbek.
+        """
+        X = np.asarray(X, dtype=float)
+        one_d = X.ndim == 1
+        if one_d:
+            X = X[:, None]
+        n, k = X.shape
+        window = int(window)
+        out = np.full((n, k), np.nan)
+        if n == 0 or k == 0 or window < 1:
+            return out[:, 0] if one_d else out
+
+        right = (window - 1) // 2
+        left = window - 1 - right
+        Xp = np.concatenate([
+            np.full((left, k), np.nan), X, np.full((right, k), np.nan)
+        ])
+        W = np.lib.stride_tricks.sliding_window_view(Xp, window, axis=0)  # (n, k, window)
+
+        # liczba ważnych próbek w oknie z sum prefiksowych (O(n·k))
+        cs = np.concatenate([np.zeros((1, k), dtype=np.int64),
+                             np.cumsum(~np.isnan(X), axis=0)])
+        idx = np.arange(n)
+        cnt_all = (cs[np.minimum(idx + right + 1, n)] - cs[np.maximum(idx - left, 0)])
+
+        hi_i, lo_i = window // 2, (window - 1) // 2
+        step = max(1, int(chunk_elems) // max(1, k * window))
+        for a in range(0, n, step):
+            b = min(n, a + step)
+            cnt = cnt_all[a:b]
+            interior = bool((cnt == window).all())  # same pełne okna bez NaN
+            A = W[a:b].copy()                  # jedna kopia okien porcji (C, zapisywalna)
+            if interior and window % 2 == 1:
+                A.partition(hi_i, axis=-1)     # tylko statystyka środkowa
+            else:
+                A.sort(axis=-1)                # NaN na końcu
+            if interior:
+                med = A[..., hi_i] if window % 2 == 1 else (A[..., hi_i] + A[..., lo_i]) / 2
+            else:
+                med = DataTools._median_from_sorted(A, cnt)  # A już ciągła: bez kopii
+
+            # ±0: kolejność równych kluczy w skipliście pandas = kolejność w oknie,
+            # czyli sort stabilny; liczy się tylko gdy mediana trafia w zero
+            zr = (med == 0)
+            if zr.any():
+                rr, cc = np.nonzero(zr)
+                sub = np.sort(W[a:b][rr, cc], axis=-1, kind="stable")
+                med[rr, cc] = DataTools._median_from_sorted(sub, cnt[rr, cc])
+            out[a:b] = med
+
+        return out[:, 0] if one_d else out
+
+        right = (window - 1) // 2
+        left = window - 1 - right
+        Xp = np.concatenate([
+            np.full((left, k), np.nan), X, np.full((right, k), np.nan)
+        ])
+        W = np.lib.stride_tricks.sliding_window_view(Xp, window, axis=0)  # (n, k, window)
+
+        # liczba ważnych próbek w oknie z sum prefiksowych (O(n·k))
+        cs = np.concatenate([np.zeros((1, k), dtype=np.int64),
+                             np.cumsum(~np.isnan(X), axis=0)])
+        idx = np.arange(n)
+        cnt_all = (cs[np.minimum(idx + right + 1, n)] - cs[np.maximum(idx - left, 0)])
+
+        kth = [(window - 1) // 2, window // 2]
+        step = max(1, int(chunk_elems) // max(1, k * window))
+        for a in range(0, n, step):
+            b = min(n, a + step)
+            cnt = cnt_all[a:b]
+            med = np.empty(cnt.shape)
+            # pełne okna bez NaN (większość wierszy): dwie statystyki pozycyjne, O(w) zamiast sortu
+            full = cnt == window
+            if full.any():
+                part = np.partition(W[a:b][full], kth, axis=-1)
+                hi, lo = part[:, kth[1]], part[:, kth[0]]
+                med[full] = hi if window % 2 == 1 else (hi + lo) / 2
+            # krawędzie i okna z NaN: pełny sort (NaN na końcu)
+            rest = ~full
+            if rest.any():
+                srt = np.sort(W[a:b][rest], axis=-1)
+                med[rest] = DataTools._median_from_sorted(srt, cnt[rest])
+
+            # ±0: kolejność równych kluczy w skipliście pandas = kolejność w oknie,
+            # czyli sort stabilny; liczy się tylko gdy mediana trafia w zero
+            zr = (med == 0)
+            if zr.any():
+                rr, cc = np.nonzero(zr)
+                sub = np.sort(W[a:b][rr, cc], axis=-1, kind="stable")
+                med[rr, cc] = DataTools._median_from_sorted(sub, cnt[rr, cc])
+            out[a:b] = med
+
+        return out[:, 0] if one_d else out
+
+    @staticmethod
+    def _median_from_sorted(srt: np.ndarray, cnt: np.ndarray) -> np.ndarray:
+        """Mediana wierszy posortowanych okien (NaN na końcu) o ``cnt`` ważnych próbkach."""
+        w = srt.shape[-1]
+        flat = np.ascontiguousarray(srt).reshape(-1)
+        c = cnt.reshape(-1)
+        base = np.arange(c.size) * w
+        hi = flat[base + c // 2]
+        lo = flat[base + np.maximum(c - 1, 0) // 2]
+        med = np.where(c % 2 == 1, hi, (hi + lo) / 2)
+        med[c == 0] = np.nan
+        return med.reshape(cnt.shape)
+
+
+class SignalStore:
+    """
+    Wspólny magazyn sygnałów na jeden przebieg (budowany raz po DataTools.smooth).
+
+    Silniki zamiast własnego ``df.copy()`` + ``pd.to_numeric`` pobierają stąd:
+    - ``col(candidates)``  → pierwsza istniejąca kolumna z listy aliasów
+    - ``numeric(col)``     → pd.to_numeric(df[col], errors="coerce") (cache)
+    - ``array(col)``       → ta sama kolumna jako float64 ndarray (tylko do odczytu)
+    - ``get(key)``         → sygnał kanoniczny/pochodny: vo2_L, vco2_L, ve_vo2,
+                             ve_vco2, rer_calc oraz aliasy z ``ALIASES``
+    Ramka wysiłku ``processed.iloc[:n]`` dostaje ``prefix(df_ex)`` — dzieli cache
+    z magazynem pełnej ramki (wycinki zamiast ponownej konwersji).
+    """
 
-print("✅ Komórka 2: DataTools (FIXED — all methods inside class) załadowana.")
-print("✅ compile_protocol_for_apply() — jedna definicja, globalna.")
\ No newline at end of file
+    ALIASES = {
+        "time": ["Time_sec", "Time_s", "time_s", "t"],
+        "vo2_ml": ["VO2_mlmin", "VO2_ml_min", "VO2"],
+        "vco2_ml": ["VCO2_mlmin", "VCO2_ml_min", "VCO2"],
+        "vo2_L_raw": ["VO2_Lmin", "VO2_L_min", "VO2_lmin"],
+        "vco2_L_raw": ["VCO2_Lmin", "VCO2_L_min", "VCO2_lmin"],
+        "ve": ["VE_Lmin", "VE_L_min", "VE_lmin"],
+        "hr": ["HR_bpm", "hr_bpm", "HR"],
+        "speed": ["Speed_kmh", "speed_km_h", "Speed_km_h", "speed_kmh", "speed", "Speed"],
+        "power": ["Power_W", "Power"],
+        "rer": ["RER"],
+        "peto2": ["PetO2_mmHg", "PETO2_mmHg"],
+        "petco2": ["PetCO2_mmHg", "PETCO2_mmHg"],
+        "smo2": ["SmO2_pct", "SmO2_1", "SmO2_2", "SmO2_3", "SmO2_4", "SmO2"],
+    }
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._num: Dict[str, pd.Series] = {}
+        self._arr: Dict[str, np.ndarray] = {}
+        self._parent: Optional["SignalStore"] = None
+
+    @classmethod
+    def for_frame(cls, df: pd.DataFrame, signals: Optional["SignalStore"] = None) -> "SignalStore":
+        """Magazyn przekazany przez orkiestrator, jeśli dotyczy tej ramki; inaczej lokalny."""
+        if signals is not None and signals.df is df:
+            return signals
+        return cls(df)
+
+    def prefix(self, df_prefix: pd.DataFrame) -> "SignalStore":
+        """Magazyn dla ``self.df.iloc[:n]`` — kolumny liczone raz, tu tylko wycinane."""
+        st = SignalStore(df_prefix)
+        st._parent = self
+        return st
+
+    # ---------- kolumny surowe ----------
+    def col(self, candidates) -> Optional[str]:
+        for c in candidates:
+            if c in self.df.columns:
+                return c
+        return None
+
+    def numeric(self, col: str) -> pd.Series:
+        s = self._num.get(col)
+        if s is None:
+            if self._parent is not None:
+                s = self._parent.numeric(col).iloc[:len(self.df)]
+            else:
+                s = cow_copy(pd.to_numeric(self.df[col], errors="coerce"))  # bez CoW: niezależna od df
+            self._num[col] = s
+        return cow_copy(s)  # zapis u konsumenta nie psuje cache
+
+    def array(self, col: str) -> np.ndarray:
+        a = self._arr.get(col)
+        if a is None:
+            a = self.numeric(col).to_numpy(dtype=float, copy=True)
+            a.flags.writeable = False
+            self._arr[col] = a
+        return a
+
+    # ---------- sygnały kanoniczne / pochodne ----------
+    def get(self, key: str) -> Optional[np.ndarray]:
+        a = self._arr.get("@" + key)
+        if a is not None:
+            return a
+        if self._parent is not None:
+            full = self._parent.get(key)
+            a = None if full is None else full[:len(self.df)]
+        else:
+            a = self._derive(key)
+        if a is not None:
+            a.flags.writeable = False
+            self._arr["@" + key] = a
+        return a
+
+    def _derive(self, key: str) -> Optional[np.ndarray]:
+        if key in self.ALIASES:
+            c = self.col(self.ALIASES[key])
+            return None if c is None else self.array(c)
+        if key in ("vo2_L", "vco2_L"):
+            gas = key[:-2]
+            raw = self.get(gas + "_L_raw")
+            if raw is not None:
+                return raw
+            ml = self.get(gas + "_ml")
+            return None if ml is None else ml / 1000.0
+        if key in ("ve_vo2", "ve_vco2"):
+            ve, gas = self.get("ve"), self.get(key[3:] + "_L")
+            if ve is None or gas is None:
+                return None
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return ve / np.where(gas == 0, np.nan, gas)
+        if key == "rer_calc":
+            vo2, vco2 = self.get("vo2_L"), self.get("vco2_L")
+            if vo2 is None or vco2 is None:
+                return None
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return vco2 / np.where(vo2 == 0, np.nan, vo2)
+        return None
+
+    def series(self, key: str) -> Optional[pd.Series]:
+        """``get(key)`` jako Series z indeksem ramki (do rolling/idxmax/loc)."""
+        a = self.get(key)
+        return None if a is None else pd.Series(a, index=self.df.index, copy=False)
+
+
+get_logger("data_tools").debug("✅ Komórka 2: DataTools (FIXED — all methods inside class) załadowana.")
+get_logger("data_tools").debug("✅ compile_protocol_for_apply() — jedna definicja, globalna.")
\ No newline at end of file
@@ -1,257 +1,458 @@
 # E21 v1.0 — Kinetic Phenotype Engine (standalone module)
 
 class Engine_E21_KineticPhenotype:
-    """E21 v1.0 — Kinetic Phenotype Classification & Training Priorities.
-    Cross-validates VO₂ kinetics (E14) with thresholds (E02) to produce
-    phenotype classification + training priorities.
-    References: Poole&Jones 2012, Jones 2011, Barstow 1996, Iannetta 2020."""
+    """E21 v1.0 — Kinetic Phenotype Classification.
 
-    TAU_MOD_ELITE=15; TAU_MOD_TRAINED=25; TAU_MOD_ACTIVE=40
-    TAU_HVY_ELITE=20; TAU_HVY_TRAINED=35; TAU_HVY_ACTIVE=50
-    SC_MINIMAL=3.0; SC_NORMAL_HI=8.0; SC_HIGH_HI=15.0
+    Cross-engine integrating VO2 kinetics (E14) with thresholds (E02),
+    zones (E16), and concordance data (E18/E19) to produce:
+    1. Domain validation (did CWR speeds match intended domains?)
+    2. Limitation identification (central vs peripheral)
+    3. Fiber-type proxy estimation (from slow component)
+    4. Composite phenotype classification
+    5. Individualized training priorities
+
+    References:
+      Poole & Jones 2012, Barstow et al. 1996, Jones et al. 2011,
+      Burnley & Jones 2007, Iannetta et al. 2020, Inglis et al. 2024
+    """
+
+    TAU_BANDS = {
+        'moderate': [(15, 'ELITE'), (25, 'TRAINED'), (40, 'ACTIVE'), (999, 'SLOW')],
+        'heavy': [(20, 'ELITE'), (35, 'TRAINED'), (50, 'ACTIVE'), (999, 'SLOW')],
+    }
+    SC_BANDS = [(3, 'MINIMAL'), (8, 'LOW'), (15, 'NORMAL'), (25, 'HIGH'), (999, 'VERY_HIGH')]
+    RECOVERY_BANDS = [(30, 'EXCELLENT'), (60, 'GOOD'), (90, 'MODERATE'), (120, 'SLOW'), (999, 'VERY_SLOW')]
+
+    PHENOTYPES = {
+        'ELITE_AEROBIC':     {'label_pl': 'Elitarny Aerobowy',       'icon': '\U0001f3c5', 'desc': 'Zoptymalizowany system tlenowy — szybka kinetyka, minimalny SC, wysokie progi',                  'archetype': 'Maratończyk elite, Ironman PRO'},
+        'DIESEL':            {'label_pl': 'Diesel',                   'icon': '\U0001f682', 'desc': 'Silny motor aerobowy — efektywna ekonomia mięśniowa, dobra wytrzymałość',                       'archetype': 'Ultramaraton, triathlon LD, HYROX PRO'},
+        'TEMPO_RUNNER':      {'label_pl': 'Tempo Runner',             'icon': '\U0001f3c3', 'desc': 'Dobra kinetyka, umiarkowany SC — profil 10K-półmaraton',                                       'archetype': '10K, półmaraton, cross-country'},
+        'BURST_RECOVER':     {'label_pl': 'Burst & Recover',          'icon': '\u26a1',     'desc': 'Wolniejsza aktywacja ale dobra recovery — profil sportów powtarzalnych',                       'archetype': 'HYROX, CrossFit, sporty zespołowe'},
+        'POWER_ENDURANCE':   {'label_pl': 'Power-Endurance',          'icon': '\U0001f4aa', 'desc': 'Wysoki udział Type II — duży SC, szybka moc ale ograniczona wytrzymałość',                     'archetype': 'Sprint, CrossFit, sporty siłowo-wytrzymałościowe'},
+        'DELIVERY_LIMITED':  {'label_pl': 'Limitowany Centralnie',    'icon': '\u2764\ufe0f','desc': 'Dobra muskulatura ale O₂ delivery limituje heavy domain',                                   'archetype': 'Potencjał do poprawy — trening progowy'},
+        'PERIPHERAL_LIMITED':{'label_pl': 'Limitowany Obwodowo',      'icon': '\U0001fab1', 'desc': 'Wolna kinetyka + wysoki SC → limitacja mitochondrialna/kapilarna',                            'archetype': 'Potencjał do poprawy — baza aerobowa + HIIT'},
+        'DEVELOPING':        {'label_pl': 'Rozwijający się',          'icon': '\U0001f4c8', 'desc': 'Profil w trakcie adaptacji — mieszane cechy',                                                 'archetype': 'Początkujący lub w okresie budowy bazy'},
+    }
+
+    @classmethod
+    def _classify(cls, value, bands):
+        if value is None: return None
+        for threshold, label in bands:
+            if value <= threshold: return label
+        return bands[-1][1]
 
     @classmethod
     def run(cls, results: dict, cfg=None) -> dict:
         import numpy as np
-        out = {'status':'OK','version':'1.0','engine':'E21_KineticPhenotype',
-               'domain_validation':{},'domain_flags':[],
-               'tau_class_moderate':None,'tau_class_heavy':None,'tau_class_severe':None,
-               'tau_ratio_heavy_mod':None,'sc_class_heavy':None,'sc_class_severe':None,
-               'recovery_class':None,'limitation_type':None,'limitation_evidence':[],
-               'fiber_type_estimate':{},'phenotype':None,'phenotype_confidence':0.0,
-               'phenotype_description':'','phenotype_archetype':'',
-               'training_priorities':[],'summary':{},'flags':[]}
-
-        def _f(d,k,fb=None):
-            v=d.get(k)
-            if v is None: return fb
+
+        out = {
+            'status': 'OK', 'engine': 'E21', 'version': '1.0', 'flags': [],
+            'domain_validation': {}, 'kinetic_profile': {}, 'limitation': {},
+            'fiber_type_proxy': {}, 'phenotype': None, 'phenotype_confidence': 0,
+            'phenotype_info': {}, 'training_priorities': [], 'summary': {},
+        }
+
+        def _g(ek, fld, default=None):
+            e = results.get(ek, {})
+            if not isinstance(e, dict): return default
+            v = e.get(fld, default)
+            if v is None: return default
             try: return float(v)
-            except: return fb
-
-        e01=results.get('E01',{}); e02=results.get('E02',{})
-        e14=results.get('E14',{}); e18=results.get('E18',{})
-
-        if e14.get('status')!='OK' or e14.get('mode')!='CWR_KINETICS':
-            out['status']='NO_KINETICS_DATA'; return out
-        stages=e14.get('stages',[])
-        if len(stages)<2: out['status']='INSUFFICIENT_STAGES'; return out
-
-        vo2max=_f(e01,'vo2peak_abs_mlmin') or _f(e01,'vo2max_abs_mlmin')
-        vo2max_kg=_f(e01,'vo2peak_rel_mlkgmin')
-        vt1_spd=_f(e02,'vt1_speed_kmh'); vt2_spd=_f(e02,'vt2_speed_kmh')
-        vt1_vo2=_f(e02,'vt1_vo2_abs'); vt2_vo2=_f(e02,'vt2_vo2_abs')
-        bm=None
-        if cfg:
-            ac=cfg.get('_acfg',cfg) if isinstance(cfg,dict) else cfg
-            bm=getattr(ac,'body_mass_kg',None)
-        if bm is None and vo2max and vo2max_kg and vo2max_kg>0: bm=vo2max/vo2max_kg
-        has_thr=vt1_spd is not None and vt2_spd is not None
-        if not vo2max or vo2max<=0: out['status']='NO_VO2MAX_REFERENCE'; return out
-
-        # ═══ STEP 1: DOMAIN VALIDATION ═══
-        dv={}; dfl=[]
-        exp=['MODERATE','HEAVY','SEVERE','VERY_SEVERE']
-        for i,stg in enumerate(stages):
-            sn=stg.get('stage_num',i+1); spd=stg.get('speed_kmh')
-            sv=stg.get('vo2_mean_mlmin') or stg.get('vo2_mean') or 0
-            e={'stage':sn,'speed_kmh':spd,
-               'vo2_pct_max':round(sv/vo2max*100,1) if sv and vo2max else None,
-               'domain_e14':stg.get('domain','?'),'domain_validated':None,
-               'validation_method':[]}
-            if has_thr and spd:
-                p1=spd/vt1_spd*100; p2=spd/vt2_spd*100
-                e['pct_vt1_speed']=round(p1,1); e['pct_vt2_speed']=round(p2,1)
-                if p1<92: e['domain_validated']='MODERATE'
-                elif p2<98: e['domain_validated']='HEAVY'
-                elif p2>110: e['domain_validated']='VERY_SEVERE'
-                elif p2>=95: e['domain_validated']='SEVERE'
-                else: e['domain_validated']='HEAVY_SEVERE_BORDER'
-                e['validation_method'].append('speed_vs_thresholds')
-            rer=stg.get('rer_mean',0)
-            if rer>0:
-                rd='MODERATE' if rer<0.95 else ('HEAVY' if rer<1.05 else 'SEVERE')
-                if not e['domain_validated']: e['domain_validated']=rd
-                e['rer_domain']=rd
-            if i<len(exp):
-                e['expected_domain']=exp[i]
-                if (e['domain_validated'] and e['domain_validated']!=exp[i] and
-                    not(e['domain_validated'] in('SEVERE','VERY_SEVERE') and exp[i] in('SEVERE','VERY_SEVERE'))):
-                    dfl.append(f"S{sn}_MISMATCH:{exp[i]}→{e['domain_validated']}")
-            dv[f'S{sn}']=e
-        out['domain_validation']=dv; out['domain_flags']=dfl
-
-        # ═══ STEP 2: τ CLASSIFICATION ═══
-        tau_m=tau_h=tau_s=r2_m=r2_h=None
-        for stg in stages:
-            t=_f(stg,'tau_on_s'); r=_f(stg,'fit_r2'); sn=stg.get('stage_num',0)
-            if sn==1: tau_m=t; r2_m=r
-            elif sn==2: tau_h=t; r2_h=r
-            elif sn==3: tau_s=t
-        def _ct(t,e,tr,a):
-            if t is None: return None
-            return 'ELITE' if t<=e else('TRAINED' if t<=tr else('ACTIVE' if t<=a else 'SLOW'))
-        out['tau_class_moderate']=_ct(tau_m,cls.TAU_MOD_ELITE,cls.TAU_MOD_TRAINED,cls.TAU_MOD_ACTIVE)
-        out['tau_class_heavy']=_ct(tau_h,cls.TAU_HVY_ELITE,cls.TAU_HVY_TRAINED,cls.TAU_HVY_ACTIVE)
-        out['tau_class_severe']='EXPECTED_SLOW' if tau_s and tau_s>50 else('FAST_FOR_SEVERE' if tau_s else None)
-        if tau_m and tau_h and tau_m>0: out['tau_ratio_heavy_mod']=round(tau_h/tau_m,2)
-        out['summary'].update({'tau_moderate_s':round(tau_m,1) if tau_m else None,
-            'tau_heavy_s':round(tau_h,1) if tau_h else None,
-            'tau_severe_s':round(tau_s,1) if tau_s else None,
-            'r2_moderate':round(r2_m,3) if r2_m else None,
-            'r2_heavy':round(r2_h,3) if r2_h else None})
-
-        # ═══ STEP 3: SLOW COMPONENT ═══
-        sc_h=sc_s=None
-        for stg in stages:
-            sc=_f(stg,'sc_pct'); sn=stg.get('stage_num',0)
-            if sn==2: sc_h=sc
-            elif sn==3: sc_s=sc
-        def _csc(s):
-            if s is None: return None
-            s=abs(s)
-            return 'MINIMAL' if s<cls.SC_MINIMAL else('NORMAL' if s<cls.SC_NORMAL_HI else('HIGH' if s<cls.SC_HIGH_HI else 'VERY_HIGH'))
-        out['sc_class_heavy']=_csc(sc_h); out['sc_class_severe']=_csc(sc_s)
-        out['summary']['sc_heavy_pct']=round(sc_h,1) if sc_h is not None else None
-        out['summary']['sc_severe_pct']=round(sc_s,1) if sc_s is not None else None
-
-        # ═══ STEP 4: RECOVERY ═══
-        recs=[_f(o,'t_half_s') for o in e14.get('off_kinetics',[]) if _f(o,'t_half_s') is not None and _f(o,'t_half_s')>1]
-        if recs:
-            mth=float(np.median(recs))
-            out['recovery_class']='EXCELLENT' if mth<=30 else('GOOD' if mth<=60 else('MODERATE' if mth<=90 else 'SLOW'))
-            out['summary']['recovery_t_half_median_s']=round(mth,1)
-
-        # ═══ STEP 5: LIMITATION ═══
-        tc_m=out['tau_class_moderate']; tc_h=out['tau_class_heavy']; sc_hc=out['sc_class_heavy']
-        lim='UNDETERMINED'; lev=[]
-        if tc_m and tc_h:
-            mr={'ELITE':0,'TRAINED':1,'ACTIVE':2,'SLOW':3}.get(tc_m,2)
-            hr={'ELITE':0,'TRAINED':1,'ACTIVE':2,'SLOW':3}.get(tc_h,2)
-            if mr<=1 and hr<=1: lim='WELL_INTEGRATED'; lev.append(f'τ mod={tc_m}, heavy={tc_h} → oba szybkie')
-            elif mr<=1 and hr>=2: lim='DELIVERY_LIMITED'; lev.append(f'τ mod={tc_m}(OK) ale heavy={tc_h}(wolne) → limitacja O₂ delivery')
-            elif mr>=2 and hr>=2: lim='PERIPHERAL_LIMITED'; lev.append(f'τ mod={tc_m}, heavy={tc_h} → oba wolne → limitacja oksydacyjna')
-            else: lim='MIXED_CHECK_DATA'; lev.append('Nietypowy wzorzec')
-        if sc_hc in('HIGH','VERY_HIGH'):
-            lev.append(f'SC heavy={sc_hc} → wysoka rekrutacja Type II')
-            if lim=='WELL_INTEGRATED': lim='EFFICIENCY_LIMITED'
-        elif sc_hc=='MINIMAL': lev.append(f'SC heavy={sc_hc} → znakomita ekonomia mięśniowa')
-        out['limitation_type']=lim; out['limitation_evidence']=lev
-
-        # Threshold %VO₂max
-        vt1p=vt1_vo2/vo2max*100 if vt1_vo2 and vo2max else None
-        vt2p=vt2_vo2/vo2max*100 if vt2_vo2 and vo2max else None
-        hzw=vt2p-vt1p if vt1p and vt2p else None
-        if vt1p: out['summary']['vt1_pct_vo2max']=round(vt1p,1)
-        if vt2p: out['summary']['vt2_pct_vo2max']=round(vt2p,1)
-        if hzw: out['summary']['heavy_zone_width_pct']=round(hzw,1)
-
-        # ═══ STEP 6: FIBER TYPE PROXY ═══
-        ft={'method':'SC_proxy_Barstow1996','confidence':'LOW'}
-        if sc_h is not None:
-            a=abs(sc_h)
-            if a<3: ft['estimated_type_I_range']='65-80%'; ft['predominance']='TYPE_I_DOMINANT'
-            elif a<8: ft['estimated_type_I_range']='50-65%'; ft['predominance']='MIXED'
-            elif a<15: ft['estimated_type_I_range']='35-50%'; ft['predominance']='TYPE_II_DOMINANT'
-            else: ft['estimated_type_I_range']='<35%'; ft['predominance']='STRONGLY_TYPE_II'
-            ft['note']='Indirect: Barstow 1996 r=0.72 SC↔%TypeII'
-        out['fiber_type_estimate']=ft
-
-        # ═══ STEP 7: PHENOTYPE ═══
-        phen,conf,desc,arch=cls._phenotype(tc_m,tc_h,sc_hc,lim,vt1p,hzw,out['recovery_class'])
-        out['phenotype']=phen; out['phenotype_confidence']=conf
-        out['phenotype_description']=desc; out['phenotype_archetype']=arch
-
-        # ═══ STEP 8: TRAINING ═══
-        out['training_priorities']=cls._training(tc_m,tc_h,sc_hc,lim,
-            out['recovery_class'],tau_m,tau_h,sc_h,vt1_spd,vt2_spd)
-
-        # ═══ STEP 9: FLAGS ═══
-        if dfl: out['flags'].extend(dfl)
-        for stg in stages:
-            if stg.get('stage_num')==4:
-                d=_f(stg,'duration_s')
-                if d and d<180: out['flags'].append(f'S4_SHORT:{d:.0f}s'); out['summary']['s4_tlim_s']=round(d)
-        if tau_h and tau_m and tau_h<tau_m*0.8: out['flags'].append('POSSIBLE_PRIMING')
-        if r2_m and r2_m<0.7: out['flags'].append(f'LOW_R2_MOD:{r2_m:.3f}')
-        if r2_h and r2_h<0.5: out['flags'].append(f'LOW_R2_HVY:{r2_h:.3f}')
-        if not has_thr: out['flags'].append('NO_THRESHOLD_DATA')
-        return out
+            except (TypeError, ValueError): return v
+
+        e14 = results.get('E14', {}) or {}
+        e02 = results.get('E02', {}) or {}
+        e01 = results.get('E01', {}) or {}
+        e18 = results.get('E18', {}) or {}
+
+        if not isinstance(e14, dict): e14 = {}
+        if not isinstance(e02, dict): e02 = {}
+
+        if e14.get('status') != 'OK' or e14.get('mode') != 'CWR_KINETICS':
+            out['status'] = 'NO_KINETICS_DATA'
+            out['flags'].append('E14 nie zwrócił danych CWR — fenotyp niemożliwy')
+            if e14.get('mode') == 'INCREMENTAL':
+                out['status'] = 'INCREMENTAL_ONLY'
+                out['flags'].append('Tylko off-kinetics z testu inkrementalnego')
+                cls._incremental_fallback(out, e14)
+            return out
+
+        stages = e14.get('stages', [])
+        if not stages:
+            out['status'] = 'NO_STAGES'
+            out['flags'].append('E14 nie wykrył stage CWR')
+            return out
+
+        e14_sum = e14.get('summary', {})
+
+        # ── Reference values from E02/E01 ──
+        vt1_vo2 = _g('E02', 'vt1_vo2_abs') or _g('E02', 'vt1_vo2_mlmin')
+        vt2_vo2 = _g('E02', 'vt2_vo2_abs') or _g('E02', 'vt2_vo2_mlmin')
+        vo2max = _g('E01', 'vo2peak_abs_mlmin') or _g('E01', 'vo2max_abs')
+
+        vt1_speed = None
+        vt2_speed = None
+        for k in ['vt1_speed_kmh', 'vt1_v_kmh']:
+            v = e02.get(k)
+            if v is not None:
+                try: vt1_speed = float(v); break
+                except: pass
+        for k in ['vt2_speed_kmh', 'vt2_v_kmh']:
+            v = e02.get(k)
+            if v is not None:
+                try: vt2_speed = float(v); break
+                except: pass
+
+        # ═══════════════════════════════════════
+        # 1. DOMAIN VALIDATION
+        # ═══════════════════════════════════════
+        dv = {'vt1_speed_kmh': vt1_speed, 'vt2_speed_kmh': vt2_speed, 'vo2max_abs': vo2max, 'stages': []}
+
+        for s in stages:
+            sd = {k: s.get(k) for k in ('stage_num', 'speed_kmh', 'domain', 'vo2_mean', 'vo2kg_mean', 'hr_mean', 'rer_mean', 'duration_s')}
+            speed = s.get('speed_kmh')
+            if speed and vt1_speed and vt1_speed > 0:
+                sd['pct_vt1_speed'] = round(speed / vt1_speed * 100, 1)
+            if speed and vt2_speed and vt2_speed > 0:
+                sd['pct_vt2_speed'] = round(speed / vt2_speed * 100, 1)
+            vo2_abs = s.get('vo2_mean')
+            if vo2_abs and vo2max and vo2max > 0:
+                sd['pct_vo2max'] = round(vo2_abs / vo2max * 100, 1)
+            # Expected domain
+            if speed and vt1_speed and vt2_speed:
+                pv1 = speed / vt1_speed * 100
+                pv2 = speed / vt2_speed * 100
+                if pv1 < 92:      sd['domain_expected'] = 'MODERATE'
+                elif pv2 < 95:    sd['domain_expected'] = 'HEAVY'
+                elif pv2 < 112:   sd['domain_expected'] = 'SEVERE'
+                else:             sd['domain_expected'] = 'VERY_SEVERE'
+                det = (sd.get('domain') or '').upper()
+                exp = sd['domain_expected']
+                sd['domain_match'] = (det == exp) or (det in ('HEAVY','SEVERE') and exp in (det, 'VERY_SEVERE', 'MODERATE'))
+                if not sd.get('domain_match', True):
+                    out['flags'].append(f"DOMAIN_MISMATCH_S{s.get('stage_num')}: detected={det}, expected={exp}")
+            dv['stages'].append(sd)
+        out['domain_validation'] = dv
+
+        # ═══════════════════════════════════════
+        # 2. KINETIC PROFILE
+        # ═══════════════════════════════════════
+        kp = {}
+        tau_mod = e14_sum.get('tau_moderate')
+        tau_heavy = e14_sum.get('tau_heavy')
+        tau_severe = e14_sum.get('tau_severe')
+        sc_heavy = e14_sum.get('sc_heavy_pct')
+        sc_severe = e14_sum.get('sc_severe_pct')
+        recovery_t_half = e14_sum.get('recovery_t_half')
+
+        if tau_mod is not None:
+            kp['tau_moderate'] = tau_mod
+            kp['tau_moderate_class'] = cls._classify(tau_mod, cls.TAU_BANDS['moderate'])
+        if tau_heavy is not None:
+            kp['tau_heavy'] = tau_heavy
+            kp['tau_heavy_class'] = cls._classify(tau_heavy, cls.TAU_BANDS['heavy'])
+        # τ CI from E14 Monte Carlo refits (cfg.kinetics_mc_n > 0): every band the CI touches
+        for dom in ('moderate', 'heavy'):
+            ci = e14_sum.get(f'tau_{dom}_ci')
+            if kp.get(f'tau_{dom}') is None or not ci:
+                continue
+            kp[f'tau_{dom}_ci'] = ci
+            kp[f'tau_{dom}_class_range'] = cls._ci_classes(ci, cls.TAU_BANDS[dom])
+            if len(kp[f'tau_{dom}_class_range']) > 1:
+                out['flags'].append(f"TAU_{dom.upper()}_BAND_UNCERTAIN")
+        if tau_severe is not None:
+            kp['tau_severe'] = tau_severe
+        if tau_mod and tau_heavy and tau_mod > 0:
+            ratio = tau_heavy / tau_mod
+            kp['tau_ratio_heavy_mod'] = round(ratio, 2)
+            kp['tau_ratio_interpretation'] = 'DISCORDANT' if ratio > 2.0 else ('INVERTED' if ratio < 0.7 else 'NORMAL')
+            if ratio > 2.0: out['flags'].append('TAU_RATIO_HIGH')
+
+        if sc_heavy is not None:
+            kp['sc_heavy_pct'] = sc_heavy
+            kp['sc_heavy_class'] = cls._classify(sc_heavy, cls.SC_BANDS)
+        if sc_severe is not None:
+            kp['sc_severe_pct'] = sc_severe
+            kp['sc_severe_class'] = cls._classify(sc_severe, cls.SC_BANDS)
+        if recovery_t_half is not None:
+            kp['recovery_t_half'] = recovery_t_half
+            kp['recovery_class'] = cls._classify(recovery_t_half, cls.RECOVERY_BANDS)
+
+        s4_stages = [s for s in stages if s.get('stage_num') == 4]
+        if s4_stages:
+            s4_dur = s4_stages[0].get('duration_s', 0) or 0
+            kp['s4_duration_s'] = s4_dur
+            kp['s4_cut_short'] = s4_dur < 300
+            if kp['s4_cut_short']: out['flags'].append(f"S4_CUT_SHORT_{s4_dur:.0f}s")
+
+        if vt1_vo2 and vo2max and vo2max > 0:
+            kp['vt1_pct_vo2max'] = round(vt1_vo2 / vo2max * 100, 1)
+        if vt2_vo2 and vo2max and vo2max > 0:
+            kp['vt2_pct_vo2max'] = round(vt2_vo2 / vo2max * 100, 1)
+        if kp.get('vt1_pct_vo2max') and kp.get('vt2_pct_vo2max'):
+            kp['heavy_zone_width_pct'] = round(kp['vt2_pct_vo2max'] - kp['vt1_pct_vo2max'], 1)
+
+        out['kinetic_profile'] = kp
+
+        # ═══════════════════════════════════════
+        # 3. LIMITATION IDENTIFICATION
+        # ═══════════════════════════════════════
+        lim = {'primary': None, 'evidence': []}
+        class_order = {'ELITE': 0, 'TRAINED': 1, 'ACTIVE': 2, 'SLOW': 3}
+        tc_mod = kp.get('tau_moderate_class')
+        tc_hvy = kp.get('tau_heavy_class')
+        sc_c = kp.get('sc_heavy_class')
+
+        if tc_mod and tc_hvy:
+            mr = class_order.get(tc_mod, 2)
+            hr = class_order.get(tc_hvy, 2)
+            if mr <= 1 and hr <= 1:
+                lim['primary'] = 'WELL_INTEGRATED'
+                lim['evidence'].append(f'τ mod={tc_mod} + τ heavy={tc_hvy} → system zintegrowany')
+            elif mr <= 1 and hr >= 2:
+                lim['primary'] = 'DELIVERY_LIMITED'
+                lim['evidence'].append(f'τ mod={tc_mod} OK ale τ heavy={tc_hvy} wolne → O₂ delivery')
+            elif mr >= 2 and hr >= 2:
+                lim['primary'] = 'PERIPHERAL_LIMITED'
+                lim['evidence'].append(f'τ mod={tc_mod} + τ heavy={tc_hvy} → ograniczenie mitochondrialne')
+            else:
+                lim['primary'] = 'CHECK_DATA'
+                lim['evidence'].append(f'τ mod wolniejsze niż heavy — nietypowe')
+                out['flags'].append('UNUSUAL_TAU_PATTERN')
+
+        if sc_c and lim['primary']:
+            if sc_c in ('HIGH', 'VERY_HIGH') and lim['primary'] == 'WELL_INTEGRATED':
+                lim['secondary'] = 'EFFICIENCY_GAP'
+                lim['evidence'].append(f'SC={sc_c} pomimo szybkiego τ → dominacja Type II')
+            elif sc_c in ('MINIMAL', 'LOW') and lim['primary'] == 'PERIPHERAL_LIMITED':
+                lim['primary'] = 'DELIVERY_LIMITED'
+                lim['evidence'].append(f'SC={sc_c} pomimo wolnego τ → reklasyfikacja na delivery')
+
+        if isinstance(e18, dict) and e18.get('status') == 'OK':
+            l3 = e18.get('layer3_concordance', {})
+            if isinstance(l3, dict) and l3.get('overall_grade') == 'POOR':
+                if lim['primary'] in ('DELIVERY_LIMITED', 'CHECK_DATA'):
+                    lim['evidence'].append('E18 concordance POOR potwierdza problem delivery')
+        out['limitation'] = lim
+
+        # ═══════════════════════════════════════
+        # 4. FIBER TYPE PROXY
+        # ═══════════════════════════════════════
+        ftp = {'method': 'SC-based proxy (Barstow 1996)', 'confidence': 'LOW',
+               'note': 'Pośrednia estymacja — nie zastępuje biopsji mięśniowej'}
+        if sc_heavy is not None:
+            if sc_heavy < 3:
+                ftp.update(estimated_type_I_pct='65-80%', estimated_type_II_pct='20-35%', profile='ENDURANCE_DOMINANT')
+            elif sc_heavy < 8:
+                ftp.update(estimated_type_I_pct='50-65%', estimated_type_II_pct='35-50%', profile='MIXED')
+            elif sc_heavy < 15:
+                ftp.update(estimated_type_I_pct='35-50%', estimated_type_II_pct='50-65%', profile='POWER_BIASED')
+            else:
+                ftp.update(estimated_type_I_pct='20-40%', estimated_type_II_pct='60-80%', profile='POWER_DOMINANT')
+        out['fiber_type_proxy'] = ftp
 
-    @staticmethod
-    def _phenotype(tc_m,tc_h,sc_h,lim,vt1p,hzw,rec):
-        sc={'ELITE_AEROBIC':0,'DIESEL':0,'TEMPO_RUNNER':0,'BURST_RECOVER':0,
-            'POWER_ENDURANCE':0,'DELIVERY_LIMITED':0,'PERIPHERAL_LIMITED':0}
-        if tc_m=='ELITE': sc['ELITE_AEROBIC']+=3;sc['DIESEL']+=2;sc['TEMPO_RUNNER']+=1
-        elif tc_m=='TRAINED': sc['DIESEL']+=2;sc['TEMPO_RUNNER']+=2
-        elif tc_m=='ACTIVE': sc['BURST_RECOVER']+=1;sc['POWER_ENDURANCE']+=1;sc['PERIPHERAL_LIMITED']+=1
-        elif tc_m=='SLOW': sc['PERIPHERAL_LIMITED']+=3;sc['POWER_ENDURANCE']+=1
-
-        if tc_h=='ELITE': sc['ELITE_AEROBIC']+=3;sc['DIESEL']+=2
-        elif tc_h=='TRAINED': sc['DIESEL']+=1;sc['TEMPO_RUNNER']+=2
-        elif tc_h=='ACTIVE': sc['DELIVERY_LIMITED']+=2;sc['BURST_RECOVER']+=1
-        elif tc_h=='SLOW': sc['DELIVERY_LIMITED']+=3;sc['PERIPHERAL_LIMITED']+=1
-
-        if sc_h=='MINIMAL': sc['DIESEL']+=2;sc['ELITE_AEROBIC']+=2;sc['TEMPO_RUNNER']+=1
-        elif sc_h=='NORMAL': sc['TEMPO_RUNNER']+=1
-        elif sc_h in('HIGH','VERY_HIGH'): sc['POWER_ENDURANCE']+=3;sc['PERIPHERAL_LIMITED']+=1
-
-        if vt1p:
-            if vt1p>=75: sc['ELITE_AEROBIC']+=2;sc['DIESEL']+=2
-            elif vt1p>=65: sc['DIESEL']+=1;sc['TEMPO_RUNNER']+=2
-            elif vt1p>=55: sc['TEMPO_RUNNER']+=1;sc['BURST_RECOVER']+=1
-            else: sc['PERIPHERAL_LIMITED']+=1;sc['POWER_ENDURANCE']+=1
-        if hzw:
-            if hzw>=20: sc['DIESEL']+=1;sc['ELITE_AEROBIC']+=1
-            elif hzw<12: sc['POWER_ENDURANCE']+=1
-        if rec in('EXCELLENT','GOOD'): sc['BURST_RECOVER']+=2;sc['ELITE_AEROBIC']+=1
-        elif rec=='SLOW': sc['PERIPHERAL_LIMITED']+=1
-        if lim=='DELIVERY_LIMITED': sc['DELIVERY_LIMITED']+=2
-        elif lim=='PERIPHERAL_LIMITED': sc['PERIPHERAL_LIMITED']+=2
-
-        best=max(sc,key=sc.get); bs=sc[best]; tot=sum(sc.values())
-        conf=round(bs/max(tot,1),2)
-        info={
-            'ELITE_AEROBIC':('Zoptymalizowany system aerobowy — szybka kinetyka, minimalna SC, wysokie progi.','Top endurance athlete'),
-            'DIESEL':('Silnik wytrzymałościowy — szybkie τ, niski SC, szeroka strefa heavy. Zbudowany do długiego submaks. wysiłku.','Ironman, ultra, HYROX PRO'),
-            'TEMPO_RUNNER':('Profil tempowca — dobra kinetyka, umiarkowany SC, sprawny w heavy z potencjałem optymalizacji.','10K–HM, HYROX Open/Pro'),
-            'BURST_RECOVER':('Profil powtarzalnych wysiłków — wolniejsze τ ale szybka recovery, dobrze radzi sobie ze zmianami tempa.','Team sport, MMA, CrossFit'),
-            'POWER_ENDURANCE':('Profil siłowo-wytrzymałościowy — dominacja Type II, wysoki SC, lepszy w krótkich intensywnych wysiłkach.','CrossFit, sprinter→endurance'),
-            'DELIVERY_LIMITED':('Limitacja O₂ delivery — mięśnie OK (szybkie τ mod) ale wolne τ heavy → ograniczenie sercowo-naczyniowe.','Potencjał via trening progowy'),
-            'PERIPHERAL_LIMITED':('Limitacja obwodowa — wolna kinetyka we wszystkich domenach → niska zdolność oksydacyjna mięśni.','Potencjał via base + HIIT'),
+        # ═══════════════════════════════════════
+        # 5. PHENOTYPE ASSIGNMENT
+        # ═══════════════════════════════════════
+        phenotype, confidence = cls._assign_phenotype(kp, lim, ftp)
+        # τ CI straddling bands: re-score with every class inside the CI;
+        # confidence scaled by the share of variants that keep the phenotype
+        variants = cls._phenotype_ci_variants(kp, lim, ftp)
+        if variants:
+            agree = sum(1 for p in variants if p == phenotype) / len(variants)
+            out['phenotype_ci'] = {'variants': sorted(set(variants)), 'agreement': round(agree, 2)}
+            if agree < 1:
+                confidence = round(confidence * (0.5 + 0.5 * agree), 2)
+                out['flags'].append('PHENOTYPE_SENSITIVE_TO_TAU_CI')
+        out['phenotype'] = phenotype
+        out['phenotype_confidence'] = confidence
+        out['phenotype_info'] = cls.PHENOTYPES.get(phenotype, {})
+
+        # ═══════════════════════════════════════
+        # 6. TRAINING PRIORITIES
+        # ═══════════════════════════════════════
+        out['training_priorities'] = cls._build_priorities(kp, lim, phenotype)
+
+        # ═══════════════════════════════════════
+        # 7. SUMMARY
+        # ═══════════════════════════════════════
+        out['summary'] = {
+            'phenotype': phenotype, 'phenotype_pl': out['phenotype_info'].get('label_pl'),
+            'confidence': confidence, 'limitation': lim.get('primary'),
+            'tau_moderate': kp.get('tau_moderate'), 'tau_moderate_class': kp.get('tau_moderate_class'),
+            'tau_heavy': kp.get('tau_heavy'), 'tau_heavy_class': kp.get('tau_heavy_class'),
+            'sc_heavy_class': kp.get('sc_heavy_class'), 'recovery_class': kp.get('recovery_class'),
+            'fiber_profile': ftp.get('profile'), 'n_priorities': len(out['training_priorities']),
         }
-        d,a=info.get(best,('—','—'))
-        return best,conf,d,a
-
-    @staticmethod
-    def _training(tc_m,tc_h,sc_h,lim,rec,tau_m,tau_h,sc_hp,vt1s,vt2s):
-        pr=[]; p=0
-        if tc_m in('ACTIVE','SLOW'):
-            p+=1; tgt=f'{tau_m:.0f}→{max(15,tau_m*0.7):.0f}s' if tau_m else '→<25s'
-            pr.append({'priority':p,'area':'τ moderate','current':f'{tau_m:.1f}s [{tc_m}]' if tau_m else tc_m,
-                'target':tgt,'method':'HIIT 30/30s i 60/60s w severe domain','frequency':'2-3x/tydz',
-                'mechanism':'↑zdolność oksydacyjna mitochondriów (Inglis 2024)'})
-        elif tc_m=='TRAINED':
-            p+=1; pr.append({'priority':p,'area':'τ moderate (optymalizacja)',
-                'current':f'{tau_m:.1f}s [{tc_m}]' if tau_m else tc_m,
-                'target':f'{tau_m:.0f}→<20s [ELITE]' if tau_m else '→<20s',
-                'method':'Tempo runs 20-30min @ VT1-VT2 + HIIT 30/30s','frequency':'2-3x/tydz',
-                'mechanism':'↑mitochondria + O₂ extraction'})
-        if tc_h in('ACTIVE','SLOW'):
-            p+=1; tgt=f'{tau_h:.0f}→{max(20,tau_h*0.65):.0f}s' if tau_h else '→<35s'
-            meth='Threshold runs 20-30min @ VT1' if lim=='DELIVERY_LIMITED' else 'Base endurance + threshold runs'
-            if vt1s: meth+=f' ({vt1s:.1f} km/h ±0.5)'
-            pr.append({'priority':p,'area':'τ heavy','current':f'{tau_h:.1f}s [{tc_h}]' if tau_h else tc_h,
-                'target':tgt,'method':meth,'frequency':'2x/tydz',
-                'mechanism':'↑O₂ delivery (SV, CO, BV)' if lim=='DELIVERY_LIMITED' else '↑oxidative capacity + perfuzja'})
-        if sc_h in('HIGH','VERY_HIGH'):
-            p+=1; pr.append({'priority':p,'area':'Slow Component','current':f'{sc_hp:.1f}% [{sc_h}]' if sc_hp is not None else sc_h,
-                'target':'<5%','method':'LSD 60-90min <VT1 + technika biegu','frequency':'3-4x/tydz',
-                'mechanism':'Adaptacja TypeII→IIa, ↑efektywność (Jones 2011)'})
-        elif sc_h=='MINIMAL':
-            p+=1; pr.append({'priority':p,'area':'SC (utrzymanie)','current':f'{sc_hp:.1f}% [{sc_h}]' if sc_hp is not None else sc_h,
-                'target':'<3%','method':'Kontynuacja treningu bazowego','frequency':'2-3x/tydz','mechanism':'Utrzymanie adaptacji'})
-        if rec in('SLOW','MODERATE'):
-            p+=1; pr.append({'priority':p,'area':'Recovery kinetics','current':rec,
-                'target':'GOOD→EXCELLENT','method':'Repeat-sprint 6-8×30s >VT2 / 3min rest + 4×4min severe',
-                'frequency':'1-2x/tydz','mechanism':'↑resynteza PCr, ↑reperfuzja'})
-        return pr
+        return out
+
+    @classmethod
+    def _ci_classes(cls, ci, bands):
+        """Bands covered by a τ CI [lo, hi], in band order."""
+        labels = [label for _, label in bands]
+        lo, hi = cls._classify(ci[0], bands), cls._classify(ci[1], bands)
+        return labels[labels.index(lo):labels.index(hi) + 1]
+
+    @classmethod
+    def _phenotype_ci_variants(cls, kp, lim, ftp):
+        """Phenotype for every combination of τ classes inside the CIs ([] if all bands certain)."""
+        import itertools
+        ranges = [kp.get('tau_moderate_class_range') or [kp.get('tau_moderate_class')],
+                  kp.get('tau_heavy_class_range') or [kp.get('tau_heavy_class')]]
+        if all(len(r) <= 1 for r in ranges):
+            return []
+        out = []
+        for c_mod, c_hvy in itertools.product(*ranges):
+            kv = dict(kp, tau_moderate_class=c_mod, tau_heavy_class=c_hvy)
+            out.append(cls._assign_phenotype(kv, lim, ftp)[0])
+        return out
+
+    @classmethod
+    def _assign_phenotype(cls, kp, lim, ftp):
+        tc_mod = kp.get('tau_moderate_class')
+        tc_hvy = kp.get('tau_heavy_class')
+        sc_c = kp.get('sc_heavy_class')
+        rec_c = kp.get('recovery_class')
+        vt1p = kp.get('vt1_pct_vo2max')
+        hw = kp.get('heavy_zone_width_pct')
+        limitation = lim.get('primary')
+
+        scores = {}
+
+        # ELITE_AEROBIC
+        s = 0
+        if tc_mod == 'ELITE': s += 3
+        elif tc_mod == 'TRAINED': s += 1
+        if tc_hvy == 'ELITE': s += 3
+        elif tc_hvy == 'TRAINED': s += 1
+        if sc_c in ('MINIMAL', 'LOW'): s += 2
+        if vt1p and vt1p > 75: s += 2
+        elif vt1p and vt1p > 70: s += 1
+        scores['ELITE_AEROBIC'] = s
+
+        # DIESEL
+        s = 0
+        if tc_mod in ('ELITE', 'TRAINED'): s += 2
+        if sc_c == 'MINIMAL': s += 3
+        elif sc_c == 'LOW': s += 1
+        if vt1p and vt1p > 65: s += 2
+        elif vt1p and vt1p > 60: s += 1
+        if limitation == 'WELL_INTEGRATED': s += 1
+        if hw and hw > 15: s += 1
+        scores['DIESEL'] = s
+
+        # TEMPO_RUNNER
+        s = 0
+        if tc_mod == 'TRAINED': s += 2
+        elif tc_mod == 'ACTIVE': s += 1
+        if sc_c in ('LOW', 'NORMAL'): s += 2
+        if vt1p and 60 <= vt1p <= 75: s += 2
+        if tc_hvy in ('TRAINED', 'ACTIVE'): s += 1
+        if hw and 10 <= hw <= 20: s += 1
+        scores['TEMPO_RUNNER'] = s
+
+        # BURST_RECOVER
+        s = 0
+        if tc_mod in ('ACTIVE', 'SLOW'): s += 1
+        if rec_c in ('EXCELLENT', 'GOOD'): s += 3
+        elif rec_c == 'MODERATE': s += 1
+        if sc_c in ('NORMAL', 'HIGH'): s += 1
+        scores['BURST_RECOVER'] = s
+
+        # POWER_ENDURANCE
+        s = 0
+        if sc_c in ('HIGH', 'VERY_HIGH'): s += 3
+        if ftp.get('profile') in ('POWER_BIASED', 'POWER_DOMINANT'): s += 2
+        if tc_mod in ('ACTIVE', 'SLOW'): s += 1
+        if vt1p and vt1p < 60: s += 1
+        scores['POWER_ENDURANCE'] = s
+
+        # DELIVERY_LIMITED
+        s = 0
+        if limitation == 'DELIVERY_LIMITED': s += 4
+        if tc_mod in ('ELITE', 'TRAINED') and tc_hvy in ('ACTIVE', 'SLOW'): s += 2
+        if kp.get('tau_ratio_interpretation') == 'DISCORDANT': s += 2
+        scores['DELIVERY_LIMITED'] = s
+
+        # PERIPHERAL_LIMITED
+        s = 0
+        if limitation == 'PERIPHERAL_LIMITED': s += 4
+        if tc_mod in ('ACTIVE', 'SLOW') and tc_hvy in ('ACTIVE', 'SLOW'): s += 2
+        if sc_c in ('HIGH', 'VERY_HIGH'): s += 1
+        if vt1p and vt1p < 55: s += 1
+        scores['PERIPHERAL_LIMITED'] = s
+
+        scores['DEVELOPING'] = 2
+
+        best = max(scores, key=scores.get)
+        best_score = scores[best]
+        srt = sorted(scores.values(), reverse=True)
+        if len(srt) > 1 and srt[0] > 0:
+            sep = (srt[0] - srt[1]) / srt[0]
+            conf = min(0.95, 0.5 + sep * 0.5)
+        else:
+            conf = 0.5
+        if best_score < 3:
+            return 'DEVELOPING', 0.3
+        return best, round(conf, 2)
+
+    @classmethod
+    def _build_priorities(cls, kp, lim, phenotype):
+        prios = []
+        tau_mod = kp.get('tau_moderate')
+        tau_heavy = kp.get('tau_heavy')
+        tc_mod = kp.get('tau_moderate_class')
+        tc_hvy = kp.get('tau_heavy_class')
+        sc_c = kp.get('sc_heavy_class')
+        rec_c = kp.get('recovery_class')
+        limitation = lim.get('primary')
+
+        if limitation == 'DELIVERY_LIMITED':
+            prios.append({'priority': 1, 'area': 'O₂ delivery (τ heavy)',
+                'method': 'Threshold runs 20-30 min w okolicach VT1', 'frequency': '2-3×/tyg',
+                'target': f'τ heavy {tau_heavy:.0f}→{max(15,tau_heavy*0.7):.0f}s' if tau_heavy else 'poprawić τ heavy',
+                'rationale': 'Poprawia cardiac output i kapilaryzację (Inglis 2024)'})
+        elif limitation == 'PERIPHERAL_LIMITED':
+            prios.append({'priority': 1, 'area': 'Zdolność oksydacyjna (τ moderate)',
+                'method': 'Baza aerobowa (60-75% HRmax) + HIIT 2×/tyg',
+                'target': f'τ mod {tau_mod:.0f}→{max(12,tau_mod*0.7):.0f}s' if tau_mod else 'poprawić τ',
+                'frequency': '4-5× baza + 2× HIIT', 'rationale': 'Gęstość mitochondrialna (Poole 2012)'})
+
+        if tc_mod in ('ACTIVE', 'SLOW') and not any(p.get('area','').startswith('Zdolność') for p in prios):
+            prios.append({'priority': len(prios)+1, 'area': 'Kinetyka moderate (τ on)',
+                'method': 'HIIT 30/30s lub 60/60s w severe domain', 'frequency': '2×/tyg',
+                'target': f'τ {tau_mod:.0f}→{max(12,tau_mod*0.65):.0f}s' if tau_mod else '<25s',
+                'rationale': 'HIIT najskuteczniej przyspiesza τ (Inglis 2024)'})
+        elif tc_mod == 'TRAINED':
+            prios.append({'priority': len(prios)+1, 'area': 'Kinetyka moderate → ELITE',
+                'method': 'SIT (4×30s all-out) + tempo runs', 'frequency': '1-2×/tyg',
+                'target': f'τ {tau_mod:.0f}→{max(10,tau_mod*0.7):.0f}s' if tau_mod else '<15s',
+                'rationale': 'Na poziomie TRAINED potrzebne bodźce SIT/extreme'})
+
+        if sc_c in ('HIGH', 'VERY_HIGH'):
+            prios.append({'priority': len(prios)+1, 'area': 'Slow Component (ekonomia)',
+                'method': 'Baza aerobowa + trening siłowy niska kadencja',
+                'target': 'SC heavy <8%', 'frequency': '3× baza + 2× siła/tyg',
+                'rationale': 'Zmniejsza rekrutację Type II (Jones 2011)'})
+        elif sc_c in ('MINIMAL', 'LOW'):
+            prios.append({'priority': len(prios)+1, 'area': 'Utrzymanie ekonomii',
+                'method': 'Kontynuacja bazy wytrzymałościowej',
+                'target': 'SC heavy <3%', 'frequency': 'bez zmian',
+                'rationale': 'Doskonała ekonomia — nie zmieniać'})
+
+        if rec_c in ('SLOW', 'VERY_SLOW'):
+            prios.append({'priority': len(prios)+1, 'area': 'Recovery kinetics',
+                'method': 'Repeat-sprint 6×30s >VT2, 3min rest', 'frequency': '1×/tyg',
+                'target': 'T½ <60s', 'rationale': 'Poprawia off-kinetics'})
+        return prios
+
+    @classmethod
+    def _incremental_fallback(cls, out, e14):
+        t_half = e14.get('T_half_VO2_simple_s') or e14.get('T_half_VO2_s')
+        if t_half is not None:
+            t_half = float(t_half)
+            rc = cls._classify(t_half, cls.RECOVERY_BANDS)
+            out['kinetic_profile'] = {'recovery_t_half': t_half, 'recovery_class': rc,
+                'note': 'Tylko off-kinetics — brak τ on i SC'}
+            out['summary'] = {'phenotype': None, 'recovery_class': rc, 'recovery_t_half': t_half,
+                'note': 'Pełna fenotypizacja wymaga testu CWR'}
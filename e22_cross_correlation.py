@@ -12,6 +12,7 @@ FAZA 5: Fingerprint Radar, Limitation Triangle, Trainability, Performance Model
 
 import numpy as np
 import pandas as pd
+from cpet_logging import get_logger
 
 
 class Engine_E22_CrossCorrelation:
@@ -641,4 +642,4 @@ class Engine_E22_CrossCorrelation:
         return out
 
 
-print("✅ Engine_E22_CrossCorrelation loaded.")
+get_logger("engine.E22").debug("✅ Engine_E22_CrossCorrelation loaded.")
@@ -4,10 +4,38 @@ warnings.filterwarnings("ignore")
 # ==========================================
 # 1. IMPORTS & CONFIGURATION (UPDATED METADATA)
 # ==========================================
+import contextlib
+import copy
+import logging
 import numpy as np
 import pandas as pd
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from typing import Optional, Union, Dict, List, Tuple
+from cpet_logging import get_logger
+
+# Copy-on-Write (domyślne od pandas 3.0): płytkie kopie i kolumny-aliasy
+# współdzielą bufory aż do pierwszego zapisu — kanoniczna ramka trzyma
+# każdy sygnał raz (patrz DataTools.canonicalize / apply_global_aliases).
+# Import NIE zmienia trybu pandas w procesie: CoW włączają punkty wejścia
+# (app.py, cpet_batch) przez enable_copy_on_write() — wymagane dla oszczędności
+# pamięci. Bez CoW cow_copy() robi pełne kopie (jak wcześniej), wyniki te same.
+def copy_on_write_enabled() -> bool:
+    """Czy pandas Copy-on-Write jest aktywne (pandas ≥ 3.0 — zawsze)."""
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    return pd.get_option("mode.copy_on_write") is True
+
+
+def enable_copy_on_write() -> None:
+    """Włącza Copy-on-Write dla całego procesu — wywoływać w punktach wejścia, nie w bibliotece."""
+    if not copy_on_write_enabled():
+        pd.set_option("mode.copy_on_write", True)
+
+
+def cow_copy(obj):
+    """Kopia ramki/serii: płytka przy CoW (bufory do pierwszego zapisu), pełna bez CoW."""
+    return obj.copy(deep=not copy_on_write_enabled())
+
 
 @dataclass
 class AnalysisConfig:
@@ -62,6 +90,46 @@ class AnalysisConfig:
     pef_l_s: Optional[float] = None
     mvv_measured_lmin: Optional[float] = None
 
+    # --- CACHE RAMEK (frame_cache.FrameCache) ---
+    cache_dir: Optional[str] = None       # katalog cache (None → env CPET_CACHE_DIR, brak = wyłączony; wymaga pyarrow)
+    cache_max_mb: float = 512.0           # limit rozmiaru cache (LRU)
+
+    # --- WYGŁADZANIE (DataTools.smooth, E02) ---
+    smooth_mode: str = "rows"             # "rows" (okno z mediany dt) | "time" (okno na osi Time_sec)
+    resample_dt: Optional[float] = None   # krok siatki jednorodnej [s] po wygładzeniu (None = bez)
+
+    # --- HARMONOGRAM SILNIKÓW (engine_scheduler) ---
+    engine_workers: int = 1               # >1 → niezależne silniki równolegle (wyniki jak sekwencyjnie)
+    engine_executor: str = "thread"       # "thread" | "process"
+
+    # --- NIEPEWNOŚĆ PROGÓW (vt_bootstrap, opcjonalnie) ---
+    vt_bootstrap_n: int = 0               # >0 → block bootstrap VT1/VT2, liczba replikacji (np. 200)
+    vt_bootstrap_block_sec: float = 30.0  # długość bloku reszt [s]
+    vt_bootstrap_workers: int = 0         # pula procesów (0 = os.cpu_count(), 1 = bez puli; cpet_batch: domyślnie 1)
+    vt_bootstrap_ci: float = 0.95         # poziom przedziału percentylowego
+    vt_bootstrap_seed: int = 0
+
+    # --- NIEPEWNOŚĆ τ KINETYKI (E14, opcjonalnie) ---
+    kinetics_mc_n: int = 0                # >0 → Monte Carlo refity τ na etap (np. 200)
+    kinetics_mc_method: str = "block"     # "block" (bootstrap blokowy reszt) | "noise" (szum gaussowski)
+    kinetics_mc_block_sec: float = 20.0   # długość bloku reszt [s]
+    kinetics_mc_workers: int = 0          # pula procesów (0 = os.cpu_count(), 1 = bez puli;
+                                          # cpet_batch i engine_workers > 1: 0 → 1, bez zagnieżdżonych pul)
+    kinetics_mc_ci: float = 0.95
+    kinetics_mc_seed: int = 0
+
+    # --- NIEPEWNOŚĆ PROGÓW LAKTATOWYCH (E11, Monte Carlo błędu pomiaru La) ---
+    lactate_mc_n: int = 200               # replikacje (0 = wyłączone); cały zestaw metod wektorowo, ~ms
+    lactate_mc_sd_mmol: float = 0.1       # stała składowa błędu analizatora [mmol/L]
+    lactate_mc_cv: float = 0.05           # proporcjonalna składowa błędu (CV)
+    lactate_mc_ci: float = 0.95
+    lactate_mc_seed: int = 0
+
+    # --- PROFILOWANIE (engine_profiler, opcjonalnie) ---
+    profile_engines: bool = False         # czas wall/CPU + szczyt pamięci per silnik/etap/raport → _last_report["_debug"]
+    profile_memory: bool = True           # tracemalloc (wolniej); przy engine_workers > 1 silniki grafu tylko czasy
+    profile_json: Optional[str] = None    # zapis profilu JSON: plik lub katalog (→ <nazwa>_profile.json)
+
     @property
     def t_stop_seconds(self) -> Optional[float]:
         return parse_time_str(self.force_manual_t_stop)
@@ -548,8 +616,9 @@ class DataTools:
         Dodaje globalne aliasy kompatybilności wstecznej:
         - jeśli istnieje jedna wersja nazwy kolumny, tworzy pozostałe synonimy,
         - nie nadpisuje istniejących kolumn.
+        Przy Copy-on-Write aliasy to widoki — dane nie są kopiowane.
         """
-        out = df.copy()
+        out = cow_copy(df)
 
         alias_groups = [
             # czas
@@ -598,8 +667,9 @@ class DataTools:
         """
         Standaryzuje nazwy kolumn do formatów canonical używanych przez silniki.
         Zawiera fallbacki jednostek i czasu.
+        Przy Copy-on-Write aliasy kolumn nie kopiują danych (patrz apply_global_aliases).
         """
-        df_new = df.copy()
+        df_new = cow_copy(df)
 
         # --- 1) aliasy kolumn -> canonical ---
         aliases = {
@@ -689,14 +759,30 @@ class DataTools:
         if "Time_sec" not in df.columns:
             return df
 
-        out = df.copy()
-        t = pd.to_numeric(out["Time_sec"], errors="coerce")
+        out = cow_copy(df)  # CoW: kopiowane są tylko nadpisywane kolumny
+        t = pd.to_numeric(out["Time_sec"], errors="coerce").to_numpy(dtype=float)
 
         # upewnij się, że kolumny istnieją
         for col in ["Speed_kmh", "Incline_pct", "Power_W"]:
             if col not in out.columns:
                 out[col] = np.nan
 
+        # jedno sortowanie czasu → zakres wierszy segmentu przez searchsorted
+        order = np.argsort(t, kind="stable")
+        ts = t[order]
+        is_sorted = bool(np.array_equal(order, np.arange(len(t))))
+
+        # zapis do prealokowanych tablic, kolumny podmieniane raz na końcu
+        arrays = {}
+
+        def _arr(col):
+            if col not in arrays:
+                try:
+                    arrays[col] = out[col].to_numpy(dtype=float, copy=True)
+                except (TypeError, ValueError):
+                    arrays[col] = out[col].to_numpy(dtype=object, copy=True)
+            return arrays[col]
+
         for seg in segments:
             s = seg.get("start_sec", seg.get("start", None))
             e = seg.get("end_sec", seg.get("end", None))
@@ -708,22 +794,30 @@ class DataTools:
             if e <= s:
                 continue
 
-            mask = (t >= s) & (t < e)
+            # wiersze z s <= t < e (NaN sortuje się na koniec i nie wpada w zakres)
+            lo, hi = np.searchsorted(ts, [s, e], side="left")
+            if hi <= lo:
+                continue
+            rows = slice(lo, hi) if is_sorted else order[lo:hi]
+            t_seg = ts[lo:hi]
 
             # stałe wartości
             for col in ["Speed_kmh", "Incline_pct", "Power_W"]:
                 if col in seg and seg[col] is not None:
-                    out.loc[mask, col] = float(seg[col])
+                    _arr(col)[rows] = float(seg[col])
 
             # rampa prędkości
             if ("Speed_from" in seg) and ("Speed_to" in seg):
-                frac = (t[mask] - s) / (e - s)
-                out.loc[mask, "Speed_kmh"] = float(seg["Speed_from"]) + frac * (float(seg["Speed_to"]) - float(seg["Speed_from"]))
+                frac = (t_seg - s) / (e - s)
+                _arr("Speed_kmh")[rows] = float(seg["Speed_from"]) + frac * (float(seg["Speed_to"]) - float(seg["Speed_from"]))
 
             # rampa mocy
             if ("Power_from" in seg) and ("Power_to" in seg):
-                frac = (t[mask] - s) / (e - s)
-                out.loc[mask, "Power_W"] = float(seg["Power_from"]) + frac * (float(seg["Power_to"]) - float(seg["Power_from"]))
+                frac = (t_seg - s) / (e - s)
+                _arr("Power_W")[rows] = float(seg["Power_from"]) + frac * (float(seg["Power_to"]) - float(seg["Power_from"]))
+
+        for col, arr in arrays.items():
+            out[col] = arr
 
         return out
 
@@ -733,11 +827,14 @@ class DataTools:
         Wygładzanie pod CPET:
         - metabolizm/gazy: rolling 15-20 s (domyślnie 15)
         - FAT/CHO: heavy smoothing ~60 s
+        - cfg.smooth_mode: "rows" (okno = N wierszy z mediany dt) lub "time"
+          (okno ±s/2 na rzeczywistej osi Time_sec, odporne na zmienny oddech)
+        - cfg.resample_dt: opcjonalny resampling na siatkę co dt [s]
         """
         if df is None or df.empty:
             return df
 
-        out = df.copy()
+        out = cow_copy(df)  # CoW: wygładzone kolumny i tak są podmieniane
         if "Time_sec" not in out.columns:
             return out
 
@@ -760,34 +857,403 @@ class DataTools:
         ]
         cols_heavy = ["FAT_g_min", "CHO_g_min", "SmO2_pct", "Lactate_mmol"]
 
-        for c in cols_main:
-            if c in out.columns:
-                s = pd.to_numeric(out[c], errors="coerce")
-                out[c] = s.rolling(window=win_main, min_periods=1, center=True).median()
+        time_mode = str(getattr(cfg, "smooth_mode", "rows") or "rows").lower() == "time"
+        t_arr = t.to_numpy(dtype=float)
+
+        # wszystkie kolumny grupy w jednym przebiegu (tryb "rows" = pandas rolling median)
+        for cols, win, sec in ((cols_main, win_main, smooth_sec),
+                               (cols_heavy, win_heavy, max(smooth_sec, fatcho_sec))):
+            cols = [c for c in cols if c in out.columns]
+            if not cols:
+                continue
+            X = np.column_stack([
+                pd.to_numeric(out[c], errors="coerce").to_numpy(dtype=float) for c in cols
+            ])
+            if time_mode:
+                M = DataTools.rolling_time_centered(t_arr, X, sec, how="median")
+            else:
+                M = DataTools.rolling_median_centered(X, win)
+            out[cols] = pd.DataFrame(M, columns=cols, index=out.index)
+
+        resample_dt = getattr(cfg, "resample_dt", None)
+        if resample_dt:
+            out = DataTools.resample_uniform(out, float(resample_dt))
+
+        return out
+
+    @staticmethod
+    def rolling_time_centered(t: np.ndarray, X: np.ndarray, window_sec: float,
+                              how: str = "median", min_periods: int = 1,
+                              chunk_elems: int = 4_000_000) -> np.ndarray:
+        """
+        Okno czasowe wyśrodkowane: wiersz i → próbki z t ∈ [t_i - W/2, t_i + W/2]
+        (domknięte, jak okno offsetowe pandas, ale symetryczne i dla wielu kolumn).
+        t musi być rosnące; X (n,) lub (n, k); how = "median" | "mean".
+        NaN są pomijane; mniej niż ``min_periods`` ważnych próbek → NaN.
+        """
+        t = np.asarray(t, dtype=float)
+        X = np.asarray(X, dtype=float)
+        one_d = X.ndim == 1
+        if one_d:
+            X = X[:, None]
+        n, k = X.shape
+        out = np.full((n, k), np.nan)
+        if n == 0 or k == 0:
+            return out[:, 0] if one_d else out
+
+        half = float(window_sec) / 2.0
+        lo = np.searchsorted(t, t - half, side="left")
+        hi = np.searchsorted(t, t + half, side="right")
+        bad_t = ~np.isfinite(t)
+        lo[bad_t] = hi[bad_t] = np.arange(n)[bad_t]
+        hi = np.maximum(hi, lo)
+
+        cs = np.concatenate([np.zeros((1, k), dtype=np.int64),
+                             np.cumsum(~np.isnan(X), axis=0)])
+        cnt_all = cs[hi] - cs[lo]
+        L = int((hi - lo).max())
+        if L == 0:
+            return out[:, 0] if one_d else out
+
+        Xs = np.vstack([X, np.full((1, k), np.nan)])  # wiersz n = wartownik NaN
+        offs = np.arange(L)
+        step = max(1, int(chunk_elems) // max(1, k * L))
+        for a in range(0, n, step):
+            b = min(n, a + step)
+            idx = lo[a:b, None] + offs
+            idx[idx >= hi[a:b, None]] = n
+            G = np.moveaxis(Xs[idx], 1, 2)  # (m, k, L)
+            cnt = cnt_all[a:b]
+            if how == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    res = np.nansum(G, axis=-1) / cnt
+            else:
+                res = DataTools._median_from_sorted(np.sort(G, axis=-1), cnt)
+            res[cnt < max(1, int(min_periods))] = np.nan
+            out[a:b] = res
+
+        return out[:, 0] if one_d else out
+
+    @staticmethod
+    def resample_uniform(df: pd.DataFrame, dt: float, time_col: str = "Time_sec",
+                         dense_min_frac: float = 0.5) -> pd.DataFrame:
+        """
+        Resampling na jednorodną siatkę t0, t0+dt, ... (dla kerneli o stałym kroku).
+        - kolumny liczbowe gęste (≥ dense_min_frac ważnych): interpolacja liniowa
+          między sąsiednimi próbkami (NaN u sąsiada → NaN)
+        - kolumny liczbowe rzadkie (np. Lactate_mmol): każda ważna próbka trafia
+          do najbliższego węzła siatki
+        - pozostałe (Faza, Time_str...): wartość ostatniej próbki ≤ t
+        Krok zapisany w ``out.attrs["resample_dt"]``.
+        """
+        if df is None or df.empty or time_col not in df.columns or not dt or dt <= 0:
+            return df
 
-        for c in cols_heavy:
-            if c in out.columns:
-                s = pd.to_numeric(out[c], errors="coerce")
-                out[c] = s.rolling(window=win_heavy, min_periods=1, center=True).median()
+        src = df[pd.to_numeric(df[time_col], errors="coerce").notna()]
+        src = src.sort_values(time_col, kind="stable").reset_index(drop=True)
+        t = pd.to_numeric(src[time_col], errors="coerce").to_numpy(dtype=float)
+        if len(t) < 2 or t[-1] <= t[0]:
+            return df
 
+        grid = t[0] + np.arange(int(np.floor((t[-1] - t[0]) / dt + 1e-9)) + 1) * dt
+        j = np.clip(np.searchsorted(t, grid, side="right") - 1, 0, len(t) - 1)
+        j1 = np.minimum(j + 1, len(t) - 1)
+        span = t[j1] - t[j]
+        w = np.zeros(len(grid))
+        np.divide(grid - t[j], span, out=w, where=span > 0)
+        w = np.clip(w, 0.0, 1.0)
+
+        cols = {}
+        dense, sparse = [], []
+        for c in src.columns:
+            if c == time_col:
+                continue
+            s = src[c]
+            if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+                (dense if s.notna().mean() >= dense_min_frac else sparse).append(c)
+            else:
+                cols[c] = s.to_numpy()[j]
+
+        if dense:
+            X = src[dense].to_numpy(dtype=float)
+            Y = X[j] * (1.0 - w)[:, None] + X[j1] * w[:, None]
+            exact = w == 0.0
+            Y[exact] = X[j[exact]]
+            for i, c in enumerate(dense):
+                cols[c] = Y[:, i]
+        for c in sparse:
+            v = src[c].to_numpy(dtype=float)
+            ok = np.flatnonzero(~np.isnan(v))
+            y = np.full(len(grid), np.nan)
+            g = np.clip(np.rint((t[ok] - grid[0]) / dt).astype(np.int64), 0, len(grid) - 1)
+            y[g] = v[ok]
+            cols[c] = y
+
+        out = pd.DataFrame({time_col: grid, **cols})[list(src.columns)]
+        out.attrs = dict(df.attrs, resample_dt=float(dt))
         return out
 
+    @staticmethod
+    def rolling_median_centered(X: np.ndarray, window: int, chunk_elems: int = 262_144) -> np.ndarray:
+        """
+        Wielokolumnowy odpowiednik
+        ``pd.Series.rolling(window, min_periods=1, center=True).median()``
+        (bit w bit): X (n,) lub (n, k) → tablica tego samego kształtu.
+
+        Okno wiersza i: [i - (window-1-off), i + off], off = (window-1)//2
+        (jak FixedWindowIndexer w pandas), przycięte do krawędzi; NaN są
+        pomijane, brak ważnych próbek → NaN, parzysta liczba → (a+b)/2.
+        Okna (sliding_window_view) kopiowane są raz, porcjami po ``chunk_elems``
+        (~2 MB, w cache), i porządkowane w miejscu: porcja samych pełnych okien
+        bez NaN i nieparzyste okno → np.partition na środku (mediana = wycinek
+        kolumny), inaczej sort w miejscu + indeksy wg liczby ważnych próbek.
+        """
+        X = np.asarray(X, dtype=float)
+        one_d = X.ndim == 1
+        if one_d:
+            X = X[:, None]
+        n, k = X.shape
+        window = int(window)
+        out = np.full((n, k), np.nan)
+        if n == 0 or k == 0 or window < 1:
+            return out[:, 0] if one_d else out
+
+        right = (window - 1) // 2
+        left = window - 1 - right
+        Xp = np.concatenate([
+            np.full((left, k), np.nan), X, np.full((right, k), np.nan)
+        ])
+        W = np.lib.stride_tricks.sliding_window_view(Xp, window, axis=0)  # (n, k, window)
+
+        # liczba ważnych próbek w oknie z sum prefiksowych (O(n·k))
+        cs = np.concatenate([np.zeros((1, k), dtype=np.int64),
+                             np.cumsum(~np.isnan(X), axis=0)])
+        idx = np.arange(n)
+        cnt_all = (cs[np.minimum(idx + right + 1, n)] - cs[np.maximum(idx - left, 0)])
+
+        hi_i, lo_i = window // 2, (window - 1) // 2
+        step = max(1, int(chunk_elems) // max(1, k * window))
+        for a in range(0, n, step):
+            b = min(n, a + step)
+            cnt = cnt_all[a:b]
+            interior = bool((cnt == window).all())  # same pełne okna bez NaN
+            A = W[a:b].copy()                  # jedna kopia okien porcji (C, zapisywalna)
+            if interior and window % 2 == 1:
+                A.partition(hi_i, axis=-1)     # tylko statystyka środkowa
+            else:
+                A.sort(axis=-1)                # NaN na końcu
+            if interior:
+                med = A[..., hi_i] if window % 2 == 1 else (A[..., hi_i] + A[..., lo_i]) / 2
+            else:
+                med = DataTools._median_from_sorted(A, cnt)  # A już ciągła: bez kopii
+
+            # ±0: kolejność równych kluczy w skipliście pandas = kolejność w oknie,
+            # czyli sort stabilny; liczy się tylko gdy mediana trafia w zero
+            zr = (med == 0)
+            if zr.any():
+                rr, cc = np.nonzero(zr)
+                sub = np.sort(W[a:b][rr, cc], axis=-1, kind="stable")
+                med[rr, cc] = DataTools._median_from_sorted(sub, cnt[rr, cc])
+            out[a:b] = med
+
+        return out[:, 0] if one_d else out
+
+        right = (window - 1) // 2
+        left = window - 1 - right
+        Xp = np.concatenate([
+            np.full((left, k), np.nan), X, np.full((right, k), np.nan)
+        ])
+        W = np.lib.stride_tricks.sliding_window_view(Xp, window, axis=0)  # (n, k, window)
+
+        # liczba ważnych próbek w oknie z sum prefiksowych (O(n·k))
+        cs = np.concatenate([np.zeros((1, k), dtype=np.int64),
+                             np.cumsum(~np.isnan(X), axis=0)])
+        idx = np.arange(n)
+        cnt_all = (cs[np.minimum(idx + right + 1, n)] - cs[np.maximum(idx - left, 0)])
+
+        kth = [(window - 1) // 2, window // 2]
+        step = max(1, int(chunk_elems) // max(1, k * window))
+        for a in range(0, n, step):
+            b = min(n, a + step)
+            cnt = cnt_all[a:b]
+            med = np.empty(cnt.shape)
+            # pełne okna bez NaN (większość wierszy): dwie statystyki pozycyjne, O(w) zamiast sortu
+            full = cnt == window
+            if full.any():
+                part = np.partition(W[a:b][full], kth, axis=-1)
+                hi, lo = part[:, kth[1]], part[:, kth[0]]
+                med[full] = hi if window % 2 == 1 else (hi + lo) / 2
+            # krawędzie i okna z NaN: pełny sort (NaN na końcu)
+            rest = ~full
+            if rest.any():
+                srt = np.sort(W[a:b][rest], axis=-1)
+                med[rest] = DataTools._median_from_sorted(srt, cnt[rest])
+
+            # ±0: kolejność równych kluczy w skipliście pandas = kolejność w oknie,
+            # czyli sort stabilny; liczy się tylko gdy mediana trafia w zero
+            zr = (med == 0)
+            if zr.any():
+                rr, cc = np.nonzero(zr)
+                sub = np.sort(W[a:b][rr, cc], axis=-1, kind="stable")
+                med[rr, cc] = DataTools._median_from_sorted(sub, cnt[rr, cc])
+            out[a:b] = med
+
+        return out[:, 0] if one_d else out
 
-print("✅ Komórka 2: DataTools (FIXED — all methods inside class) załadowana.")
-print("✅ compile_protocol_for_apply() — jedna definicja, globalna.")
+    @staticmethod
+    def _median_from_sorted(srt: np.ndarray, cnt: np.ndarray) -> np.ndarray:
+        """Mediana wierszy posortowanych okien (NaN na końcu) o ``cnt`` ważnych próbkach."""
+        w = srt.shape[-1]
+        flat = np.ascontiguousarray(srt).reshape(-1)
+        c = cnt.reshape(-1)
+        base = np.arange(c.size) * w
+        hi = flat[base + c // 2]
+        lo = flat[base + np.maximum(c - 1, 0) // 2]
+        med = np.where(c % 2 == 1, hi, (hi + lo) / 2)
+        med[c == 0] = np.nan
+        return med.reshape(cnt.shape)
+
+
+class SignalStore:
+    """
+    Wspólny magazyn sygnałów na jeden przebieg (budowany raz po DataTools.smooth).
+
+    Silniki zamiast własnego ``df.copy()`` + ``pd.to_numeric`` pobierają stąd:
+    - ``col(candidates)``  → pierwsza istniejąca kolumna z listy aliasów
+    - ``numeric(col)``     → pd.to_numeric(df[col], errors="coerce") (cache)
+    - ``array(col)``       → ta sama kolumna jako float64 ndarray (tylko do odczytu)
+    - ``get(key)``         → sygnał kanoniczny/pochodny: vo2_L, vco2_L, ve_vo2,
+                             ve_vco2, rer_calc oraz aliasy z ``ALIASES``
+    Ramka wysiłku ``processed.iloc[:n]`` dostaje ``prefix(df_ex)`` — dzieli cache
+    z magazynem pełnej ramki (wycinki zamiast ponownej konwersji).
+    """
+
+    ALIASES = {
+        "time": ["Time_sec", "Time_s", "time_s", "t"],
+        "vo2_ml": ["VO2_mlmin", "VO2_ml_min", "VO2"],
+        "vco2_ml": ["VCO2_mlmin", "VCO2_ml_min", "VCO2"],
+        "vo2_L_raw": ["VO2_Lmin", "VO2_L_min", "VO2_lmin"],
+        "vco2_L_raw": ["VCO2_Lmin", "VCO2_L_min", "VCO2_lmin"],
+        "ve": ["VE_Lmin", "VE_L_min", "VE_lmin"],
+        "hr": ["HR_bpm", "hr_bpm", "HR"],
+        "speed": ["Speed_kmh", "speed_km_h", "Speed_km_h", "speed_kmh", "speed", "Speed"],
+        "power": ["Power_W", "Power"],
+        "rer": ["RER"],
+        "peto2": ["PetO2_mmHg", "PETO2_mmHg"],
+        "petco2": ["PetCO2_mmHg", "PETCO2_mmHg"],
+        "smo2": ["SmO2_pct", "SmO2_1", "SmO2_2", "SmO2_3", "SmO2_4", "SmO2"],
+    }
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._num: Dict[str, pd.Series] = {}
+        self._arr: Dict[str, np.ndarray] = {}
+        self._parent: Optional["SignalStore"] = None
+
+    @classmethod
+    def for_frame(cls, df: pd.DataFrame, signals: Optional["SignalStore"] = None) -> "SignalStore":
+        """Magazyn przekazany przez orkiestrator, jeśli dotyczy tej ramki; inaczej lokalny."""
+        if signals is not None and signals.df is df:
+            return signals
+        return cls(df)
+
+    def prefix(self, df_prefix: pd.DataFrame) -> "SignalStore":
+        """Magazyn dla ``self.df.iloc[:n]`` — kolumny liczone raz, tu tylko wycinane."""
+        st = SignalStore(df_prefix)
+        st._parent = self
+        return st
+
+    # ---------- kolumny surowe ----------
+    def col(self, candidates) -> Optional[str]:
+        for c in candidates:
+            if c in self.df.columns:
+                return c
+        return None
+
+    def numeric(self, col: str) -> pd.Series:
+        s = self._num.get(col)
+        if s is None:
+            if self._parent is not None:
+                s = self._parent.numeric(col).iloc[:len(self.df)]
+            else:
+                s = cow_copy(pd.to_numeric(self.df[col], errors="coerce"))  # bez CoW: niezależna od df
+            self._num[col] = s
+        return cow_copy(s)  # zapis u konsumenta nie psuje cache
+
+    def array(self, col: str) -> np.ndarray:
+        a = self._arr.get(col)
+        if a is None:
+            a = self.numeric(col).to_numpy(dtype=float, copy=True)
+            a.flags.writeable = False
+            self._arr[col] = a
+        return a
+
+    # ---------- sygnały kanoniczne / pochodne ----------
+    def get(self, key: str) -> Optional[np.ndarray]:
+        a = self._arr.get("@" + key)
+        if a is not None:
+            return a
+        if self._parent is not None:
+            full = self._parent.get(key)
+            a = None if full is None else full[:len(self.df)]
+        else:
+            a = self._derive(key)
+        if a is not None:
+            a.flags.writeable = False
+            self._arr["@" + key] = a
+        return a
+
+    def _derive(self, key: str) -> Optional[np.ndarray]:
+        if key in self.ALIASES:
+            c = self.col(self.ALIASES[key])
+            return None if c is None else self.array(c)
+        if key in ("vo2_L", "vco2_L"):
+            gas = key[:-2]
+            raw = self.get(gas + "_L_raw")
+            if raw is not None:
+                return raw
+            ml = self.get(gas + "_ml")
+            return None if ml is None else ml / 1000.0
+        if key in ("ve_vo2", "ve_vco2"):
+            ve, gas = self.get("ve"), self.get(key[3:] + "_L")
+            if ve is None or gas is None:
+                return None
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return ve / np.where(gas == 0, np.nan, gas)
+        if key == "rer_calc":
+            vo2, vco2 = self.get("vo2_L"), self.get("vco2_L")
+            if vo2 is None or vco2 is None:
+                return None
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return vco2 / np.where(vo2 == 0, np.nan, vo2)
+        return None
+
+    def series(self, key: str) -> Optional[pd.Series]:
+        """``get(key)`` jako Series z indeksem ramki (do rolling/idxmax/loc)."""
+        a = self.get(key)
+        return None if a is None else pd.Series(a, index=self.df.index, copy=False)
+
+
+get_logger("data_tools").debug("✅ Komórka 2: DataTools (FIXED — all methods inside class) załadowana.")
+get_logger("data_tools").debug("✅ compile_protocol_for_apply() — jedna definicja, globalna.")
 
 # ==========================================
 # 3. ENGINE ROOM (E00-E16) — DEDUPLICATED
 # ==========================================
 import pandas as pd
 import numpy as np
-from scipy import stats
-from scipy.stats import linregress
 from typing import Dict, List, Tuple, Optional, Any, Union
 from dataclasses import dataclass, field
 import warnings
 warnings.filterwarnings('ignore')
 
+
+def linregress(*args, **kwargs):
+    """scipy.stats.linregress importowane przy pierwszym wywołaniu (scipy.stats ≈ 0.6 s zimnego startu)."""
+    from scipy.stats import linregress as _linregress
+    return _linregress(*args, **kwargs)
+
+
 class Engine_E00_StopDetection:
     """
     E00 v2.1: Stop detection (end of exercise / refusal point) for CPET pipelines.
@@ -1713,8 +2179,6 @@ Key changes vs v3:
 
 import numpy as np
 import pandas as pd
-from scipy import stats
-from scipy.stats import linregress
 from typing import Dict, Optional, List, Any, Tuple
 from dataclasses import dataclass, field
 import warnings
@@ -1780,6 +2244,7 @@ class Engine_E02_Thresholds_v4:
 
     # Smoothing
     SMOOTH_WINDOW_SEC = 30.0
+    SMOOTH_MODE = 'rows'     # 'rows' (window = N rows from median dt) | 'time' (±15 s on time axis)
 
     # RER artifact: ignore first N seconds for RER-based methods
     RER_ARTIFACT_SKIP_SEC = 120.0
@@ -1830,7 +2295,8 @@ class Engine_E02_Thresholds_v4:
 
     @classmethod
     def run(cls, df: pd.DataFrame, e00_result: Dict = None,
-            file_metadata: Dict = None) -> Dict[str, Any]:
+            file_metadata: Dict = None, smooth_mode: str = None,
+            signals: SignalStore = None) -> Dict[str, Any]:
         """
         Main entry point.
 
@@ -1839,12 +2305,14 @@ class Engine_E02_Thresholds_v4:
         df : exercise DataFrame (canonicalized)
         e00_result : dict from E00 with t_stop
         file_metadata : dict with VT1_HR, VT2_HR etc. from CSV header (fallback)
+        smooth_mode : 'rows' | 'time' (default: SMOOTH_MODE)
+        signals : SignalStore for df (shared per run; built locally if None)
         """
         result = cls._init_result()
 
         try:
             # Phase 0: Prepare data
-            df_ex, params = cls._prepare_data(df, e00_result)
+            df_ex, params = cls._prepare_data(df, e00_result, smooth_mode, signals)
 
             if df_ex is None or len(df_ex) < 50:
                 result['status'] = 'ERROR'
@@ -1893,11 +2361,13 @@ class Engine_E02_Thresholds_v4:
     # ══════════════════════════════════════════════════════════════════════════
 
     @classmethod
-    def _prepare_data(cls, df: pd.DataFrame,
-                      e00_result: Dict) -> Tuple[Optional[pd.DataFrame], Dict]:
+    def _prepare_data(cls, df: pd.DataFrame, e00_result: Dict,
+                      smooth_mode: str = None,
+                      signals: SignalStore = None) -> Tuple[Optional[pd.DataFrame], Dict]:
         """Standardize columns, compute derived signals, smooth."""
 
-        df = df.copy()
+        sig = SignalStore.for_frame(df, signals)
+        df = cow_copy(df)  # CoW: only new columns are added
 
         # ── Column resolution ────────────────────────────────────────────
         col_map = {
@@ -1921,7 +2391,7 @@ class Engine_E02_Thresholds_v4:
 
         for old, new in col_map.items():
             if old in df.columns and new not in df.columns:
-                df[new] = pd.to_numeric(df[old], errors='coerce')
+                df[new] = sig.numeric(old)
 
         # Ensure ml/min
         if 'vo2_ml' not in df.columns and 'vo2_L' in df.columns:
@@ -1979,10 +2449,19 @@ class Engine_E02_Thresholds_v4:
             if c in df_ex.columns and df_ex[c].notna().sum() > 20:
                 smooth_cols.append(c)
 
-        for col in smooth_cols:
-            df_ex[f'{col}_sm'] = (df_ex[col]
-                                  .rolling(window, center=True, min_periods=3)
-                                  .mean())
+        if (smooth_mode or cls.SMOOTH_MODE) == 'time':
+            # Irregular breathing: window in seconds on the real time axis
+            sm = DataTools.rolling_time_centered(
+                df_ex['time'].to_numpy(dtype=float),
+                df_ex[smooth_cols].to_numpy(dtype=float),
+                cls.SMOOTH_WINDOW_SEC, how='mean', min_periods=3)
+            for i, col in enumerate(smooth_cols):
+                df_ex[f'{col}_sm'] = sm[:, i]
+        else:
+            for col in smooth_cols:
+                df_ex[f'{col}_sm'] = (df_ex[col]
+                                      .rolling(window, center=True, min_periods=3)
+                                      .mean())
 
         # ── Derived signals ──────────────────────────────────────────────
         # VE/VO2 and VE/VCO2 (compute from smoothed, more robust)
@@ -2073,10 +2552,67 @@ class Engine_E02_Thresholds_v4:
         if lo >= hi:
             return None
 
+        # ── All splits at once: two-segment RSS from prefix sums ─────────
+        # (centred data against cancellation; near-ties and borderline slope
+        # checks are re-scored exactly with linregress, so the result is the
+        # same as the per-split loop)
+        xc = x - x.mean()
+        yc = y - y.mean()
+        z = np.zeros(1)
+        Cx, Cy = np.concatenate([z, np.cumsum(xc)]), np.concatenate([z, np.cumsum(yc)])
+        Cxx = np.concatenate([z, np.cumsum(xc * xc)])
+        Cxy = np.concatenate([z, np.cumsum(xc * yc)])
+        Cyy = np.concatenate([z, np.cumsum(yc * yc)])
+
+        i = np.arange(lo, hi)
+        n1 = i.astype(float)
+        n2 = (n - i).astype(float)
+        sx1, sy1 = Cx[i], Cy[i]
+        sx2, sy2 = Cx[n] - sx1, Cy[n] - sy1
+        sxx1 = Cxx[i] - sx1 * sx1 / n1
+        sxx2 = (Cxx[n] - Cxx[i]) - sx2 * sx2 / n2
+        if not (np.all(sxx1 > 0) and np.all(sxx2 > 0)):
+            # degenerate x (constant segment) — keep linregress semantics
+            return Engine_E02_Thresholds_v4._find_piecewise_breakpoint_exact(
+                x, y, indices, range(lo, hi), require_slope_increase, min_slope_ratio)
+        sxy1 = Cxy[i] - sx1 * sy1 / n1
+        sxy2 = (Cxy[n] - Cxy[i]) - sx2 * sy2 / n2
+        syy1 = Cyy[i] - sy1 * sy1 / n1
+        syy2 = (Cyy[n] - Cyy[i]) - sy2 * sy2 / n2
+        s1 = sxy1 / sxx1
+        s2 = sxy2 / sxx2
+        total = np.maximum(syy1 - sxy1 * s1, 0.0) + np.maximum(syy2 - sxy2 * s2, 0.0)
+
+        ok = np.isfinite(total)
+        if require_slope_increase:
+            lhs, rhs = s2, s1 * min_slope_ratio
+            ok &= lhs > rhs
+            # slopes too close to call from sums → decide with linregress
+            margin = 1e-7 * (np.abs(lhs) + np.abs(rhs)) + 1e-300
+            for k in np.flatnonzero(np.abs(lhs - rhs) <= margin):
+                e1 = linregress(x[:i[k]], y[:i[k]])[0]
+                e2 = linregress(x[i[k]:], y[i[k]:])[0]
+                ok[k] = np.isfinite(total[k]) and not (e2 <= e1 * min_slope_ratio)
+        if not ok.any():
+            return None
+
+        tot_ok = np.where(ok, total, np.inf)
+        t_min = tot_ok.min()
+        scale = max(abs(t_min), 1e-12 * float(Cyy[n]), 1e-300)
+        recheck = np.flatnonzero(tot_ok <= t_min + 1e-7 * scale)
+        return Engine_E02_Thresholds_v4._find_piecewise_breakpoint_exact(
+            x, y, indices, (int(i[k]) for k in recheck),
+            require_slope_increase, min_slope_ratio)
+
+    @staticmethod
+    def _find_piecewise_breakpoint_exact(x, y, indices, splits,
+                                         require_slope_increase=True,
+                                         min_slope_ratio=1.0) -> Optional[Dict]:
+        """Per-split linregress scoring (reference; used on prefix-sum shortlist)."""
         best_rss = np.inf
         best = None
 
-        for i in range(lo, hi):
+        for i in splits:
             s1, i1, _, _, _ = linregress(x[:i], y[:i])
             pred1 = s1 * x[:i] + i1
             rss1 = np.sum((y[:i] - pred1) ** 2)
@@ -2596,86 +3132,65 @@ class Engine_E02_Thresholds_v4:
         # Use broader range for this method
         t_start = params['t_start']
         t_dur = params['t_duration']
-        mask = ((df['time'] >= t_start + t_dur * 0.15) &
-                (df['time'] <= t_start + t_dur * 0.85))
-        df_work = df[mask].copy()
+        t_all = df['time'].to_numpy()
+        mask = ((t_all >= t_start + t_dur * 0.15) &
+                (t_all <= t_start + t_dur * 0.85))
 
-        if len(df_work) < 2 * half_win + 10:
+        if int(mask.sum()) < 2 * half_win + 10:
             return None
 
-        ve_vo2 = df_work['ve_vo2'].values
-        ve_vco2 = df_work['ve_vco2'].values
-        times = df_work['time'].values
-        vo2_pct = df_work['vo2_pct'].values
-        indices = df_work.index.values
-
-        # Step 1: Find all isocapnic points
-        iscap_raw = []  # list of (local_idx, time)
-        for i in range(half_win, len(times) - half_win):
-            dt_local = times[i + half_win] - times[i - half_win]
-            if dt_local <= 0:
-                continue
-            d_ve_vo2 = (ve_vo2[i + half_win] - ve_vo2[i - half_win]) / dt_local * 100
-            d_ve_vco2 = (ve_vco2[i + half_win] - ve_vco2[i - half_win]) / dt_local * 100
-            if d_ve_vo2 > 0.25 and d_ve_vco2 < 0.30:
-                iscap_raw.append(i)
-
-        if not iscap_raw:
+        ve_vo2 = df['ve_vo2'].to_numpy()[mask]
+        ve_vco2 = df['ve_vco2'].to_numpy()[mask]
+        times = t_all[mask]
+        vo2_pct = df['vo2_pct'].to_numpy()[mask]
+        indices = df.index.to_numpy()[mask]
+
+        # Step 1: Find all isocapnic points (centred differences over ±half_win)
+        h2 = 2 * half_win
+        dt_local = times[h2:] - times[:-h2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d_ve_vo2 = (ve_vo2[h2:] - ve_vo2[:-h2]) / dt_local * 100
+            d_ve_vco2 = (ve_vco2[h2:] - ve_vco2[:-h2]) / dt_local * 100
+        iscap = (dt_local > 0) & (d_ve_vo2 > 0.25) & (d_ve_vco2 < 0.30)
+        iscap_raw = np.flatnonzero(iscap) + half_win
+
+        if len(iscap_raw) == 0:
             return None
 
-        # Step 2: Group into contiguous segments (merge gaps < 30s)
+        # Step 2: Group into contiguous segments (merge gaps < 30s) — run-length split
         MAX_GAP_SEC = 30.0
-        segments = []
-        seg_start = iscap_raw[0]
-        seg_end = iscap_raw[0]
-
-        for idx in iscap_raw[1:]:
-            gap = times[idx] - times[seg_end]
-            if gap <= MAX_GAP_SEC:
-                seg_end = idx
-            else:
-                segments.append((seg_start, seg_end))
-                seg_start = idx
-                seg_end = idx
-        segments.append((seg_start, seg_end))
-
-        if not segments:
-            return None
+        brk = np.flatnonzero(np.diff(times[iscap_raw]) > MAX_GAP_SEC) + 1
+        seg_starts = iscap_raw[np.concatenate([[0], brk])]
+        seg_ends = iscap_raw[np.concatenate([brk - 1, [len(iscap_raw) - 1]])]
+        n_segments = len(seg_starts)
 
         # Step 3: Score each segment
-        best_score = -np.inf
-        best_seg = None
-
-        for seg_s, seg_e in segments:
-            duration = times[seg_e] - times[seg_s]
-            if duration < 10:  # min 10s
-                continue
-
-            mid_i = (seg_s + seg_e) // 2
-            mid_vo2_pct = vo2_pct[mid_i] if mid_i < len(vo2_pct) else 50.0
-
-            # Score components:
-            # 1. Duration bonus (longer = better, capped at 120s)
-            dur_score = min(duration, 120) / 120.0 * 40
-
-            # 2. VO2% appropriateness (best at 50-65%, penalty outside)
-            # Gaussian centered at 57% with SD=12
-            vo2_ideal = 57.0
-            vo2_sd = 12.0
-            vo2_score = 30 * np.exp(-0.5 * ((mid_vo2_pct - vo2_ideal) / vo2_sd) ** 2)
-
-            # 3. Not too early penalty (segments below 45% VO2 are suspect)
-            early_penalty = -15 if mid_vo2_pct < 45 else 0
-
-            total_score = dur_score + vo2_score + early_penalty
-
-            if total_score > best_score:
-                best_score = total_score
-                best_seg = (seg_s, seg_e, mid_i, duration, mid_vo2_pct)
-
-        if best_seg is None:
+        durations = times[seg_ends] - times[seg_starts]
+        keep = ~(durations < 10)  # min 10s
+        mids = (seg_starts + seg_ends) // 2
+        mid_pcts = vo2_pct[mids]
+
+        # Score components:
+        # 1. Duration bonus (longer = better, capped at 120s)
+        dur_score = np.minimum(durations, 120) / 120.0 * 40
+        # 2. VO2% appropriateness (best at 50-65%, penalty outside)
+        # Gaussian centered at 57% with SD=12
+        vo2_ideal = 57.0
+        vo2_sd = 12.0
+        vo2_score = 30 * np.exp(-0.5 * ((mid_pcts - vo2_ideal) / vo2_sd) ** 2)
+        # 3. Not too early penalty (segments below 45% VO2 are suspect)
+        early_penalty = np.where(mid_pcts < 45, -15, 0)
+
+        scores = dur_score + vo2_score + early_penalty
+        scores = np.where(keep & ~np.isnan(scores), scores, -np.inf)
+        k = int(np.argmax(scores))
+        if not scores[k] > -np.inf:
             return None
 
+        best_score = scores[k]
+        best_seg = (int(seg_starts[k]), int(seg_ends[k]), int(mids[k]),
+                    durations[k], mid_pcts[k])
+
         seg_s, seg_e, mid_i, duration, mid_vo2_pct = best_seg
         df_idx = indices[mid_i]
         row = df.loc[df_idx]
@@ -2696,7 +3211,7 @@ class Engine_E02_Thresholds_v4:
              'segment_end_s': float(times[seg_e]),
              'segment_duration_s': float(duration),
              'segment_vo2_pct': float(mid_vo2_pct),
-             'n_segments_found': len(segments),
+             'n_segments_found': n_segments,
              'score': float(best_score)}
         )
 
@@ -4237,7 +4752,6 @@ Outputs:
 
 import numpy as np
 import pandas as pd
-from scipy.stats import linregress
 from typing import Dict, Optional, Tuple
 
 
@@ -5950,6 +6464,12 @@ class Engine_E10_Substrate_v2:
     KCAL_PER_G_FAT = 9.75   # Peronnet & Massicotte 1991
     KCAL_PER_G_CHO = 4.07   # glucose: 3.74, glycogen: 4.15, avg ~4.07
 
+    # Stoichiometric coefficients: FAT = a·VO2 − b·VCO2, CHO = c·VCO2 − d·VO2  [g/min, L/min]
+    EQUATIONS = {
+        'frayn': ((1.67, 1.67, 4.55, 3.21), 'Frayn 1983'),
+        'jeukendrup': ((1.695, 1.701, 4.344, 3.061), 'Jeukendrup & Wallis 2005'),
+    }
+
     # MFO normative ranges (Randell et al. 2017, Frontiers Physiol)
     MFO_NORMS = {
         'male': {
@@ -5969,7 +6489,8 @@ class Engine_E10_Substrate_v2:
             e02: dict = None, e01: dict = None,
             sex: str = 'male',
             weight_kg: float = None,
-            equation: str = 'frayn') -> Dict:
+            equation: str = 'frayn',
+            signals: SignalStore = None) -> Dict:
         """
         Parameters
         ----------
@@ -5979,49 +6500,31 @@ class Engine_E10_Substrate_v2:
         sex       : 'male' or 'female'
         weight_kg : body mass (for MFO/kg)
         equation  : 'frayn' (default) or 'jeukendrup'
+        signals   : SignalStore for df_ex (shared per run; built locally if None)
         """
         result = cls._init_result()
 
         try:
-            df = df_ex.copy()
+            df = df_ex
+            sig = SignalStore.for_frame(df_ex, signals)
             # ── Resolve columns ──────────────────────────────
-            vo2_col = cls._find_col(df, ['VO2_Lmin', 'VO2_L_min', 'VO2_lmin'])
-            vco2_col = cls._find_col(df, ['VCO2_Lmin', 'VCO2_L_min', 'VCO2_lmin'])
             time_col = cls._find_col(df, ['Time_sec', 'Time_s', 'time_s', 't'])
             hr_col = cls._find_col(df, ['HR_bpm', 'hr_bpm', 'HR'])
             speed_col = cls._find_col(df, ['speed_km_h', 'Speed_km_h', 'speed_kmh', 'speed', 'Speed'])
 
-            # Convert ml/min → L/min if needed
-            if not vo2_col:
-                vo2_ml = cls._find_col(df, ['VO2_mlmin', 'VO2_ml_min', 'VO2'])
-                if vo2_ml:
-                    df['VO2_Lmin'] = pd.to_numeric(df[vo2_ml], errors='coerce') / 1000.0
-                    vo2_col = 'VO2_Lmin'
-            if not vco2_col:
-                vco2_ml = cls._find_col(df, ['VCO2_mlmin', 'VCO2_ml_min', 'VCO2'])
-                if vco2_ml:
-                    df['VCO2_Lmin'] = pd.to_numeric(df[vco2_ml], errors='coerce') / 1000.0
-                    vco2_col = 'VCO2_Lmin'
-
-            if not vo2_col or not vco2_col:
+            # L/min (converted from ml/min if needed)
+            vo2 = sig.series('vo2_L')
+            vco2 = sig.series('vco2_L')
+            if vo2 is None or vco2 is None:
                 result['flags'].append('MISSING_GAS_EXCHANGE')
                 return result
 
-            vo2 = pd.to_numeric(df[vo2_col], errors='coerce')
-            vco2 = pd.to_numeric(df[vco2_col], errors='coerce')
-
             # ── Calculate RER ────────────────────────────────
             rer = vco2 / vo2.replace(0, np.nan)
 
             # ── Stoichiometric equations ─────────────────────
-            if equation == 'jeukendrup':
-                fat_raw = 1.695 * vo2 - 1.701 * vco2    # Jeukendrup & Wallis 2005
-                cho_raw = 4.344 * vco2 - 3.061 * vo2
-                result['equation'] = 'Jeukendrup & Wallis 2005'
-            else:
-                fat_raw = 1.67 * vo2 - 1.67 * vco2       # Frayn 1983
-                cho_raw = 4.55 * vco2 - 3.21 * vo2
-                result['equation'] = 'Frayn 1983'
+            fat_raw, cho_raw = cls.oxidation_rates(vo2, vco2, equation)
+            result['equation'] = cls.EQUATIONS.get(equation, cls.EQUATIONS['frayn'])[1]
 
             # ── Validity mask: only valid when RER < 1.0 ─────
             valid_mask = (rer < 1.0) & rer.notna() & (vo2 > 0.1)
@@ -6035,20 +6538,23 @@ class Engine_E10_Substrate_v2:
                 result['flags'].append('INSUFFICIENT_VALID_DATA')
                 return result
 
-            # ── Smooth (30s rolling mean) ────────────────────
-            fat_smooth = fat_raw.rolling(30, center=True, min_periods=10).mean()
-            cho_smooth = cho_raw.rolling(30, center=True, min_periods=10).mean()
+            # ── Smooth (30s rolling mean, FAT+CHO in one pass) ──
+            smooth = pd.DataFrame({'fat': fat_raw, 'cho': cho_raw}).rolling(
+                30, center=True, min_periods=10).mean()
+            fat_smooth, cho_smooth = smooth['fat'], smooth['cho']
+            valid_arr = valid_mask.to_numpy(dtype=bool)
 
             # Zero out negative values (artifact) only for display
             fat_display = fat_smooth.clip(lower=0)
 
             # ── FATmax (MFO) ─────────────────────────────────
             # Only consider valid RER points
-            fat_valid = fat_smooth.copy()
-            fat_valid[~valid_mask] = np.nan
+            fat_valid_arr = np.where(valid_arr, fat_smooth.to_numpy(dtype=float), np.nan)
+            fat_valid = pd.Series(fat_valid_arr, index=fat_smooth.index)
 
-            idx_mfo = fat_valid.idxmax()
-            if pd.notna(idx_mfo):
+            idx_mfo = (fat_smooth.index[int(np.nanargmax(fat_valid_arr))]
+                       if np.isfinite(fat_valid_arr).any() else None)
+            if idx_mfo is not None:
                 mfo = float(fat_valid.loc[idx_mfo])
                 result['mfo_gmin'] = round(mfo, 3)
 
@@ -6088,17 +6594,16 @@ class Engine_E10_Substrate_v2:
             diff = cho_kcal - fat_kcal  # positive when CHO dominates
 
             # Find first sustained crossover (not transient)
-            diff_valid = diff.copy()
-            diff_valid[~valid_mask] = np.nan
+            diff_valid = diff.where(valid_arr)
             diff_smooth = diff_valid.rolling(15, center=True, min_periods=5).mean()
 
-            # Find where diff crosses from negative to positive
+            # Find where diff crosses from negative to positive (first − → + over non-NaN points)
             cop_idx = None
             vals = diff_smooth.dropna()
-            for i in range(1, len(vals)):
-                if vals.iloc[i-1] < 0 and vals.iloc[i] >= 0:
-                    cop_idx = vals.index[i]
-                    break
+            v = vals.to_numpy(dtype=float)
+            cross = np.flatnonzero((v[:-1] < 0) & (v[1:] >= 0))
+            if len(cross):
+                cop_idx = vals.index[cross[0] + 1]
 
             if cop_idx is not None:
                 if hr_col:
@@ -6121,7 +6626,7 @@ class Engine_E10_Substrate_v2:
 
             # ── Energy contribution at key points ────────────
             if e02 and time_col:
-                time_arr = pd.to_numeric(df[time_col], errors='coerce')
+                time_arr = sig.numeric(time_col)
                 vt1_time = e02.get('vt1_time_s') or e02.get('vt1_time_sec')
                 vt2_time = e02.get('vt2_time_s') or e02.get('vt2_time_sec')
 
@@ -6144,7 +6649,7 @@ class Engine_E10_Substrate_v2:
 
             # ── Total energy expenditure during exercise ─────
             if time_col:
-                time_arr = pd.to_numeric(df[time_col], errors='coerce')
+                time_arr = sig.numeric(time_col)
                 dt = time_arr.diff().fillna(1) / 60.0  # convert to minutes
                 total_fat_kcal = (fat_display * cls.KCAL_PER_G_FAT * dt).sum()
                 total_cho_kcal = (cho_smooth.clip(lower=0) * cls.KCAL_PER_G_CHO * dt).sum()
@@ -6270,6 +6775,35 @@ class Engine_E10_Substrate_v2:
             return float(df[hr_col].max())
         return None
 
+    @classmethod
+    def oxidation_rates(cls, vo2, vco2, equation: str = 'frayn'):
+        """
+        FAT / CHO oxidation (g/min) from VO2 / VCO2 (L/min).
+        Elementwise, so vo2/vco2 may be Series, 1-D arrays or 2-D arrays
+        (e.g. subjects × samples for a whole cohort at once).
+        """
+        (a, b, c, d), _ = cls.EQUATIONS.get(equation, cls.EQUATIONS['frayn'])
+        return a * vo2 - b * vco2, c * vco2 - d * vo2
+
+    @staticmethod
+    def zone_masks(hr, bounds) -> np.ndarray:
+        """
+        Zone membership (zones × samples) for inclusive HR bands [(lo, hi), ...].
+        A matrix rather than np.digitize bins: the bands may touch/overlap at HRmax
+        (Z4 upper = Z5 lower when clamped), and a sample then counts in both zones.
+        """
+        hr = np.asarray(hr, dtype=float)
+        lo, hi = np.asarray(bounds, dtype=float).T
+        return (hr >= lo[:, None]) & (hr <= hi[:, None])
+
+    @staticmethod
+    def _masked_mean(masks: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """NaN-skipping mean of ``values`` for every mask row at once (NaN for empty rows)."""
+        ok = masks & np.isfinite(values)
+        n = ok.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(ok, values, 0.0).sum(axis=1) / n
+
     @classmethod
     def _compute_zone_substrate(cls, df, hr_col, vo2, vco2, fat_smooth, cho_smooth,
                                  rer, valid_mask, e02) -> Dict:
@@ -6282,15 +6816,17 @@ class Engine_E10_Substrate_v2:
           Z2 (aerobic base): ~85% VT1 HR → VT1
           Z4 (threshold): VT2 → VT2 + buffer
           Z5 (VO2max): VT2 + buffer → HRmax
+
+        All zones are reduced in one pass over a zone × sample membership matrix.
         """
         out = {}
         if not hr_col or hr_col not in df.columns or e02 is None:
             return out
 
-        hr = pd.to_numeric(df[hr_col], errors='coerce')
+        hr = pd.to_numeric(df[hr_col], errors='coerce').to_numpy(dtype=float)
         vt1_hr = e02.get('vt1_hr') or e02.get('vt1_hr_bpm')
         vt2_hr = e02.get('vt2_hr') or e02.get('vt2_hr_bpm')
-        hr_max = hr.max()
+        hr_max = np.nanmax(hr) if np.isfinite(hr).any() else np.nan
 
         if not vt1_hr or not vt2_hr:
             return out
@@ -6309,35 +6845,39 @@ class Engine_E10_Substrate_v2:
             'z5': (min(vt2_hr + buffer + 1, hr_max), hr_max),
         }
 
-        for zname, (hr_lo, hr_hi) in zone_defs.items():
-            mask_zone = (hr >= hr_lo) & (hr <= hr_hi)
-            mask_valid = mask_zone & valid_mask  # RER < 1.0
-            n_total = int(mask_zone.sum())
-            n_valid = int(mask_valid.sum())
-
-            if n_total < 3:
+        vo2_a = np.asarray(vo2, dtype=float)
+        vco2_a = np.asarray(vco2, dtype=float)
+        fat_a = np.clip(np.asarray(fat_smooth, dtype=float), 0, None)
+        M = cls.zone_masks(hr, list(zone_defs.values()))
+        MV = M & np.asarray(valid_mask, dtype=bool)   # RER < 1.0
+        n_total = M.sum(axis=1)
+        n_valid = MV.sum(axis=1)
+
+        # Weir EE (kcal/min) = 3.941 × VO2 + 1.106 × VCO2  (Weir 1949)
+        # More accurate than substrate sum, especially when RER ≥ 1.0
+        ee_weir = cls._masked_mean(M, 3.941 * vo2_a + 1.106 * vco2_a)
+        # Fat oxidation from Frayn (valid only RER < 1.0)
+        fat_valid = cls._masked_mean(MV, fat_a)
+        fat_all = cls._masked_mean(M, fat_a)
+
+        for z, zname in enumerate(zone_defs):
+            if n_total[z] < 3:
                 out[zname] = {
                     'fat_gh': None, 'cho_gh': None,
                     'fat_pct': None, 'cho_pct': None,
-                    'n_points': n_total, 'rer_valid': False,
+                    'n_points': int(n_total[z]), 'rer_valid': False,
                     'note': 'insufficient data'
                 }
                 continue
 
-            # Weir EE (kcal/min) = 3.941 × VO2 + 1.106 × VCO2  (Weir 1949)
-            # More accurate than substrate sum, especially when RER ≥ 1.0
-            vo2_zone = vo2[mask_zone]
-            vco2_zone = vco2[mask_zone]
-            ee_weir_min = float((3.941 * vo2_zone + 1.106 * vco2_zone).mean())
+            ee_weir_min = float(ee_weir[z])
             ee_weir_h = round(ee_weir_min * 60, 0)
 
-            # Fat oxidation from Frayn (valid only RER < 1.0)
-            if n_valid >= 5:
-                fat_avg = float(fat_smooth[mask_valid].clip(lower=0).mean())
+            if n_valid[z] >= 5:
+                fat_avg = float(fat_valid[z])
                 rer_ok = True
             else:
-                fat_avg = float(fat_smooth[mask_zone].clip(lower=0).mean())
-                fat_avg = max(fat_avg, 0)
+                fat_avg = max(float(fat_all[z]), 0)
                 rer_ok = False
 
             fat_gh = round(fat_avg * 60, 1)  # g/min → g/h
@@ -6358,7 +6898,7 @@ class Engine_E10_Substrate_v2:
                 'fat_pct': fat_pct,
                 'cho_pct': cho_pct,
                 'kcal_h': ee_weir_h,
-                'n_points': n_total,
+                'n_points': int(n_total[z]),
                 'rer_valid': rer_ok,
                 'note': None if rer_ok else 'RER≥1 — kcal/h z Weir, FAT≈0',
             }
@@ -6447,6 +6987,13 @@ class Engine_E11_Lactate_v2:
 
     MIN_POINTS = 4
     RECOMMENDED_POINTS = 6
+    GRID_N = 1000           # gęsta siatka krzywej wielomianowej (OBLA, Dmax, ModDmax, MinLacEq)
+    MC_LA_FLOOR = 0.1       # dolne obcięcie zaburzonych próbek w Monte Carlo [mmol/L]
+    MC_MIN_VALID = 10       # mniej replikacji z wynikiem → brak CI dla metody
+
+    # Priorytet metod przy wyborze LT1/LT2 (run() i Monte Carlo)
+    LT1_PRIORITY = ["baseline_plus_0.5", "log_log", "baseline_plus_1.0"]
+    LT2_PRIORITY = ["dmax_modified", "dmax", "obla_4.0", "min_lac_eq_1.5"]
 
     # ─── SEKCJA 1: ŁADOWANIE I WALIDACJA DANYCH ───
 
@@ -6503,7 +7050,8 @@ class Engine_E11_Lactate_v2:
                 if "time_sec" in df_la_csv.columns and "lactate_mmol" in df_la_csv.columns:
                     frames.append(df_la_csv)
             except Exception as e:
-                print(f"  ⚠️ E11: Nie można wczytać CSV lactate: {e}")
+                get_logger("engine.E11").warning("  ⚠️ E11: Nie można wczytać CSV lactate: %s", e,
+                                                 extra={"engine": "E11"})
 
         # Źródło C: kolumna w głównym df CPET (sparse)
         # Skip if manual data provided — manual is gold standard,
@@ -6635,23 +7183,50 @@ class Engine_E11_Lactate_v2:
         """Evaluate polynomial at given x values."""
         return np.polyval(coeffs, x)
 
+    @staticmethod
+    def _prepare_curve(x: np.ndarray, y: np.ndarray) -> Dict:
+        """
+        Wspólny fit wielomianu 3. stopnia + gęsta siatka (GRID_N punktów na [x0, xN]).
+        Liczony raz w run() i przekazywany do metod (OBLA, Dmax, ModDmax, MinLacEq,
+        Baseline+ fallback) zamiast osobnego polyfit/polyval w każdej z nich.
+        coeffs = None → fit się nie udał (metody przechodzą na swoje fallbacki).
+        """
+        coeffs = Engine_E11_Lactate_v2._fit_polynomial(x, y, degree=3)
+        curve = {"coeffs": coeffs, "x_fine": None, "y_fine": None}
+        if coeffs is not None and len(x):
+            x_fine = np.linspace(x[0], x[-1], Engine_E11_Lactate_v2.GRID_N)
+            curve["x_fine"] = x_fine
+            curve["y_fine"] = np.polyval(coeffs, x_fine)
+        return curve
+
     @staticmethod
     def _perpendicular_distance(px, py, x1, y1, x2, y2):
         """
         Odległość prostopadła punktu (px, py) od linii (x1,y1)-(x2,y2).
         Wzór: |((y2-y1)*px - (x2-x1)*py + x2*y1 - y2*x1)| / sqrt((y2-y1)^2 + (x2-x1)^2)
+        px/py mogą być tablicami — wtedy zwraca tablicę odległości (jeden przebieg).
         """
-        num = abs((y2 - y1) * px - (x2 - x1) * py + x2 * y1 - y2 * x1)
+        num = np.abs((y2 - y1) * px - (x2 - x1) * py + x2 * y1 - y2 * x1)
         den = np.sqrt((y2 - y1)**2 + (x2 - x1)**2)
         if den == 0:
-            return 0.0
+            return np.zeros_like(num) if np.ndim(num) else 0.0
         return num / den
 
+    @staticmethod
+    def _dmax_on_grid(x_fine: np.ndarray, y_fine: np.ndarray):
+        """Dmax na siatce: (idx, distances) — linia od pierwszego do ostatniego punktu krzywej, marginesy 5%."""
+        distances = Engine_E11_Lactate_v2._perpendicular_distance(
+            x_fine, y_fine, x_fine[0], y_fine[0], x_fine[-1], y_fine[-1])
+        # Ignorujemy pierwszy i ostatni 5% żeby uniknąć artefaktów edge
+        margin = max(int(len(distances) * 0.05), 1)
+        return margin + int(np.argmax(distances[margin:len(distances) - margin])), distances
+
     # ─── SEKCJA 3: METODY LT1 (AEROBIC THRESHOLD) ───
 
     @staticmethod
     def _method_baseline_plus(df_la: pd.DataFrame, baseline: float,
-                              delta: float = 0.5, intensity_col: str = "time_sec") -> Dict:
+                              delta: float = 0.5, intensity_col: str = "time_sec",
+                              curve: Optional[Dict] = None) -> Dict:
         """
         Baseline + delta mmol/L method (Berg 1990, Zoladz 1995).
         LT = pierwszy punkt, w którym La > baseline + delta.
@@ -6685,7 +7260,7 @@ class Engine_E11_Lactate_v2:
             }
 
         # Polynomial interpolation fallback
-        coeffs = Engine_E11_Lactate_v2._fit_polynomial(x, y, degree=3)
+        coeffs = (curve or Engine_E11_Lactate_v2._prepare_curve(x, y))["coeffs"]
         if coeffs is not None:
             x_fine = np.linspace(x[0], x[-1], 500)
             y_fine = np.polyval(coeffs, x_fine)
@@ -6702,6 +7277,45 @@ class Engine_E11_Lactate_v2:
 
         return {"found": False, "method": f"Baseline+{delta}", "reason": f"La never reached {threshold_value:.1f} mmol/L"}
 
+    @staticmethod
+    def _segmented_sse(log_x: np.ndarray, log_y: np.ndarray):
+        """
+        SSE regresji dwusegmentowej (wspólny punkt złamania) dla wszystkich breakpointów naraz.
+        Segmenty [0, bp] i [bp, n-1], min. 3 punkty w każdym → bp = 2 … n-3.
+        Sumy Σx, Σy, Σx², Σxy, Σy² z sum prefiksowych (dane wycentrowane), więc każdy
+        kandydat to O(1) zamiast dwóch linregress. log_y może być 2-D (n × replikacje).
+        Zwraca (bps, sse); sse = NaN gdy segment ma stałe x.
+        """
+        n = len(log_x)
+        bps = np.arange(2, n - 2)
+        if len(bps) == 0:
+            return bps, np.empty((0,) + np.shape(log_y)[1:])
+
+        xc = log_x - log_x.mean()
+        yc = log_y - log_y.mean(axis=0)
+        if yc.ndim == 2:
+            xc = xc[:, None]
+
+        def _prefix(a):
+            return np.concatenate([np.zeros((1,) + a.shape[1:]), np.cumsum(a, axis=0)])
+
+        xc_b = np.broadcast_to(xc, yc.shape)
+        Sx, Sxx = _prefix(xc_b), _prefix(xc_b * xc_b)
+        Sy, Sxy, Syy = _prefix(yc), _prefix(xc_b * yc), _prefix(yc * yc)
+
+        def _sse(lo, hi):
+            m = (hi - lo).reshape((-1,) + (1,) * (yc.ndim - 1)).astype(float)
+            sx, sy = Sx[hi] - Sx[lo], Sy[hi] - Sy[lo]
+            sxx = Sxx[hi] - Sxx[lo] - sx * sx / m
+            sxy = Sxy[hi] - Sxy[lo] - sx * sy / m
+            syy = Syy[hi] - Syy[lo] - sy * sy / m
+            with np.errstate(divide="ignore", invalid="ignore"):
+                sse = np.where(sxx > 1e-12, syy - sxy * sxy / sxx, np.nan)
+            return np.maximum(sse, 0.0)
+
+        zero = np.zeros_like(bps)
+        return bps, _sse(zero, bps + 1) + _sse(bps, np.full_like(bps, n))
+
     @staticmethod
     def _method_log_log(df_la: pd.DataFrame, intensity_col: str = "time_sec") -> Dict:
         """
@@ -6720,34 +7334,11 @@ class Engine_E11_Lactate_v2:
         log_x = np.log(x[valid])
         log_y = np.log(y[valid])
 
-        # Segmented regression: szukamy najlepszego breakpointu
-        n = len(log_x)
-        best_sse = np.inf
-        best_bp = None
-
-        for bp_idx in range(2, n - 2):  # Min 2 punkty w każdym segmencie
-            # Segment 1: [0, bp_idx]
-            x1, y1 = log_x[:bp_idx + 1], log_y[:bp_idx + 1]
-            # Segment 2: [bp_idx, end]
-            x2, y2 = log_x[bp_idx:], log_y[bp_idx:]
-
-            try:
-                from scipy.stats import linregress
-                s1 = linregress(x1, y1)
-                s2 = linregress(x2, y2)
-
-                sse1 = np.sum((y1 - (s1.slope * x1 + s1.intercept))**2)
-                sse2 = np.sum((y2 - (s2.slope * x2 + s2.intercept))**2)
-                total_sse = sse1 + sse2
-
-                if total_sse < best_sse:
-                    best_sse = total_sse
-                    best_bp = bp_idx
-            except Exception:
-                continue
-
-        if best_bp is None:
+        # Segmented regression: najlepszy breakpoint (min 2 punkty w każdym segmencie + wspólny)
+        bps, sse = Engine_E11_Lactate_v2._segmented_sse(log_x, log_y)
+        if len(sse) == 0 or not np.isfinite(sse).any():
             return {"found": False, "method": "Log-Log", "reason": "Nie znaleziono breakpointu"}
+        best_bp = int(bps[np.nanargmin(sse)])
 
         bp_time = float(np.exp(log_x[best_bp]))
         bp_la = float(np.exp(log_y[best_bp]))
@@ -6764,7 +7355,7 @@ class Engine_E11_Lactate_v2:
 
     @staticmethod
     def _method_obla(df_la: pd.DataFrame, fixed_la: float = 4.0,
-                     intensity_col: str = "time_sec") -> Dict:
+                     intensity_col: str = "time_sec", curve: Optional[Dict] = None) -> Dict:
         """
         OBLA — Onset of Blood Lactate Accumulation (Mader 1976).
         Intensywność przy stałej wartości La (typowo 4.0 mmol/L).
@@ -6778,22 +7369,22 @@ class Engine_E11_Lactate_v2:
             return {"found": False, "method": f"OBLA {fixed_la}", "reason": f"La max ({y.max():.1f}) < {fixed_la} mmol/L"}
 
         # Polynomial fit dla interpolacji
-        coeffs = Engine_E11_Lactate_v2._fit_polynomial(x, y, degree=3)
-        if coeffs is None:
-            # Fallback: interpolacja liniowa
-            for i in range(1, len(y)):
-                if y[i] >= fixed_la and y[i-1] < fixed_la:
-                    x_interp = x[i-1] + (fixed_la - y[i-1]) * (x[i] - x[i-1]) / (y[i] - y[i-1])
-                    return {
-                        "found": True,
-                        "threshold_time_sec": round(float(x_interp), 1),
-                        "threshold_la_mmol": fixed_la,
-                        "method": f"OBLA {fixed_la} (linear interp)",
-                    }
+        curve = curve or Engine_E11_Lactate_v2._prepare_curve(x, y)
+        if curve["coeffs"] is None:
+            # Fallback: interpolacja liniowa (pierwsze przejście przez fixed_la)
+            cross = np.nonzero((y[1:] >= fixed_la) & (y[:-1] < fixed_la))[0]
+            if len(cross):
+                i = int(cross[0]) + 1
+                x_interp = x[i-1] + (fixed_la - y[i-1]) * (x[i] - x[i-1]) / (y[i] - y[i-1])
+                return {
+                    "found": True,
+                    "threshold_time_sec": round(float(x_interp), 1),
+                    "threshold_la_mmol": fixed_la,
+                    "method": f"OBLA {fixed_la} (linear interp)",
+                }
             return {"found": False, "method": f"OBLA {fixed_la}"}
 
-        x_fine = np.linspace(x[0], x[-1], 1000)
-        y_fine = np.polyval(coeffs, x_fine)
+        x_fine, y_fine = curve["x_fine"], curve["y_fine"]
         above = y_fine >= fixed_la
         if above.any():
             x_obla = x_fine[np.argmax(above)]
@@ -6807,7 +7398,8 @@ class Engine_E11_Lactate_v2:
         return {"found": False, "method": f"OBLA {fixed_la}"}
 
     @staticmethod
-    def _method_dmax(df_la: pd.DataFrame, intensity_col: str = "time_sec") -> Dict:
+    def _method_dmax(df_la: pd.DataFrame, intensity_col: str = "time_sec",
+                     curve: Optional[Dict] = None) -> Dict:
         """
         Dmax method (Cheng 1992).
         1) Fit 3rd order polynomial to La vs intensity
@@ -6822,29 +7414,14 @@ class Engine_E11_Lactate_v2:
         if len(x) < 4:
             return {"found": False, "method": "Dmax", "reason": "Za mało punktów (<4)"}
 
-        coeffs = Engine_E11_Lactate_v2._fit_polynomial(x, y, degree=3)
+        curve = curve or Engine_E11_Lactate_v2._prepare_curve(x, y)
+        coeffs = curve["coeffs"]
         if coeffs is None:
             return {"found": False, "method": "Dmax", "reason": "Polynomial fit failed"}
 
-        # Gęsta siatka na krzywej
-        x_fine = np.linspace(x[0], x[-1], 1000)
-        y_fine = np.polyval(coeffs, x_fine)
-
         # Linia prosta: od pierwszego do ostatniego punktu na KRZYWEJ (nie surowych danych)
-        x1, y1 = x_fine[0], y_fine[0]
-        x2, y2 = x_fine[-1], y_fine[-1]
-
-        # Odległości prostopadłe
-        distances = np.array([
-            Engine_E11_Lactate_v2._perpendicular_distance(xi, yi, x1, y1, x2, y2)
-            for xi, yi in zip(x_fine, y_fine)
-        ])
-
-        # Dmax = punkt max odległości (ale tylko w "rosnącej" części krzywej)
-        # Ignorujemy pierwszy i ostatni 5% żeby uniknąć artefaktów edge
-        margin = max(int(len(distances) * 0.05), 1)
-        search_range = slice(margin, len(distances) - margin)
-        dmax_idx = margin + np.argmax(distances[search_range])
+        x_fine, y_fine = curve["x_fine"], curve["y_fine"]
+        dmax_idx, distances = Engine_E11_Lactate_v2._dmax_on_grid(x_fine, y_fine)
 
         dmax_time = float(x_fine[dmax_idx])
         dmax_la = float(y_fine[dmax_idx])
@@ -6861,7 +7438,18 @@ class Engine_E11_Lactate_v2:
         }
 
     @staticmethod
-    def _method_dmax_modified(df_la: pd.DataFrame, intensity_col: str = "time_sec") -> Dict:
+    def _moddmax_start(y: np.ndarray) -> int:
+        """Punkt startu ModDmax: poprzedzający pierwszy wzrost > 0.4 mmol/L (fallback: minimum La)."""
+        rise = np.diff(y) > 0.4
+        start_idx = int(np.argmax(rise)) if rise.any() else 0
+        # Jeśli nigdy nie było wzrostu > 0.4 (lub start = pierwszy punkt), fallback do minimum La
+        if start_idx == 0:
+            start_idx = int(np.argmin(y))
+        return start_idx
+
+    @staticmethod
+    def _method_dmax_modified(df_la: pd.DataFrame, intensity_col: str = "time_sec",
+                              curve: Optional[Dict] = None) -> Dict:
         """
         Modified Dmax (Bishop 1998).
         Jak Dmax, ale linia startowa NIE od pierwszego punktu,
@@ -6876,40 +7464,20 @@ class Engine_E11_Lactate_v2:
         if len(x) < 4:
             return {"found": False, "method": "ModDmax", "reason": "Za mało punktów (<4)"}
 
-        # Znajdź punkt start: poprzedzający pierwszy wzrost > 0.4 mmol/L
-        start_idx = 0
-        for i in range(1, len(y)):
-            if y[i] - y[i-1] > 0.4:
-                start_idx = max(0, i - 1)
-                break
-
-        # Jeśli nigdy nie było wzrostu > 0.4, fallback do minimum La
-        if start_idx == 0:
-            start_idx = int(np.argmin(y))
+        start_idx = Engine_E11_Lactate_v2._moddmax_start(y)
 
         if len(x) - start_idx < 3:
             return {"found": False, "method": "ModDmax", "reason": "Za mało punktów po start_idx"}
 
         # Polynomial na PEŁNYCH danych (zgodnie z literaturą)
-        coeffs = Engine_E11_Lactate_v2._fit_polynomial(x, y, degree=3)
+        coeffs = (curve or Engine_E11_Lactate_v2._prepare_curve(x, y))["coeffs"]
         if coeffs is None:
             return {"found": False, "method": "ModDmax", "reason": "Polynomial fit failed"}
 
-        x_fine = np.linspace(x[start_idx], x[-1], 1000)
-        y_fine = np.polyval(coeffs, x_fine)
-
         # Linia: od start_point do last point (na krzywej polynomial)
-        x1, y1 = x_fine[0], y_fine[0]
-        x2, y2 = x_fine[-1], y_fine[-1]
-
-        distances = np.array([
-            Engine_E11_Lactate_v2._perpendicular_distance(xi, yi, x1, y1, x2, y2)
-            for xi, yi in zip(x_fine, y_fine)
-        ])
-
-        margin = max(int(len(distances) * 0.05), 1)
-        search_range = slice(margin, len(distances) - margin)
-        dmax_idx = margin + np.argmax(distances[search_range])
+        x_fine = np.linspace(x[start_idx], x[-1], Engine_E11_Lactate_v2.GRID_N)
+        y_fine = np.polyval(coeffs, x_fine)
+        dmax_idx, distances = Engine_E11_Lactate_v2._dmax_on_grid(x_fine, y_fine)
 
         return {
             "found": True,
@@ -6921,9 +7489,19 @@ class Engine_E11_Lactate_v2:
             "max_distance": round(float(distances[dmax_idx]), 4),
         }
 
+    @staticmethod
+    def _lac_eq_intensity(df_la: pd.DataFrame, intensity_col: str = "time_sec") -> np.ndarray:
+        """Intensywność dla Lactate Equivalent: speed > power > czas (≥80% wypełnienia)."""
+        # Preferuj speed jako intensywność (fizjologicznie sensowniejsze)
+        if "speed_kmh" in df_la.columns and df_la["speed_kmh"].notna().sum() >= len(df_la) * 0.8:
+            return df_la["speed_kmh"].values
+        if "power_w" in df_la.columns and df_la["power_w"].notna().sum() >= len(df_la) * 0.8:
+            return df_la["power_w"].values
+        return df_la[intensity_col].values  # Fallback do czasu
+
     @staticmethod
     def _method_min_lactate_eq(df_la: pd.DataFrame, intensity_col: str = "time_sec",
-                               add_mmol: float = 1.5) -> Dict:
+                               add_mmol: float = 1.5, curve: Optional[Dict] = None) -> Dict:
         """
         Minimum Lactate Equivalent + 1.5 mmol/L (Dickhuth 1999).
 
@@ -6933,14 +7511,7 @@ class Engine_E11_Lactate_v2:
         """
         x = df_la[intensity_col].values
         y = df_la["lactate_mmol"].values
-
-        # Preferuj speed jako intensywność (fizjologicznie sensowniejsze)
-        if "speed_kmh" in df_la.columns and df_la["speed_kmh"].notna().sum() >= len(df_la) * 0.8:
-            intensity = df_la["speed_kmh"].values
-        elif "power_w" in df_la.columns and df_la["power_w"].notna().sum() >= len(df_la) * 0.8:
-            intensity = df_la["power_w"].values
-        else:
-            intensity = x  # Fallback do czasu
+        intensity = Engine_E11_Lactate_v2._lac_eq_intensity(df_la, intensity_col)
 
         # Lactate Equivalent
         valid = intensity > 0
@@ -6956,10 +7527,9 @@ class Engine_E11_Lactate_v2:
         target_la = la_at_min + add_mmol
 
         # Polynomial fit do interpolacji
-        coeffs = Engine_E11_Lactate_v2._fit_polynomial(x, y, degree=3)
-        if coeffs is not None:
-            x_fine = np.linspace(x[0], x[-1], 1000)
-            y_fine = np.polyval(coeffs, x_fine)
+        curve = curve or Engine_E11_Lactate_v2._prepare_curve(x, y)
+        if curve["coeffs"] is not None:
+            x_fine, y_fine = curve["x_fine"], curve["y_fine"]
             above = y_fine >= target_la
             if above.any():
                 x_threshold = x_fine[np.argmax(above)]
@@ -6972,20 +7542,21 @@ class Engine_E11_Lactate_v2:
                     "min_lac_eq_time": round(float(x[min_eq_idx]), 1),
                 }
 
-        # Fallback: interpolacja liniowa
-        for i in range(min_eq_idx + 1, len(y)):
-            if y[i] >= target_la:
-                if y[i] != y[i-1]:
-                    x_interp = x[i-1] + (target_la - y[i-1]) * (x[i] - x[i-1]) / (y[i] - y[i-1])
-                else:
-                    x_interp = x[i]
-                return {
-                    "found": True,
-                    "threshold_time_sec": round(float(x_interp), 1),
-                    "threshold_la_mmol": round(target_la, 2),
-                    "method": f"MinLacEq+{add_mmol} (linear interp)",
-                    "min_lac_eq_la": round(la_at_min, 2),
-                }
+        # Fallback: interpolacja liniowa (pierwszy punkt po minimum z La ≥ target)
+        hits = np.nonzero(y[min_eq_idx + 1:] >= target_la)[0]
+        if len(hits):
+            i = int(min_eq_idx) + 1 + int(hits[0])
+            if y[i] != y[i-1]:
+                x_interp = x[i-1] + (target_la - y[i-1]) * (x[i] - x[i-1]) / (y[i] - y[i-1])
+            else:
+                x_interp = x[i]
+            return {
+                "found": True,
+                "threshold_time_sec": round(float(x_interp), 1),
+                "threshold_la_mmol": round(target_la, 2),
+                "method": f"MinLacEq+{add_mmol} (linear interp)",
+                "min_lac_eq_la": round(la_at_min, 2),
+            }
 
         return {"found": False, "method": f"MinLacEq+{add_mmol}", "reason": f"La never reached {target_la:.1f}"}
 
@@ -7072,6 +7643,154 @@ class Engine_E11_Lactate_v2:
             "lt2_consensus": _consensus(lt2_times, "LT2 (Anaerobic Threshold)"),
         }
 
+    # ─── SEKCJA 5b: MONTE CARLO — BŁĄD POMIARU La ───
+
+    @staticmethod
+    def _first_crossing(x_grid: np.ndarray, Y: np.ndarray, thr: np.ndarray) -> np.ndarray:
+        """Pierwsze x, w którym kolumna Y (siatka × replikacje) ≥ thr; NaN gdy brak."""
+        above = Y >= thr
+        idx = np.argmax(above, axis=0)
+        xs = x_grid[idx] if x_grid.ndim == 1 else np.take_along_axis(x_grid, idx[None, :], 0)[0]
+        return np.where(above.any(axis=0), xs, np.nan)
+
+    @staticmethod
+    def _dmax_batch(X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+        """Dmax dla wszystkich replikacji naraz: X, Y = (siatka × replikacje) → x progu."""
+        x1, y1, x2, y2 = X[0], Y[0], X[-1], Y[-1]
+        num = np.abs((y2 - y1) * X - (x2 - x1) * Y + x2 * y1 - y2 * x1)
+        den = np.sqrt((y2 - y1)**2 + (x2 - x1)**2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dist = np.where(den > 0, num / den, 0.0)
+        margin = max(int(len(dist) * 0.05), 1)
+        idx = margin + np.argmax(dist[margin:len(dist) - margin], axis=0)
+        return np.take_along_axis(X, idx[None, :], 0)[0]
+
+    @staticmethod
+    def _mc_method_times(x: np.ndarray, Y: np.ndarray, intensity: np.ndarray,
+                         manual_baseline: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """
+        Wszystkie metody progowe na macierzy La (punkty × replikacje) w jednym przebiegu:
+        jeden polyfit 2-D, wspólna siatka, odległości Dmax/ModDmax i SSE Log-Log wektorowo.
+        Ta sama logika co _method_* (bez zaokrągleń); wynik: czas progu per replikacja (NaN = brak).
+        """
+        E = Engine_E11_Lactate_v2
+        n, R = Y.shape
+        cols = np.arange(R)
+        C = np.polyfit(x, Y, 3)                                     # (4, R)
+        x_fine = np.linspace(x[0], x[-1], E.GRID_N)
+        Yf = np.polyval(C, x_fine[:, None])                          # (GRID_N, R)
+        out = {}
+
+        # Baseline + delta (pierwszy punkt ≥ progu, interpolacja liniowa; fallback: wielomian na 500 pkt)
+        if manual_baseline is not None and manual_baseline > 0:
+            base = np.full(R, float(manual_baseline))
+        else:
+            base = Y[:min(3, n)].min(axis=0)
+        x_500 = np.linspace(x[0], x[-1], 500)
+        Y_500 = np.polyval(C, x_500[:, None])
+        for delta in (0.5, 1.0):
+            thr = base + delta
+            above = Y >= thr
+            i = np.argmax(above, axis=0)
+            y0, y1 = Y[np.maximum(i - 1, 0), cols], Y[i, cols]
+            x0, x1 = x[np.maximum(i - 1, 0)], x[i]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = np.where((i > 0) & (y1 != y0), x0 + (thr - y0) * (x1 - x0) / (y1 - y0), x1)
+            out[f"baseline_plus_{delta}"] = np.where(
+                above.any(axis=0), t, E._first_crossing(x_500, Y_500, thr))
+
+        # Log-Log (Y obcięte do MC_LA_FLOOR → wszystkie La > 0)
+        valid = x > 0
+        t = np.full(R, np.nan)
+        if valid.sum() >= 4:
+            bps, sse = E._segmented_sse(np.log(x[valid]), np.log(Y[valid]))
+            if len(bps):
+                ok = np.isfinite(sse).any(axis=0)
+                best = np.argmin(np.where(np.isfinite(sse), sse, np.inf), axis=0)
+                t = np.where(ok, x[valid][bps[best]], np.nan)
+        out["log_log"] = t
+
+        # OBLA 4.0 / 2.0
+        for fixed in (4.0, 2.0):
+            t = E._first_crossing(x_fine, Yf, fixed)
+            out[f"obla_{fixed}"] = np.where(Y.max(axis=0) >= fixed, t, np.nan)
+
+        # Dmax (linia od początku do końca krzywej)
+        out["dmax"] = E._dmax_batch(np.broadcast_to(x_fine[:, None], Yf.shape), Yf)
+
+        # ModDmax (start per replikacja → własna siatka od x[start])
+        rise = np.diff(Y, axis=0) > 0.4
+        start = np.where(rise.any(axis=0), np.argmax(rise, axis=0), 0)
+        start = np.where(start == 0, np.argmin(Y, axis=0), start)
+        u = np.linspace(0.0, 1.0, E.GRID_N)[:, None]
+        Xs = x[start] + (x[-1] - x[start]) * u
+        out["dmax_modified"] = np.where(n - start >= 3, E._dmax_batch(Xs, np.polyval(C, Xs)), np.nan)
+
+        # MinLacEq + 1.5
+        v_idx = np.nonzero(intensity > 0)[0]
+        t = np.full(R, np.nan)
+        if len(v_idx) >= 3:
+            k = v_idx[np.argmin(Y[v_idx] / intensity[v_idx, None], axis=0)]
+            target = Y[k, cols] + 1.5
+            t = E._first_crossing(x_fine, Yf, target)
+            hit = (Y >= target) & (np.arange(n)[:, None] > k)
+            i = np.argmax(hit, axis=0)
+            y0, y1 = Y[i - 1, cols], Y[i, cols]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t_lin = np.where(y1 != y0, x[i - 1] + (target - y0) * (x[i] - x[i - 1]) / (y1 - y0), x[i])
+            t = np.where(np.isnan(t) & hit.any(axis=0), t_lin, t)
+        out["min_lac_eq_1.5"] = t
+        return out
+
+    @staticmethod
+    def _mc_summary(v: np.ndarray, ci_level: float) -> Dict:
+        ok = v[np.isfinite(v)]
+        res = {"found_rate": round(float(len(ok) / len(v)), 3) if len(v) else None,
+               "median": None, "lo": None, "hi": None, "sd": None}
+        if len(ok) >= Engine_E11_Lactate_v2.MC_MIN_VALID:
+            lo, med, hi = np.percentile(ok, [50.0 * (1.0 - ci_level), 50.0, 50.0 * (1.0 + ci_level)])
+            res.update(median=round(float(med), 1), lo=round(float(lo), 1),
+                       hi=round(float(hi), 1), sd=round(float(np.std(ok, ddof=1)), 1))
+        return res
+
+    @staticmethod
+    def _mc_measurement_error(df_la: pd.DataFrame, manual_baseline: Optional[float] = None,
+                              n_rep: int = 200, sd_mmol: float = 0.1, cv: float = 0.05,
+                              ci_level: float = 0.95, seed: int = 0) -> Dict:
+        """
+        Monte Carlo błędu pomiaru La: każda próbka zaburzona N(0, sqrt(sd_mmol² + (cv·La)²))
+        (błąd analizatora: stała + proporcjonalna), cały zestaw metod liczony na n_rep
+        replikacjach naraz (_mc_method_times). Wynik: percentylowe CI czasu progu
+        dla każdej metody oraz dla LT1/LT2 (ten sam priorytet metod co w run()).
+        """
+        E = Engine_E11_Lactate_v2
+        x = df_la["time_sec"].to_numpy(dtype=float)
+        y = df_la["lactate_mmol"].to_numpy(dtype=float)
+        n_rep = int(n_rep)
+        rng = np.random.default_rng(int(seed))
+        sd = np.sqrt(float(sd_mmol)**2 + (float(cv) * y)**2)
+        Y = np.maximum(y[:, None] + rng.standard_normal((len(y), n_rep)) * sd[:, None], E.MC_LA_FLOOR)
+
+        times = E._mc_method_times(x, Y, E._lac_eq_intensity(df_la).astype(float), manual_baseline)
+
+        def _best(order):
+            t = np.full(n_rep, np.nan)
+            for name in reversed(order):
+                t = np.where(np.isfinite(times[name]), times[name], t)
+            return t
+
+        return {
+            "status": "OK",
+            "n_rep": n_rep,
+            "sd_mmol": float(sd_mmol),
+            "cv": float(cv),
+            "ci_level": float(ci_level),
+            "seed": int(seed),
+            "methods": {name: E._mc_summary(t, ci_level) for name, t in times.items()},
+            "lt1": E._mc_summary(_best(E.LT1_PRIORITY), ci_level),
+            "lt2": E._mc_summary(_best(E.LT2_PRIORITY), ci_level),
+        }
+
     # ─── SEKCJA 6: GŁÓWNA METODA RUN ───
 
     @staticmethod
@@ -7185,20 +7904,23 @@ class Engine_E11_Lactate_v2:
         
         # --- Uruchom wszystkie metody ---
         results = {}
+        # Wspólny wielomian + gęsta siatka dla wszystkich metod
+        curve = Engine_E11_Lactate_v2._prepare_curve(
+            df_la["time_sec"].values, df_la["lactate_mmol"].values)
 
         # LT1 methods
         results["baseline_plus_0.5"] = Engine_E11_Lactate_v2._method_baseline_plus(
-            df_la, baseline, delta=0.5)
+            df_la, baseline, delta=0.5, curve=curve)
         results["baseline_plus_1.0"] = Engine_E11_Lactate_v2._method_baseline_plus(
-            df_la, baseline, delta=1.0)
+            df_la, baseline, delta=1.0, curve=curve)
         results["log_log"] = Engine_E11_Lactate_v2._method_log_log(df_la)
 
         # LT2 methods
-        results["obla_4.0"] = Engine_E11_Lactate_v2._method_obla(df_la, fixed_la=4.0)
-        results["obla_2.0"] = Engine_E11_Lactate_v2._method_obla(df_la, fixed_la=2.0)  # Bonus: LT1 proxy
-        results["dmax"] = Engine_E11_Lactate_v2._method_dmax(df_la)
-        results["dmax_modified"] = Engine_E11_Lactate_v2._method_dmax_modified(df_la)
-        results["min_lac_eq_1.5"] = Engine_E11_Lactate_v2._method_min_lactate_eq(df_la, add_mmol=1.5)
+        results["obla_4.0"] = Engine_E11_Lactate_v2._method_obla(df_la, fixed_la=4.0, curve=curve)
+        results["obla_2.0"] = Engine_E11_Lactate_v2._method_obla(df_la, fixed_la=2.0, curve=curve)  # Bonus: LT1 proxy
+        results["dmax"] = Engine_E11_Lactate_v2._method_dmax(df_la, curve=curve)
+        results["dmax_modified"] = Engine_E11_Lactate_v2._method_dmax_modified(df_la, curve=curve)
+        results["min_lac_eq_1.5"] = Engine_E11_Lactate_v2._method_min_lactate_eq(df_la, add_mmol=1.5, curve=curve)
 
         # Wzbogać każdy wynik o HR/Speed/VO2/Power w punkcie progu
         for key, res in results.items():
@@ -7247,8 +7969,7 @@ class Engine_E11_Lactate_v2:
 
         # --- Polynomial curve data (for plotting) ---
         poly_curve = None
-        coeffs = Engine_E11_Lactate_v2._fit_polynomial(
-            df_la["time_sec"].values, df_la["lactate_mmol"].values, degree=3)
+        coeffs = curve["coeffs"]
         if coeffs is not None:
             x_fine = np.linspace(df_la["time_sec"].min(), df_la["time_sec"].max(), 200)
             y_fine = np.polyval(coeffs, x_fine)
@@ -7260,16 +7981,44 @@ class Engine_E11_Lactate_v2:
                     df_la["time_sec"].values, df_la["lactate_mmol"].values, coeffs),
             }
 
+        # --- Monte Carlo: błąd pomiaru La (domyślnie włączone, cfg.lactate_mc_n = 0 → wyłącza) ---
+        n_mc = int(getattr(cfg, "lactate_mc_n", 200) or 0) if cfg is not None else 200
+        if _is_continuous and n_points > 30:
+            measurement_mc = {"status": "SKIPPED", "reason": "Ciągłe (estymowane) dane La — brak próbek pomiarowych"}
+        elif n_mc <= 0:
+            measurement_mc = {"status": "SKIPPED", "reason": "lactate_mc_n = 0"}
+        else:
+            try:
+                measurement_mc = Engine_E11_Lactate_v2._mc_measurement_error(
+                    df_la, manual_baseline, n_rep=n_mc,
+                    sd_mmol=getattr(cfg, "lactate_mc_sd_mmol", 0.1),
+                    cv=getattr(cfg, "lactate_mc_cv", 0.05),
+                    ci_level=getattr(cfg, "lactate_mc_ci", 0.95),
+                    seed=getattr(cfg, "lactate_mc_seed", 0))
+                for key, mc in measurement_mc["methods"].items():
+                    mc["point"] = results.get(key, {}).get("threshold_time_sec")
+                for lt in ("lt1", "lt2"):
+                    mc = measurement_mc[lt]
+                    for side in ("lo", "hi"):
+                        if mc[side] is None:
+                            continue
+                        for col in ("hr_bpm", "speed_kmh"):
+                            val = Engine_E11_Lactate_v2._interpolate_at_time(df_la, mc[side], col)
+                            if val is not None:
+                                mc[f"{col}_{side}"] = val
+            except Exception as e:
+                measurement_mc = {"status": "ERROR", "reason": f"{type(e).__name__}: {e}"}
+
         # --- Finalne podsumowanie ---
         # Best LT1 i LT2 (priorytet: ModDmax > Dmax > OBLA dla LT2; Bsln+0.5 > LogLog dla LT1)
         lt1_best = None
-        for key in ["baseline_plus_0.5", "log_log", "baseline_plus_1.0"]:
+        for key in Engine_E11_Lactate_v2.LT1_PRIORITY:
             if results.get(key, {}).get("found"):
                 lt1_best = results[key]
                 break
 
         lt2_best = None
-        for key in ["dmax_modified", "dmax", "obla_4.0", "min_lac_eq_1.5"]:
+        for key in Engine_E11_Lactate_v2.LT2_PRIORITY:
             if results.get(key, {}).get("found"):
                 lt2_best = results[key]
                 break
@@ -7312,6 +8061,9 @@ class Engine_E11_Lactate_v2:
             # Surowe dane + krzywa
             "raw_points": raw_points,
             "poly_curve": poly_curve,
+
+            # Niepewność progów z błędu pomiaru La (Monte Carlo)
+            "measurement_error_mc": measurement_mc,
         }
 
 
@@ -7325,10 +8077,11 @@ class Engine_E12_NIRS:
     """
 
     @staticmethod
-    def _find_smo2_col(df):
-        for c in ['SmO2_pct', 'SmO2_1', 'SmO2_2', 'SmO2_3', 'SmO2_4', 'SmO2']:
+    def _find_smo2_col(df, sig=None):
+        sig = SignalStore.for_frame(df, sig)
+        for c in SignalStore.ALIASES['smo2']:
             if c in df.columns:
-                vals = pd.to_numeric(df[c], errors='coerce')
+                vals = sig.numeric(c)
                 if (vals.dropna() > 0).sum() >= 10:
                     return c
         return None
@@ -7344,35 +8097,66 @@ class Engine_E12_NIRS:
         return s
 
     @staticmethod
-    def _segmented_regression_2bp(t, y):
+    def _segmented_regression_2bp(t, y, block_elems=2_000_000):
+        """
+        Exact 3-segment least squares over every (i, j) split (no stride):
+        segment RSS from prefix sums of t, y, t², ty, y² (centred), one
+        vectorized (i × j) block at a time. Returns (bp1, bp2, rss) with
+        rss of the winning split recomputed with polyfit, or (None, None, inf).
+        """
+        t = np.asarray(t, dtype=float)
+        y = np.asarray(y, dtype=float)
         n = len(t)
         if n < 20:
             return None, None, float('inf')
-        best_rss = float('inf')
-        best_bp1, best_bp2 = None, None
-        step = max(1, n // 80)
         min_seg = max(5, n // 10)
-        for i in range(min_seg, n - 2 * min_seg, step):
-            for j in range(i + min_seg, n - min_seg, step):
-                try:
-                    rss = 0
-                    for sl in [(0, i), (i, j), (j, n)]:
-                        seg_t = t[sl[0]:sl[1]]
-                        seg_y = y[sl[0]:sl[1]]
-                        if len(seg_t) < 3:
-                            rss = float('inf'); break
-                        coeffs = np.polyfit(seg_t, seg_y, 1)
-                        rss += np.sum((seg_y - np.polyval(coeffs, seg_t)) ** 2)
-                    if rss < best_rss:
-                        best_rss = rss
-                        best_bp1, best_bp2 = i, j
-                except:
-                    continue
-        return best_bp1, best_bp2, best_rss
+        ii = np.arange(min_seg, n - 2 * min_seg)
+        if len(ii) == 0 or not (np.all(np.isfinite(t)) and np.all(np.isfinite(y))):
+            return None, None, float('inf')
+
+        tc = t - t.mean()
+        yc = y - y.mean()
+        z = np.zeros(1)
+        C = [np.concatenate([z, np.cumsum(v)]) for v in (tc, yc, tc * tc, tc * yc, yc * yc)]
+
+        def seg_rss(a, b):
+            # RSS of the LS line on [a, b) (broadcasts over index arrays)
+            m = (b - a).astype(float)
+            st, sy, stt, sty, syy = (c[b] - c[a] for c in C)
+            sxx = stt - st * st / m
+            sxy = sty - st * sy / m
+            with np.errstate(divide='ignore', invalid='ignore'):
+                r = syy - sy * sy / m - np.where(sxx > 0, sxy * sxy / sxx, 0.0)
+            return np.maximum(r, 0.0)
+
+        jj = np.arange(2 * min_seg, n - min_seg)
+        head = seg_rss(np.zeros_like(ii), ii)              # [0, i)
+        tail = seg_rss(jj, np.full_like(jj, n))            # [j, n)
+
+        best_rss, best_bp1, best_bp2 = float('inf'), None, None
+        rows = max(1, int(block_elems) // max(1, len(jj)))
+        for a0 in range(0, len(ii), rows):
+            i_blk = ii[a0:a0 + rows]
+            I, J = i_blk[:, None], jj[None, :]
+            tot = head[a0:a0 + rows, None] + seg_rss(I, J) + tail[None, :]
+            tot = np.where(J >= I + min_seg, tot, np.inf)  # middle segment ≥ min_seg
+            k = int(np.argmin(tot))
+            if tot.flat[k] < best_rss:
+                best_rss = float(tot.flat[k])
+                best_bp1, best_bp2 = int(i_blk[k // len(jj)]), int(jj[k % len(jj)])
+
+        if best_bp1 is None:
+            return None, None, float('inf')
+        rss = 0.0
+        for a0, b0 in [(0, best_bp1), (best_bp1, best_bp2), (best_bp2, n)]:
+            coeffs = np.polyfit(t[a0:b0], y[a0:b0], 1)
+            rss += np.sum((y[a0:b0] - np.polyval(coeffs, t[a0:b0])) ** 2)
+        return best_bp1, best_bp2, rss
 
     @staticmethod
-    def run(df_full, r02=None, r01=None, r00=None, cfg=None):
+    def run(df_full, r02=None, r01=None, r00=None, cfg=None, signals=None):
         r02 = r02 or {}; r01 = r01 or {}; r00 = r00 or {}
+        sig = SignalStore.for_frame(df_full, signals)
         result = {
             'status': 'NO_SIGNAL', 'channel': None,
             'smo2_rest': None, 'smo2_min': None, 'smo2_min_time_s': None,
@@ -7385,12 +8169,13 @@ class Engine_E12_NIRS:
             'smo2_recovery_peak': None, 'hrt_s': None, 'overshoot_abs': None, 'reox_rate': None,
             'signal_quality': 'NO_SIGNAL', 'flags': [],
         }
-        col = Engine_E12_NIRS._find_smo2_col(df_full)
+        col = Engine_E12_NIRS._find_smo2_col(df_full, sig)
         if col is None:
             return result
         result['channel'] = col; result['status'] = 'OK'
-        ts = pd.to_numeric(df_full.get('Time_sec', df_full.get('Time_s', pd.Series())), errors='coerce')
-        smo2_raw = pd.to_numeric(df_full[col], errors='coerce')
+        t_col = sig.col(['Time_sec', 'Time_s'])
+        ts = sig.numeric(t_col) if t_col else pd.Series(dtype=float)
+        smo2_raw = sig.numeric(col)
         valid = smo2_raw.notna() & ts.notna() & (smo2_raw > 0)
         if valid.sum() < 10:
             result['status'] = 'INSUFFICIENT_DATA'; result['signal_quality'] = 'POOR'; return result
@@ -8508,8 +9293,7 @@ class Engine_E14_Kinetics:
         import pandas as pd
 
         try:
-            from scipy.optimize import curve_fit
-            from scipy.signal import savgol_filter
+            from scipy.optimize import least_squares  # noqa: F401 — kinetics_fit polish
             _has_scipy = True
         except ImportError:
             _has_scipy = False
@@ -8618,7 +9402,6 @@ class Engine_E14_Kinetics:
             out["status"] = "NO_SCIPY"
             return out
 
-        from scipy.optimize import curve_fit
         from scipy.stats import linregress
 
         t = df[time_col].values.astype(float)
@@ -8649,21 +9432,45 @@ class Engine_E14_Kinetics:
 
         # ── 2. ANALYZE EACH STAGE ──
         prev_stage_end_vo2 = None
+        warm_on = None  # (τ, TD) poprzedniego etapu → dodatkowy punkt startowy dopasowania
+        n_mc = int(getattr(acfg, 'kinetics_mc_n', 0) or 0) if acfg is not None else 0
+        mc_fits = [] if n_mc > 0 else None  # (stage dict, fit task) do refitów Monte Carlo
 
         for i, stage in enumerate(stages):
             s = Engine_E14_Kinetics._analyze_stage(
                 i, stage, t, vo2, vo2kg, hr, rer, body_mass,
-                vo2max_abs, prev_stage_end_vo2, _has_scipy
+                vo2max_abs, prev_stage_end_vo2, _has_scipy, warm=warm_on, fits=mc_fits
             )
             out["stages"].append(s)
+            if s.get('tau_on_s') is not None:
+                warm_on = (s['tau_on_s'], s['td_on_s'])
 
             # Track for next stage baseline
             mask = (t >= stage['t_start']) & (t < stage['t_end'])
             if mask.sum() > 5:
                 prev_stage_end_vo2 = float(np.nanmean(vo2[mask][-10:]))
 
+        # ── 2b. τ CI (optional): Monte Carlo refits of every stage on a process pool ──
+        if mc_fits:
+            # błąd puli / pickle / refitu nie może zabrać dopasowań punktowych etapów
+            try:
+                cis = mc_tau_intervals(
+                    [task for _, task in mc_fits], n_rep=n_mc,
+                    method=getattr(acfg, 'kinetics_mc_method', 'block'),
+                    block_sec=getattr(acfg, 'kinetics_mc_block_sec', 20.0),
+                    workers=getattr(acfg, 'kinetics_mc_workers', 0),
+                    seed=getattr(acfg, 'kinetics_mc_seed', 0),
+                    ci_level=getattr(acfg, 'kinetics_mc_ci', 0.95))
+                for (s, _), ci in zip(mc_fits, cis):
+                    s.update(ci)
+                    s["tau_ci_status"] = "OK"
+            except Exception as e:
+                for s, _ in mc_fits:
+                    s["tau_ci_status"] = f"ERROR: {type(e).__name__}: {e}"
+
         # ── 3. OFF-KINETICS between stages ──
         off_kinetics = []
+        warm_off = None  # τ_off poprzedniego przejścia
         for i in range(len(stages) - 1):
             curr = stages[i]
             nxt = stages[i + 1]
@@ -8671,17 +9478,18 @@ class Engine_E14_Kinetics:
             gap_end = nxt['t_start']
             if gap_end - gap_start >= 60:
                 off_k = Engine_E14_Kinetics._analyze_off_kinetics(
-                    t, vo2, gap_start, gap_end, body_mass, _has_scipy
+                    t, vo2, gap_start, gap_end, body_mass, _has_scipy, warm=warm_off
                 )
                 off_k['transition'] = f"S{i+1}→S{i+2}"
                 off_kinetics.append(off_k)
+                warm_off = off_k.get('tau_off_s', warm_off)
 
         # Final recovery (after last stage)
         last_end = stages[-1]['t_end']
         rec_end = float(t.max())
         if rec_end - last_end >= 60:
             final_rec = Engine_E14_Kinetics._analyze_off_kinetics(
-                t, vo2, last_end, rec_end, body_mass, _has_scipy
+                t, vo2, last_end, rec_end, body_mass, _has_scipy, warm=warm_off
             )
             final_rec['transition'] = "FINAL_RECOVERY"
             off_kinetics.append(final_rec)
@@ -8698,6 +9506,81 @@ class Engine_E14_Kinetics:
     # STAGE DETECTION
     # ═══════════════════════════════════════════════════════════
     @staticmethod
+    def _window_jumps(x, half_w):
+        """|mean(x[i:i+w]) − mean(x[i−w:i])| for every i, w = half_w (NaN-aware).
+
+        Window sums/counts come from one cumulative-sum array, so all candidate
+        boundaries are scored at once. NaN where a window is incomplete
+        (i < w or i > n − w) or has no finite samples.
+        """
+        import numpy as np
+
+        x = np.asarray(x, dtype=float)
+        n = len(x)
+        out = np.full(n, np.nan)
+        if half_w < 1 or n < 2 * half_w:
+            return out
+        ok = np.isfinite(x)
+        cs = np.concatenate(([0.0], np.cumsum(np.where(ok, x, 0.0))))
+        cn = np.concatenate(([0], np.cumsum(ok)))
+        i = np.arange(half_w, n - half_w + 1)
+        n_bef = cn[i] - cn[i - half_w]
+        n_aft = cn[i + half_w] - cn[i]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bef = (cs[i] - cs[i - half_w]) / n_bef
+            aft = (cs[i + half_w] - cs[i]) / n_aft
+        out[i] = np.where((n_bef > 0) & (n_aft > 0), np.abs(aft - bef), np.nan)
+        return out
+
+    @staticmethod
+    def _best_jump_index(x, jumps, half_w, lo, hi, default):
+        """
+        First i in [lo, hi) with the largest positive jump (``default`` if none).
+        Candidates within rounding distance of the cumulative-sum maximum are
+        re-scored with np.nanmean, so ties resolve exactly like a scan with '>'.
+        """
+        import numpy as np
+
+        seg = jumps[lo:hi] if hi > lo else jumps[:0]
+        fin = np.isfinite(seg)
+        if not fin.any():
+            return default
+        top = float(np.max(seg[fin]))
+        tol = 1e-9 * max(1.0, float(np.nanmax(np.abs(x))))
+        best_jump, best_idx = 0, default
+        for i in lo + np.flatnonzero(fin & (seg >= top - tol)):
+            jump = abs(np.nanmean(x[i:i + half_w]) - np.nanmean(x[i - half_w:i]))
+            if jump > best_jump:
+                best_jump, best_idx = jump, int(i)
+        return best_idx
+
+    @staticmethod
+    def _first_trailing_drop(x, start, thresh, win=9, min_len=5):
+        """
+        First j ≥ start where mean(x[j−win+1 : j+1]) < thresh (window clipped at 0,
+        at least ``min_len`` samples) or None. Trailing means from cumulative sums;
+        candidates near the threshold are confirmed with np.nanmean.
+        """
+        import numpy as np
+
+        x = np.asarray(x, dtype=float)
+        n = len(x)
+        j = np.arange(max(start, min_len - 1), n)
+        if len(j) == 0:
+            return None
+        ok = np.isfinite(x)
+        cs = np.concatenate(([0.0], np.cumsum(np.where(ok, x, 0.0))))
+        cn = np.concatenate(([0], np.cumsum(ok)))
+        a = np.maximum(0, j - win + 1)
+        cnt = cn[j + 1] - cn[a]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = (cs[j + 1] - cs[a]) / cnt
+        tol = 1e-9 * max(1.0, abs(float(thresh)), float(np.nanmax(np.abs(x))) if ok.any() else 1.0)
+        for jj in j[(cnt > 0) & (mean < thresh + tol)]:
+            if np.nanmean(x[max(0, jj - win + 1):jj + 1]) < thresh:
+                return int(jj)
+        return None
+
     @staticmethod
     def _detect_cwr_stages(t, vo2, hr, rer, kin_speeds):
         """Detect constant-work-rate stages from VO₂ profile.
@@ -8745,6 +9628,7 @@ class Engine_E14_Kinetics:
             # Refine each boundary using CUSUM (find nearest VO2 jump)
             vo2_s = pd.Series(vo2).rolling(15, center=True, min_periods=3).mean().values
             half_w = min(15, len(vo2) // 15)
+            jumps = Engine_E14_Kinetics._window_jumps(vo2_s, half_w)  # all i at once
 
             refined_starts = []
             for exp_t in expected_starts:
@@ -8752,16 +9636,10 @@ class Engine_E14_Kinetics:
                 search_start = max(0, np.searchsorted(t, exp_t - 90))
                 search_end = min(len(t) - 1, np.searchsorted(t, exp_t + 90))
 
-                best_jump = 0
-                best_idx = np.searchsorted(t, exp_t)  # default = expected
-
-                for i in range(max(half_w, search_start), min(len(t) - half_w, search_end)):
-                    bef = np.nanmean(vo2_s[i - half_w:i])
-                    aft = np.nanmean(vo2_s[i:i + half_w])
-                    jump = abs(aft - bef)
-                    if jump > best_jump:
-                        best_jump = jump
-                        best_idx = i
+                best_idx = Engine_E14_Kinetics._best_jump_index(
+                    vo2_s, jumps, half_w,
+                    max(half_w, search_start), min(len(t) - half_w, search_end),
+                    default=np.searchsorted(t, exp_t))  # default = expected
 
                 refined_starts.append(float(t[best_idx]))
 
@@ -8799,13 +9677,9 @@ class Engine_E14_Kinetics:
                         # Find where 15s rolling mean drops >10% from peak
                         peak_vo2 = np.nanmax(s_vo2[:len(s_vo2)*2//3+1])  # peak in first 2/3
                         drop_thresh = peak_vo2 * 0.88
-                        for j in range(len(s_vo2) // 3, len(s_vo2)):
-                            window = s_vo2[max(0, j-8):j+1]
-                            if len(window) >= 5 and np.nanmean(window) < drop_thresh:
-                                te = float(s_t[max(0, j - 5)])
-                                break
-                        else:
-                            te = te_max
+                        j = Engine_E14_Kinetics._first_trailing_drop(
+                            s_vo2, len(s_vo2) // 3, drop_thresh)
+                        te = float(s_t[max(0, j - 5)]) if j is not None else te_max
                     else:
                         te = te_max
 
@@ -8856,10 +9730,7 @@ class Engine_E14_Kinetics:
             return []
 
         jump_score = np.zeros(n)
-        for i in range(half_w, n - half_w):
-            bef = np.nanmean(vo2_s[i - half_w:i])
-            aft = np.nanmean(vo2_s[i:i + half_w])
-            jump_score[i] = abs(aft - bef)
+        jump_score[half_w:n - half_w] = Engine_E14_Kinetics._window_jumps(vo2_s, half_w)[half_w:n - half_w]
 
         jump_score[:max(10, half_w)] = 0
         jump_score[-max(10, half_w):] = 0
@@ -8950,8 +9821,13 @@ class Engine_E14_Kinetics:
     # ═══════════════════════════════════════════════════════════
     @staticmethod
     def _analyze_stage(idx, stage, t, vo2, vo2kg, hr, rer, body_mass,
-                       vo2max_abs, prev_end_vo2, _has_scipy):
-        """Analyze a single CWR stage: on-kinetics tau and slow component."""
+                       vo2max_abs, prev_end_vo2, _has_scipy, warm=None, fits=None):
+        """Analyze a single CWR stage: on-kinetics tau and slow component.
+
+        warm — (tau, td) of the previous stage, used as an extra start point.
+        fits — optional list; a successful on-fit appends (s, task) for
+               kinetics_fit.mc_tau_intervals.
+        """
         import numpy as np
 
         s = {
@@ -8987,28 +9863,25 @@ class Engine_E14_Kinetics:
         vo2_fit = vo2_stage[phase2_mask]
 
         if _has_scipy and len(t_fit) >= 15:
-            from scipy.optimize import curve_fit
-
             # Steady-state from last 60s
             late_mask = t_stage >= max(stage['duration'] - 60, stage['duration'] * 0.7)
             ss_vo2 = float(np.nanmean(vo2_stage[late_mask])) if late_mask.sum() > 3 else float(np.nanmean(vo2_stage[-10:]))
             amp_est = ss_vo2 - baseline_vo2
 
             if amp_est > 50:  # minimal signal required
-                # Mono-exponential fit
-                def mono_exp_on(t_r, A, tau, td):
-                    return np.where(t_r < td,
-                                    baseline_vo2,
-                                    baseline_vo2 + A * (1 - np.exp(-(t_r - td) / tau)))
-
+                # Mono-exponential fit: TD grid + linear A, analytic-Jacobian polish
                 try:
-                    p0 = [amp_est, 30, 12]
-                    bounds = ([amp_est * 0.3, 3, 0], [amp_est * 2.5, 150, 30])
-                    popt, pcov = curve_fit(mono_exp_on, t_fit, vo2_fit,
-                                          p0=p0, bounds=bounds, maxfev=8000)
-                    A_fit, tau_fit, td_fit = popt
-
-                    predicted = mono_exp_on(t_fit, *popt)
+                    fit = fit_on_kinetics(t_fit, vo2_fit, baseline_vo2,
+                                          a_bounds=(amp_est * 0.3, amp_est * 2.5),
+                                          tau_bounds=(3, 150), td_bounds=(0, 30),
+                                          warm=warm)
+                    A_fit, tau_fit, td_fit = fit.params
+                    if fits is not None:
+                        fits.append((s, dict(t=t_fit, y=vo2_fit, baseline=baseline_vo2,
+                                             a_bounds=(amp_est * 0.3, amp_est * 2.5),
+                                             tau_bounds=(3, 150), td_bounds=(0, 30), fit=fit)))
+
+                    predicted = fit.predicted
                     ss_res = np.sum((vo2_fit - predicted) ** 2)
                     ss_tot = np.sum((vo2_fit - np.mean(vo2_fit)) ** 2)
                     r2 = 1 - ss_res / ss_tot if ss_tot > 0 else 0
@@ -9096,8 +9969,8 @@ class Engine_E14_Kinetics:
     # OFF-KINETICS (recovery between stages or final)
     # ═══════════════════════════════════════════════════════════
     @staticmethod
-    def _analyze_off_kinetics(t, vo2, t_start, t_end, body_mass, _has_scipy):
-        """Analyze recovery kinetics between stages."""
+    def _analyze_off_kinetics(t, vo2, t_start, t_end, body_mass, _has_scipy, warm=None):
+        """Analyze recovery kinetics between stages (warm — tau_off of the previous transition)."""
         import numpy as np
 
         out = {}
@@ -9143,24 +10016,19 @@ class Engine_E14_Kinetics:
 
         # Mono-exponential off-kinetics fit
         if _has_scipy and len(t_rel) >= 10:
-            from scipy.optimize import curve_fit
-
             fit_mask = t_rel >= 10  # skip first 10s
             t_fit = t_rel[fit_mask]
             vo2_fit = vo2_rec[fit_mask]
 
             if len(t_fit) >= 8:
-                def mono_exp_off(t_r, A, tau, baseline):
-                    return baseline + A * np.exp(-t_r / tau)
-
                 try:
-                    p0 = [amplitude * 0.8, 60, vo2_end]
-                    bounds = ([50, 5, 0], [amplitude * 2, 500, vo2_peak])
-                    popt, _ = curve_fit(mono_exp_off, t_fit, vo2_fit,
-                                        p0=p0, bounds=bounds, maxfev=5000)
-                    A_off, tau_off, base_off = popt
+                    fit = fit_off_kinetics(t_fit, vo2_fit,
+                                           a_bounds=(50, amplitude * 2),
+                                           c_bounds=(0, vo2_peak),
+                                           tau_bounds=(5, 500), warm=warm)
+                    A_off, tau_off, base_off = fit.params
 
-                    predicted = mono_exp_off(t_fit, *popt)
+                    predicted = fit.predicted
                     ss_res = np.sum((vo2_fit - predicted) ** 2)
                     ss_tot = np.sum((vo2_fit - np.mean(vo2_fit)) ** 2)
                     r2 = 1 - ss_res / ss_tot if ss_tot > 0 else 0
@@ -9200,12 +10068,16 @@ class Engine_E14_Kinetics:
         if mod_stages:
             summary['tau_moderate'] = mod_stages[0]['tau_on_s']
             summary['tau_moderate_class'] = mod_stages[0].get('tau_class')
+            if mod_stages[0].get('tau_ci_lo_s') is not None:
+                summary['tau_moderate_ci'] = [mod_stages[0]['tau_ci_lo_s'], mod_stages[0]['tau_ci_hi_s']]
 
         # Heavy tau
         heavy_stages = [s for s in stages if s.get('domain') == 'HEAVY' and s.get('tau_on_s')]
         if heavy_stages:
             summary['tau_heavy'] = heavy_stages[0]['tau_on_s']
             summary['tau_heavy_class'] = heavy_stages[0].get('tau_class')
+            if heavy_stages[0].get('tau_ci_lo_s') is not None:
+                summary['tau_heavy_ci'] = [heavy_stages[0]['tau_ci_lo_s'], heavy_stages[0]['tau_ci_hi_s']]
 
         # Severe tau
         severe_stages = [s for s in stages if s.get('domain') == 'SEVERE' and s.get('tau_on_s')]
@@ -9333,23 +10205,19 @@ class Engine_E14_Kinetics:
 
         # Mono-exponential fit
         if _has_scipy:
-            from scipy.optimize import curve_fit
-            fit_data = rec[(rec["t_rel"] > 10) & (rec["t_rel"] <= min(180, rec_duration))].copy()
+            fit_data = rec[(rec["t_rel"] > 10) & (rec["t_rel"] <= min(180, rec_duration))]
 
             if len(fit_data) >= 8:
-                def mono_exp(t_val, A, tau, baseline):
-                    return baseline + A * np.exp(-t_val / tau)
-
                 try:
                     t_data = fit_data["t_rel"].values.astype(float)
                     vo2_data = fit_data[vo2_col].values.astype(float)
-                    p0 = [amplitude * 0.8, 60, vo2_rest]
-                    bounds = ([100, 5, 0], [amplitude * 2, 500, vo2_peak])
-                    popt, pcov = curve_fit(mono_exp, t_data, vo2_data,
-                                           p0=p0, bounds=bounds, maxfev=5000)
-                    A_fit, tau_fit, baseline_fit = popt
+                    fit = fit_off_kinetics(t_data, vo2_data,
+                                           a_bounds=(100, amplitude * 2),
+                                           c_bounds=(0, vo2_peak),
+                                           tau_bounds=(5, 500))
+                    A_fit, tau_fit, baseline_fit = fit.params
 
-                    predicted = mono_exp(t_data, *popt)
+                    predicted = fit.predicted
                     ss_res = np.sum((vo2_data - predicted) ** 2)
                     ss_tot = np.sum((vo2_data - np.mean(vo2_data)) ** 2)
                     r2 = 1 - ss_res / ss_tot if ss_tot > 0 else 0
@@ -10832,6 +11700,53 @@ import pandas as pd
 from typing import Dict, List, Optional, Tuple
 
 
+class HRCurve:
+    """
+    Piecewise-linear HR → value curve (speed, VO2, ...) evaluated with np.interp.
+    Scalar target → float, array of targets → ndarray (all zone boundaries in one call).
+    """
+
+    __slots__ = ('hr', 'values')
+
+    def __init__(self, hr, values):
+        self.hr = np.asarray(hr, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+
+    def __call__(self, target_hr):
+        out = np.interp(target_hr, self.hr, self.values)
+        return float(out) if np.ndim(out) == 0 else out
+
+    @classmethod
+    def from_bins(cls, hr: np.ndarray, values: np.ndarray, width: int = 5,
+                  min_count: int = 3, min_bins: int = 3) -> Optional['HRCurve']:
+        """
+        Median value per HR band [b, b + width) on integer edges from int(min HR),
+        bands with < min_count samples dropped; None if < min_bins bands remain.
+        All band medians from one lexsort + group boundaries (no per-band masks).
+        """
+        hr = np.asarray(hr, dtype=float)
+        values = np.asarray(values, dtype=float)
+        if len(hr) == 0:
+            return None
+        edges = np.arange(int(hr.min()), int(hr.max()) + width + 1, width)
+        band = np.searchsorted(edges, hr, side='right') - 1      # edges[b] <= hr < edges[b+1]
+        keep = (band >= 0) & (band < len(edges) - 1)
+        band, vals = band[keep], values[keep]
+
+        order = np.lexsort((vals, band))
+        band, vals = band[order], vals[order]
+        counts = np.bincount(band, minlength=len(edges) - 1)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        ok = counts >= min_count
+        if ok.sum() < min_bins:
+            return None
+
+        lo = vals[starts[ok] + (counts[ok] - 1) // 2]
+        hi = vals[starts[ok] + counts[ok] // 2]
+        centers = (edges[:-1][ok] + edges[1:][ok]) / 2
+        return cls(centers, (lo + hi) / 2)
+
+
 class Engine_E16_Zones_v2:
     """
     E16 v2.0 — Training Zones (5-zone + 3-zone models)
@@ -10905,7 +11820,8 @@ class Engine_E16_Zones_v2:
             max_speed: float = None,
             vt1_vo2: float = None, vt2_vo2: float = None,
             vo2_peak: float = None,
-            df_ex: pd.DataFrame = None) -> Dict:
+            df_ex: pd.DataFrame = None,
+            signals: SignalStore = None) -> Dict:
         """
         Parameters
         ----------
@@ -10916,6 +11832,7 @@ class Engine_E16_Zones_v2:
         max_speed      : Peak speed from test (km/h, optional)
         vt1_vo2, vt2_vo2, vo2_peak : VO2 values (ml/min, optional)
         df_ex          : Exercise DataFrame for HR↔Speed interpolation
+        signals        : SignalStore for df_ex (shared per run; built locally if None)
         """
 
         result = cls._init_result()
@@ -10947,10 +11864,18 @@ class Engine_E16_Zones_v2:
                 hr_max = vt2_hr + 10
                 result['flags'].append('VT2_GE_HRMAX_CORRECTED')
 
-            # ── Build HR↔Speed mapping ───────────────────────────
-            speed_fn = None
+            # ── Build HR↔Speed / HR↔VO2 curves ───────────────────
+            speed_curve = None
             if df_ex is not None:
-                speed_fn = cls._build_speed_interpolator(df_ex)
+                speed_curve = cls._build_speed_interpolator(df_ex, signals)
+            if speed_curve is None and vt1_speed and vt2_speed:
+                # Linear interpolation from known points
+                speed_curve = HRCurve(
+                    [hr_rest, vt1_hr, vt2_hr, hr_max],
+                    [0, vt1_speed, vt2_speed, max_speed if max_speed is not None else vt2_speed * 1.15])
+            vo2_curve = None
+            if vt1_vo2 and vt2_vo2 and vo2_peak:
+                vo2_curve = HRCurve([hr_rest, vt1_hr, vt2_hr, hr_max], [300, vt1_vo2, vt2_vo2, vo2_peak])
 
             # ── Calculate zone boundaries ────────────────────────
             # Key principle: VT1 = Z2|Z3 boundary, VT2 = Z3|Z4 boundary
@@ -10971,17 +11896,25 @@ class Engine_E16_Zones_v2:
             # Z3/Z4 split = midpoint between VT1 and VT2
             z3_z4_split = round((vt1_hr + vt2_hr) / 2.0)
 
-            zones = {}
-            boundaries = {
-                'z1': (int(round(hr_rest)), int(z1_z2_split)),
-                'z2': (int(z1_z2_split) + 1, int(round(vt1_hr))),
-                'z3': (int(round(vt1_hr)) + 1, int(z3_z4_split)),
-                'z4': (int(z3_z4_split) + 1, int(round(vt2_hr))),
-                'z5': (int(round(vt2_hr)) + 1, int(round(hr_max))),
+            models = {
+                'five_zone': {
+                    'z1': (int(round(hr_rest)), int(z1_z2_split)),
+                    'z2': (int(z1_z2_split) + 1, int(round(vt1_hr))),
+                    'z3': (int(round(vt1_hr)) + 1, int(z3_z4_split)),
+                    'z4': (int(z3_z4_split) + 1, int(round(vt2_hr))),
+                    'z5': (int(round(vt2_hr)) + 1, int(round(hr_max))),
+                },
+                # 3-zone model (for TID)
+                'three_zone': {
+                    'zone_I': (int(round(hr_rest)), int(round(vt1_hr))),
+                    'zone_II': (int(round(vt1_hr)) + 1, int(round(vt2_hr))),
+                    'zone_III': (int(round(vt2_hr)) + 1, int(round(hr_max))),
+                },
             }
+            tables = cls.zone_tables(models, speed_curve, vo2_curve, vo2_peak)
 
-            for zk in ['z1', 'z2', 'z3', 'z4', 'z5']:
-                hr_lo, hr_hi = boundaries[zk]
+            zones = {}
+            for zk, (hr_lo, hr_hi) in models['five_zone'].items():
                 zone = {
                     'hr_low': hr_lo,
                     'hr_high': hr_hi,
@@ -10989,30 +11922,8 @@ class Engine_E16_Zones_v2:
                     'pct_hrmax_low': round(hr_lo / hr_max * 100, 1),
                     'pct_hrmax_high': round(hr_hi / hr_max * 100, 1),
                 }
-
-                # Speed interpolation
-                if speed_fn:
-                    zone['speed_low'] = round(speed_fn(hr_lo), 1)
-                    zone['speed_high'] = round(speed_fn(hr_hi), 1)
-                elif vt1_speed and vt2_speed:
-                    # Linear interpolation from known points
-                    zone['speed_low'] = round(cls._interp_speed(
-                        hr_lo, hr_rest, vt1_hr, vt2_hr, hr_max,
-                        0, vt1_speed, vt2_speed, max_speed), 1)
-                    zone['speed_high'] = round(cls._interp_speed(
-                        hr_hi, hr_rest, vt1_hr, vt2_hr, hr_max,
-                        0, vt1_speed, vt2_speed, max_speed), 1)
-
-                # VO2 ranges (if available)
-                if vt1_vo2 and vt2_vo2 and vo2_peak:
-                    zone['vo2_low'] = round(cls._interp_vo2(
-                        hr_lo, hr_rest, vt1_hr, vt2_hr, hr_max,
-                        0, vt1_vo2, vt2_vo2, vo2_peak), 0)
-                    zone['vo2_high'] = round(cls._interp_vo2(
-                        hr_hi, hr_rest, vt1_hr, vt2_hr, hr_max,
-                        0, vt1_vo2, vt2_vo2, vo2_peak), 0)
-                    zone['pct_vo2peak_low'] = round(zone['vo2_low'] / vo2_peak * 100, 1)
-                    zone['pct_vo2peak_high'] = round(zone['vo2_high'] / vo2_peak * 100, 1)
+                # Speed / VO2 ranges (if available)
+                zone.update(tables['five_zone'][zk])
 
                 # Metadata
                 zone.update(cls.ZONE_INFO[zk])
@@ -11022,13 +11933,10 @@ class Engine_E16_Zones_v2:
             result['model'] = '5-zone Seiler VT1/VT2-anchored'
 
             # ── 3-zone model (for TID) ───────────────────────────
+            labels = {'zone_I': 'LIT (< VT1)', 'zone_II': 'MIT (VT1-VT2)', 'zone_III': 'HIT (> VT2)'}
             result['three_zone'] = {
-                'zone_I':   {'hr_low': int(round(hr_rest)), 'hr_high': int(round(vt1_hr)),
-                             'label': 'LIT (< VT1)'},
-                'zone_II':  {'hr_low': int(round(vt1_hr)) + 1, 'hr_high': int(round(vt2_hr)),
-                             'label': 'MIT (VT1-VT2)'},
-                'zone_III': {'hr_low': int(round(vt2_hr)) + 1, 'hr_high': int(round(hr_max)),
-                             'label': 'HIT (> VT2)'},
+                zk: {'hr_low': hr_lo, 'hr_high': hr_hi, 'label': labels[zk], **tables['three_zone'][zk]}
+                for zk, (hr_lo, hr_hi) in models['three_zone'].items()
             }
 
             # ── Derived metrics ──────────────────────────────────
@@ -11083,66 +11991,72 @@ class Engine_E16_Zones_v2:
             'flags': [],
         }
 
+    @staticmethod
+    def zone_tables(models: Dict[str, Dict[str, Tuple[int, int]]],
+                    speed_curve: Optional[HRCurve] = None,
+                    vo2_curve: Optional[HRCurve] = None,
+                    vo2_peak: float = None) -> Dict[str, Dict[str, Dict]]:
+        """
+        Speed / VO2 ranges for any number of zone models in one pass.
+
+        models : {model: {zone: (hr_low, hr_high)}}, e.g. 3-, 5- and 7-zone HR tables
+        → {model: {zone: {speed_low, speed_high, vo2_low, vo2_high,
+                          pct_vo2peak_low, pct_vo2peak_high}}}  (keys only for available curves)
+        Every boundary of every model is evaluated in a single np.interp call per curve.
+        """
+        keys = [(m, zk) for m, zones in models.items() for zk in zones]
+        bounds = np.array([models[m][zk] for m, zk in keys], dtype=float).reshape(-1, 2)
+        spd = speed_curve(bounds) if speed_curve is not None else None
+        vo2 = vo2_curve(bounds) if vo2_curve is not None else None
+
+        tables = {m: {} for m in models}
+        for i, (m, zk) in enumerate(keys):
+            row = {}
+            if spd is not None:
+                row['speed_low'] = round(float(spd[i, 0]), 1)
+                row['speed_high'] = round(float(spd[i, 1]), 1)
+            if vo2 is not None:
+                row['vo2_low'] = round(float(vo2[i, 0]), 0)
+                row['vo2_high'] = round(float(vo2[i, 1]), 0)
+                row['pct_vo2peak_low'] = round(row['vo2_low'] / vo2_peak * 100, 1)
+                row['pct_vo2peak_high'] = round(row['vo2_high'] / vo2_peak * 100, 1)
+            tables[m][zk] = row
+        return tables
+
     @classmethod
-    def _build_speed_interpolator(cls, df_ex: pd.DataFrame):
-        """Build HR→Speed function from exercise data."""
-        hr_col = next((c for c in ['HR_bpm', 'hr_bpm', 'HR'] if c in df_ex.columns), None)
-        spd_col = next((c for c in ['Speed_kmh', 'speed_km_h', 'Speed_km_h', 'speed_kmh',
-                                     'speed', 'Speed'] if c in df_ex.columns), None)
-        if not hr_col or not spd_col:
+    def _build_speed_interpolator(cls, df_ex: pd.DataFrame, signals: SignalStore = None) -> Optional[HRCurve]:
+        """Build HR→Speed curve (median speed per 5-bpm HR band) from exercise data."""
+        sig = SignalStore.for_frame(df_ex, signals)
+        hr = sig.get('hr')
+        spd = sig.get('speed')
+        if hr is None or spd is None:
             return None
 
-        hr = df_ex[hr_col].values.astype(float)
-        spd = df_ex[spd_col].values.astype(float)
-
         # Remove NaN
         mask = np.isfinite(hr) & np.isfinite(spd) & (spd > 0)
         if mask.sum() < 10:
             return None
 
-        hr_clean = hr[mask]
-        spd_clean = spd[mask]
-
-        # Bin by HR (every 5 bpm) to get median speed per HR band
-        hr_min_v, hr_max_v = int(hr_clean.min()), int(hr_clean.max())
-        bins = np.arange(hr_min_v, hr_max_v + 6, 5)
-        hr_centers = []
-        spd_medians = []
-        for i in range(len(bins) - 1):
-            m = (hr_clean >= bins[i]) & (hr_clean < bins[i+1])
-            if m.sum() >= 3:
-                hr_centers.append((bins[i] + bins[i+1]) / 2)
-                spd_medians.append(np.median(spd_clean[m]))
-
-        if len(hr_centers) < 3:
-            return None
-
-        hr_arr = np.array(hr_centers)
-        spd_arr = np.array(spd_medians)
-
-        def interpolator(target_hr):
-            return float(np.interp(target_hr, hr_arr, spd_arr))
-
-        return interpolator
+        return HRCurve.from_bins(hr[mask], spd[mask], width=5, min_count=3, min_bins=3)
 
     @staticmethod
     def _interp_speed(target_hr, hr_rest, vt1_hr, vt2_hr, hr_max,
                       rest_speed, vt1_speed, vt2_speed, max_speed):
-        """Piecewise linear interpolation of speed from known anchor points."""
+        """Piecewise linear interpolation of speed from known anchor points (scalar or array target_hr)."""
         if max_speed is None:
             max_speed = vt2_speed * 1.15
 
         anchors_hr = [hr_rest, vt1_hr, vt2_hr, hr_max]
         anchors_spd = [rest_speed or 0, vt1_speed, vt2_speed, max_speed]
-        return float(np.interp(target_hr, anchors_hr, anchors_spd))
+        return HRCurve(anchors_hr, anchors_spd)(target_hr)
 
     @staticmethod
     def _interp_vo2(target_hr, hr_rest, vt1_hr, vt2_hr, hr_max,
                     rest_vo2, vt1_vo2, vt2_vo2, vo2_peak):
-        """Piecewise linear interpolation of VO2 from known anchor points."""
+        """Piecewise linear interpolation of VO2 from known anchor points (scalar or array target_hr)."""
         anchors_hr = [hr_rest, vt1_hr, vt2_hr, hr_max]
         anchors_vo2 = [rest_vo2 or 300, vt1_vo2, vt2_vo2, vo2_peak]
-        return float(np.interp(target_hr, anchors_hr, anchors_vo2))
+        return HRCurve(anchors_hr, anchors_vo2)(target_hr)
 
 
         # Uproszczony generator stref (do celów raportu)
@@ -12967,24 +13881,78 @@ def generate_observations(ct):
 # ═══════════════════════════════════════════════════════════
 # E21 v1.0 — Kinetic Phenotype Engine (inserted from e21_kinetic_phenotype.py)
 # ═══════════════════════════════════════════════════════════
-# See e21_kinetic_phenotype.py for full standalone version
+# See e21_kinetic_phenotype.py for full standalone version (keep both in sync)
 
 # Engine_E21_KineticPhenotype is defined above (inline)
 
 
 # ═══════════════════════════════════════════════════════════
-# ReportAdapter — imported from report.py (single source of truth)
+# ReportAdapter — report.py (single source of truth), importowany
+# leniwie w _analyze / engine_core.ReportAdapter (__getattr__ modułu)
 # ═══════════════════════════════════════════════════════════
-from report import ReportAdapter
+def __getattr__(name):
+    if name == "ReportAdapter":
+        from report import ReportAdapter
+        return ReportAdapter
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+from engine_scheduler import call_engine, resolve_deps, run_graph
+from vt_bootstrap import attach_point, bootstrap_vt
+from kinetics_fit import fit_off_kinetics, fit_on_kinetics, mc_tau_intervals
+from engine_profiler import EngineProfiler
+
+_log = get_logger("pipeline")
 
 
 class CPET_Orchestrator:
+    # Zależności E01–E19 (kolejność = kolejność wykonania sekwencyjnego).
+    # E00 i df_ex są gotowe przed grafem; "*" = wszystkie wcześniejsze
+    # (silniki czytające cały self.results).
+    ENGINE_DEPS = {
+        "E01": (),
+        "E02": ("E01",),          # + manual VT override (czyta E01)
+        "E03": ("E02",),
+        "E04": ("E02",),
+        "E05": ("E01", "E02"),
+        "E06": ("E01", "E02"),
+        "E07": ("E01", "E02"),
+        "E08": (),
+        "E09": ("E01", "E03", "E07"),
+        "E10": ("E01", "E02"),
+        "E11": ("E01", "E02"),
+        "E12": ("E01", "E02"),
+        "E13": ("E01", "E02"),
+        "E14": ("E01",),
+        "E15": ("*",),
+        "E18": ("E01", "E02", "E11"),
+        "E19": ("*",),
+    }
+
+    # Wejścia edytowane interaktywnie (reanalyze) → (silnik, etap): "engine" = czyta
+    # je silnik; "post" = tylko hook po silniku (wynik silnika z memo, hook ponownie).
+    # Zmiana unieważnia silnik i wszystko za nim w ENGINE_DEPS.
+    INCREMENTAL_INPUTS = {
+        "vt1_manual": ("E02", "post"),
+        "vt2_manual": ("E02", "post"),
+        "lactate_input": ("E11", "engine"),
+    }
+
     def __init__(self, config: AnalysisConfig):
         self.cfg = config
         self.raw = None
         self.processed = None
+        self.signals = None      # SignalStore(self.processed)
+        self.signals_ex = None   # SignalStore dla df_ex
         self.results = {}
+        self.file_meta = {}
         self._qc_log = {"engines_executed_ok": [], "engine_errors": []}
+        self._profiler = None    # EngineProfiler aktywnego przebiegu (cfg.profile_engines)
+        self._last_profile = None
+        # memo silników dla reanalyze: engine_id → (klucz wejść, wynik); czyszczone przy preprocessingu
+        self._memo = {}
+        self._out_keys = {}      # engine_id → klucz wyniku po hooku (wejście zależnych)
+        self._memo_cfg = None    # odcisk cfg z chwili preprocessingu
+        self._df_patched = None
 
     # ---------- helpers ----------
     def _num(self, x):
@@ -13012,23 +13980,199 @@ class CPET_Orchestrator:
         return default
 
     def _safe_run(self, engine_id: str, fn, *args, **kwargs):
-        import traceback as _tb
+        with self._profile(engine_id) as prof:
+            out, err = call_engine(engine_id, fn, args, kwargs)
+            if err is not None:
+                prof["status"] = "ERROR"
+        return self._record_engine(engine_id, out, err)
+
+    # ---------- profilowanie (cfg.profile_engines) ----------
+    def _profile(self, name: str, kind: str = "engine", memory: bool = None):
+        """Sekcja profilu (wall/CPU/pamięć) albo no-op, gdy profilowanie wyłączone."""
+        if self._profiler is None:
+            return contextlib.nullcontext({})
+        return self._profiler.section(name, kind, memory)
+
+    @contextlib.contextmanager
+    def _profiling(self, source: str = None):
+        """Otwiera profil na cały przebieg (zagnieżdżone wywołania: no-op). Yields profiler lub None."""
+        if not getattr(self.cfg, "profile_engines", False) or self._profiler is not None:
+            yield None
+            return
+        prof = EngineProfiler(memory=getattr(self.cfg, "profile_memory", True))
+        prof.start(source=source, protocol=getattr(self.cfg, "protocol_name", None),
+                   engine_workers=getattr(self.cfg, "engine_workers", 1),
+                   engine_executor=getattr(self.cfg, "engine_executor", "thread"))
+        self._profiler = prof
         try:
-            out = fn(*args, **kwargs)
-            if isinstance(out, dict):
-                out.setdefault("status", "OK")
-                self._qc_log["engines_executed_ok"].append(engine_id)
-                return out
-            return {"status": "OK", "value": out}
-        except Exception as e:
-            tb_str = _tb.format_exc()
-            err_msg = f"{type(e).__name__}: {e}"
+            yield prof
+        finally:
+            self._profiler = None
+            self._last_profile = prof.finish()
+
+    def _attach_profile(self, res, prof):
+        """Profil → res["_debug"]["profile"] (+ plik JSON, jeśli cfg.profile_json)."""
+        if prof is None:
+            return res
+        profile = self._last_profile
+        if isinstance(res, dict):
+            res.setdefault("_debug", {})["profile"] = profile
+        path = getattr(self.cfg, "profile_json", None)
+        if path:
+            try:
+                _log.info("⏱ Profil zapisany: %s", EngineProfiler.write_json(profile, path))
+            except OSError as e:
+                _log.warning("⚠️ Nie zapisano profilu: %s", e)
+        return res
+
+    def _record_engine(self, engine_id: str, out, err):
+        if err is not None:
             # Log for QC audit trail
-            self._qc_log.setdefault("engine_errors", []).append({
-                "engine": engine_id, "error": err_msg, "traceback": tb_str
-            })
-            print(f"  ⚠️ {engine_id} ERROR: {err_msg}")
-            return {"status": "ERROR", "reason": err_msg, "traceback": tb_str}
+            self._qc_log.setdefault("engine_errors", []).append(err)
+            get_logger(f"engine.{engine_id}").warning("  ⚠️ %s ERROR: %s", engine_id, err["error"],
+                                                      extra={"engine": engine_id})
+            return {"status": "ERROR", "reason": err["error"], "traceback": err["traceback"]}
+        if isinstance(out, dict):
+            out.setdefault("status", "OK")
+            self._qc_log["engines_executed_ok"].append(engine_id)
+            return out
+        return {"status": "OK", "value": out}
+
+    def _run_engines(self, calls: dict, post: dict = None):
+        """
+        Uruchamia silniki wg ENGINE_DEPS (kolejność deklaracji = kolejność sekwencyjna).
+        calls: engine_id → () -> (fn, args, kwargs); post: engine_id → hook po zapisie wyniku.
+        Wyniki, QC log i kolejność kluczy w self.results są takie same jak przy
+        wykonaniu sekwencyjnym, niezależnie od cfg.engine_workers.
+        """
+        post = post or {}
+        deps = {eid: self.ENGINE_DEPS.get(eid, ("*",)) for eid in calls}
+        n_ok = len(self._qc_log["engines_executed_ok"])
+        n_err = len(self._qc_log.setdefault("engine_errors", []))
+        workers = getattr(self.cfg, "engine_workers", 1) or 1
+        executor = getattr(self.cfg, "engine_executor", "thread") or "thread"
+        prof = self._profiler
+
+        # memo: silniki o niezmienionych wejściach → kopia poprzedniego wyniku
+        # (kolejność deklaracji; ich zależności też są z memo, więc są gotowe)
+        resolved = resolve_deps(deps)
+        todo = {}
+        for eid in calls:
+            ckey, self._out_keys[eid] = self._engine_keys(eid, resolved[eid])
+            hit = self._memo.get(eid)
+            if hit is not None and hit[0] == ckey:
+                with self._profile(eid) as rec:
+                    rec["status"] = "CACHED"
+                self.results[eid] = self._record_engine(eid, copy.deepcopy(hit[1]), None)
+                if eid in post:
+                    post[eid]()
+            else:
+                todo[eid] = ckey
+
+        def _build(eid):
+            fn, args, kwargs = calls[eid]()
+            # pula procesów: funkcja musi być picklable → bez pomiaru per silnik
+            if prof is not None and str(executor).lower() != "process":
+                fn = prof.wrap(eid, fn, memory=int(workers) <= 1)
+            return fn, args, kwargs
+
+        def _done(eid, out, err):
+            if err is None:
+                self._memo[eid] = (todo[eid], copy.deepcopy(out))
+            self.results[eid] = self._record_engine(eid, out, err)
+            if eid in post:
+                post[eid]()
+
+        if prof is not None and str(executor).lower() == "process" and int(workers) > 1:
+            prof.meta["engine_graph_note"] = "process executor: per-engine sections not recorded"
+        run_graph({eid: tuple(d for d in resolved[eid] if d in todo) for eid in todo},
+                  _build, _done, workers=workers, executor=executor)
+
+        # deterministyczny porządek (jak sekwencyjnie)
+        rank = {eid: i for i, eid in enumerate(calls)}
+        for eid in calls:
+            self.results[eid] = self.results.pop(eid)
+        ok = self._qc_log["engines_executed_ok"]
+        ok[n_ok:] = sorted(ok[n_ok:], key=lambda e: rank.get(e, -1))
+        errs = self._qc_log["engine_errors"]
+        errs[n_err:] = sorted(errs[n_err:], key=lambda e: rank.get(e.get("engine"), -1))
+
+    # ---------- memo silników (reanalyze) ----------
+    def _incremental_value(self, name: str) -> str:
+        if name == "lactate_input":
+            return repr(getattr(self, "_lactate_input", None))
+        return repr(getattr(self.cfg, name, None))
+
+    def _engine_keys(self, engine_id: str, deps) -> tuple:
+        """
+        (klucz wejść silnika, klucz wyniku po hooku) — z INCREMENTAL_INPUTS silnika
+        i kluczy wyników zależności. Reszta wejść (ramka, cfg) jest stała między
+        preprocessingami, a memo jest wtedy czyszczone.
+        """
+        own = {"engine": [], "post": []}
+        for name, (target, stage) in self.INCREMENTAL_INPUTS.items():
+            if target == engine_id:
+                own[stage].append((name, self._incremental_value(name)))
+        ckey = (engine_id, tuple(own["engine"]), tuple(self._out_keys.get(d) for d in deps))
+        return ckey, (ckey, tuple(own["post"]))
+
+    def _memo_run(self, engine_id: str, deps, fn, *args, **kwargs):
+        """_safe_run z memo: poprzedni wynik, gdy wyniki zależności (deps) się nie zmieniły."""
+        ckey, self._out_keys[engine_id] = self._engine_keys(engine_id, deps)
+        hit = self._memo.get(engine_id)
+        with self._profile(engine_id) as prof:
+            if hit is not None and hit[0] == ckey:
+                prof["status"] = "CACHED"
+                out, err = copy.deepcopy(hit[1]), None
+            else:
+                out, err = call_engine(engine_id, fn, args, kwargs)
+                if err is None:
+                    self._memo[engine_id] = (ckey, copy.deepcopy(out))
+                else:
+                    prof["status"] = "ERROR"
+        return self._record_engine(engine_id, out, err)
+
+    def _inner_pool_cfg(self):
+        """
+        cfg dla silnika uruchamianego w puli _run_engines (engine_workers > 1):
+        kinetics_mc_workers = 0 (os.cpu_count()) → 1, żeby pula E14 nie mnożyła
+        procesów przez pulę silników. Jawnie ustawiona wartość > 0 zostaje.
+        """
+        if (getattr(self.cfg, "engine_workers", 1) or 1) > 1 and not getattr(self.cfg, "kinetics_mc_workers", 0):
+            return replace(self.cfg, kinetics_mc_workers=1)
+        return self.cfg
+
+    def _cfg_fingerprint(self) -> str:
+        return repr(sorted((k, v) for k, v in vars(self.cfg).items() if k not in self.INCREMENTAL_INPUTS))
+
+    def reanalyze(self, **changes) -> Dict[str, Any]:
+        """
+        Ponowna analiza po edycji wejść z INCREMENTAL_INPUTS (vt1_manual, vt2_manual,
+        lactate_input) — bez importu/preprocessingu; silniki o niezmienionych wejściach
+        z memo poprzedniego przebiegu, reszta (zależne wg ENGINE_DEPS, feedback,
+        eksport, raporty) liczona ponownie. Wynik = process_file z tymi wejściami.
+
+        Zmiana innych pól cfg (np. orch.cfg.x = ...) → pełna analiza wczytanej ramki.
+        """
+        unknown = sorted(set(changes) - set(self.INCREMENTAL_INPUTS))
+        if unknown:
+            raise ValueError(f"reanalyze: not incremental inputs {unknown} (use process_file/process_frame)")
+        if self.raw is None:
+            raise RuntimeError("reanalyze: no loaded test, run process_file()/process_frame() first")
+        for name, value in changes.items():
+            if name == "lactate_input":
+                self._lactate_input = value
+            else:
+                setattr(self.cfg, name, value)
+
+        with self._profiling(source="reanalyze") as prof:
+            self._qc_log = {"engines_executed_ok": [], "engine_errors": []}
+            if self._df_patched is None or self._cfg_fingerprint() != self._memo_cfg:
+                res = self._process_frame(self.raw, self.file_meta, canonical=True)
+            else:
+                _log.info("\n♻️ REANALYZE: preprocessing i silniki bez zmian wejść z memo")
+                res = self._analyze(self._df_patched)
+        return self._attach_profile(res, prof)
 
     # ---------- manual VT override ----------
     def _apply_manual_vt_override(self, df_ex):
@@ -13080,11 +14224,12 @@ class CPET_Orchestrator:
             if "flags" not in e02: e02["flags"] = []
             e02["flags"].append(f"MANUAL_OVERRIDE_{vt.upper()}")
             m, s = int(vt_sec // 60), int(vt_sec % 60)
-            print(f"  \u2705 {vt.upper()} MANUAL: t={m}:{s:02d} | HR={hr} | VO2={vo2} | Speed={e02[f'{vt}_speed_kmh']}")
+            _log.info("  \u2705 %s MANUAL: t=%d:%02d | HR=%s | VO2=%s | Speed=%s",
+                      vt.upper(), m, s, hr, vo2, e02[f"{vt}_speed_kmh"], extra={"engine": "E02"})
         if vt1_t and vt2_t: e02["confidence"] = "MANUAL"
         e02["status"] = "OK"
         self.results["E02"] = e02
-        print("  \u26A1 Progi nadpisane (manual > auto)")
+        _log.info("  \u26A1 Progi nadpisane (manual > auto)", extra={"engine": "E02"})
 
     # ---------- new outputs ----------
     def build_outputs(self) -> dict:
@@ -13548,9 +14693,8 @@ class CPET_Orchestrator:
                         f"{', '.join(confirmations)}."
                     )
                     
-                    print(f"  🔄 FEEDBACK: VT2 adjusted "
-                          f"{fb_log['vt2_original']['time_sec']:.0f}s → {new_t:.0f}s "
-                          f"({n_sources} sources)")
+                    _log.info("  🔄 FEEDBACK: VT2 adjusted %.0fs → %.0fs (%s sources)",
+                              fb_log["vt2_original"]["time_sec"], new_t, n_sources)
                     
                 except Exception as ex:
                     fb_log["error"] = str(ex)
@@ -13665,7 +14809,7 @@ class CPET_Orchestrator:
                                 f"VT2 via E18: {orig_vt2:.0f}→{new_t:.0f}s "
                                 f"(Δ{new_t-orig_vt2:+.0f}s). LT2={lt2_time:.0f}s+{cstr}")
                             
-                            print(f"  🔄 FEEDBACK(E18): VT2 {orig_vt2:.0f}→{new_t:.0f}s ({tot} src)")
+                            _log.info("  🔄 FEEDBACK(E18): VT2 %.0f→%.0fs (%s src)", orig_vt2, new_t, tot)
                         except Exception as ex:
                             fb_log.setdefault("errors", []).append(str(ex))
 
@@ -13892,7 +15036,7 @@ class CPET_Orchestrator:
         self.results["_performance_context"] = ctx
         
         if ctx.get("interpretation"):
-            print(f"  📊 CONTEXT: {ctx['interpretation']}")
+            _log.info("  📊 CONTEXT: %s", ctx["interpretation"])
 
 
     @staticmethod
@@ -13954,32 +15098,111 @@ class CPET_Orchestrator:
                     vc_v = sf(str(vals[1]).replace('L','').replace('l','').strip())
                     if vc_v and vc_v > 0: result['vc_l'] = vc_v
 
-            if result:
-                print(f"  \U0001f4cb Spirometria z XML: {', '.join(f'{k}={v}' for k,v in sorted(result.items()))}")
+            if result and _log.isEnabledFor(logging.INFO):
+                _log.info("  \U0001f4cb Spirometria z XML: %s",
+                          ", ".join(f"{k}={v}" for k, v in sorted(result.items())), extra={"spirometry": result})
         except:
             pass
         return result
 
+    def _frame_cache(self):
+        """FrameCache from cfg.cache_dir / CPET_CACHE_DIR, or None when disabled."""
+        import os
+        cache_dir = getattr(self.cfg, "cache_dir", None) or os.environ.get("CPET_CACHE_DIR")
+        if not cache_dir:
+            return None
+        try:
+            from frame_cache import FrameCache
+        except ImportError as e:
+            _log.warning("  ⚠️ Cache ramek wyłączony mimo cache_dir=%s: %s", cache_dir, e)
+            return None
+        cache = FrameCache(cache_dir, max_mb=getattr(self.cfg, "cache_max_mb", 512.0))
+        if not cache.enabled:
+            _log.warning("  ⚠️ Cache ramek wyłączony mimo cache_dir=%s: brak pyarrow (pip install pyarrow)",
+                         cache_dir)
+            return None
+        return cache
+
+    def _apply_spirometry(self, spiro: dict):
+        for _sk, _sv in (spiro or {}).items():
+            if not getattr(self.cfg, _sk, None):  # don't overwrite manual values
+                setattr(self.cfg, _sk, _sv)
+
     def process_file(self, filename: str) -> Dict[str, Any]:
-        print(f"\n🚀 START PIPELINE: Analiza pliku '{filename}'")
-        self.results = {}
+        with self._profiling(source=str(filename)) as prof:
+            res = self._process_file(filename)
+        return self._attach_profile(res, prof)
+
+    def _process_file(self, filename: str) -> Dict[str, Any]:
+        _log.info("\n🚀 START PIPELINE: Analiza pliku '%s'", filename, extra={"source": str(filename)})
+
+        # ── Cache of canonical frames (keyed by file bytes) ──
+        cache = self._frame_cache()
+        cache_key = None
+        if cache is not None:
+            try:
+                cache_key = cache.key_for_file(filename)
+            except OSError:
+                cache_key = None
+            hit = cache.get(cache_key) if cache_key else None
+            if hit is not None:
+                raw, meta = hit
+                self._apply_spirometry(meta.pop("_spirometry", None))
+                _log.info("⚡ Cache hit: %s", cache_key[:12])
+                return self.process_frame(raw, meta, canonical=True)
 
         # ── Auto-extract spirometry from XML if available ──
         _is_xml = str(filename).lower().endswith('.xml')
+        _spiro = {}
         if _is_xml:
             _spiro = self.extract_spirometry_from_xml(filename)
-            for _sk, _sv in _spiro.items():
-                if not getattr(self.cfg, _sk, None):  # don't overwrite manual values
-                    setattr(self.cfg, _sk, _sv)
+            self._apply_spirometry(_spiro)
 
-        # 0-3 preprocessing
+        # 0 import
+        meta = None
         try:
-            try:
-                df = pd.read_csv(filename)
-            except Exception:
-                df = pd.read_csv(filename, sep=';')
+            with self._profile("import", "preprocess"):
+                if _is_xml:
+                    from cortex_xml_parser import parse_cortex_xml_frame
+                    df, meta, _summary = parse_cortex_xml_frame(filename, streaming=True)
+                else:
+                    try:
+                        df = pd.read_csv(filename)
+                    except Exception:
+                        df = pd.read_csv(filename, sep=';')
+                if cache_key:
+                    df = DataTools.canonicalize(df)
+                    cache.put(cache_key, df, dict(meta or {}, _spirometry=_spiro))
+        except Exception as e:
+            _log.error("❌ ERROR (Import/Preproc): %s", e)
+            return {"fatal_error": str(e)}
+
+        return self.process_frame(df, meta, canonical=bool(cache_key))
+
+    def process_frame(self, df: pd.DataFrame, meta: dict = None, canonical: bool = False) -> Dict[str, Any]:
+        """
+        Run the pipeline on an already loaded BxB frame (no CSV round-trip).
+
+        df        — raw export frame, e.g. from cortex_xml_parser.parse_cortex_xml_frame
+        meta      — optional file header metadata; kept in self.file_meta and
+                    returned as "file_meta" in the report dict.
+        canonical — df is already DataTools.canonicalize output (e.g. FrameCache hit)
 
-            self.raw = DataTools.canonicalize(df)
+        cfg.profile_engines → per-engine/step timing in the report's "_debug" key.
+        """
+        with self._profiling(source=None) as prof:
+            res = self._process_frame(df, meta, canonical)
+        return self._attach_profile(res, prof)
+
+    def _process_frame(self, df: pd.DataFrame, meta: dict = None, canonical: bool = False) -> Dict[str, Any]:
+        self.results = {}
+        self.file_meta = dict(meta) if meta else {}
+        self._memo, self._out_keys, self._df_patched = {}, {}, None
+
+        # 0-3 preprocessing
+        try:
+            with self._profile("canonicalize", "preprocess"):
+                self.raw = df if canonical else DataTools.canonicalize(df)
             
             # ── Protocol resolution: AUTO → detect from data ──────────
             resolved_protocol = self.cfg.protocol_name
@@ -13990,17 +15213,17 @@ class CPET_Orchestrator:
                 _auto_details = details
                 if detected and conf >= 0.60:
                     resolved_protocol = detected
-                    print(f"✅ Auto-detected protocol: {detected} (conf={conf:.2f}, {details.get('source','')})")
+                    _log.info("✅ Auto-detected protocol: %s (conf=%.2f, %s)", detected, conf, details.get("source", ""))
                 else:
                     resolved_protocol = 'RUN_RAMP'  # safe default
-                    print(f"⚠ Auto-detection failed (conf={conf:.2f}), using default: RUN_RAMP")
+                    _log.warning("⚠ Auto-detection failed (conf=%.2f), using default: RUN_RAMP", conf)
             
             # Try marker-based segments first (most accurate), then template
             from engine_core import build_protocol_from_markers
             marker_segments = build_protocol_from_markers(self.raw)
             if marker_segments and len(marker_segments) >= 4:
                 segments = compile_protocol_for_apply(marker_segments)
-                print(f"✅ Using marker-based protocol ({len(marker_segments)} segments from file)")
+                _log.info("✅ Using marker-based protocol (%d segments from file)", len(marker_segments))
                 self.cfg.protocol_name = resolved_protocol  # keep name for modality detection
                 _auto_details['segments_source'] = 'markers'
             else:
@@ -14008,27 +15231,48 @@ class CPET_Orchestrator:
                 self.cfg.protocol_name = resolved_protocol
                 if segments:
                     _auto_details['segments_source'] = 'template'
-                    print(f"ℹ Using template protocol: {resolved_protocol} ({len(segments)} segments)")
+                    _log.info("ℹ Using template protocol: %s (%d segments)", resolved_protocol, len(segments))
             
-            df_patched = DataTools.apply_protocol(self.raw, segments) if segments else self.raw
-            self.processed = DataTools.smooth(df_patched, self.cfg)
+            with self._profile("apply_protocol", "preprocess"):
+                df_patched = DataTools.apply_protocol(self.raw, segments) if segments else self.raw
+            with self._profile("smooth", "preprocess"):
+                self.processed = DataTools.smooth(df_patched, self.cfg)
+            # jeden magazyn sygnałów na przebieg (kolumny liczbowe/pochodne liczone raz)
+            self.signals = SignalStore(self.processed)
         except Exception as e:
-            print(f"❌ ERROR (Import/Preproc): {e}")
+            _log.error("❌ ERROR (Import/Preproc): %s", e)
             return {"fatal_error": str(e)}
 
+        self._df_patched = df_patched
+        self._memo_cfg = self._cfg_fingerprint()
+        return self._analyze(df_patched)
+
+    def _analyze(self, df_patched: pd.DataFrame) -> Dict[str, Any]:
+        """E00 → silniki → feedback → eksport → raporty na self.processed (po preprocessingu)."""
+        self.results = {}
+
         # E00
-        self.results["E00"] = self._safe_run("E00", Engine_E00_StopDetection.run, self.processed, self.cfg)
+        self.results["E00"] = self._memo_run("E00", (), Engine_E00_StopDetection.run, self.processed, self.cfg)
         if self.results["E00"].get("status") == "ERROR":
             return {"fatal_error": self.results["E00"].get("reason", "E00 error"), "E00": self.results["E00"]}
 
         t_stop = self.results["E00"]["t_stop"]
-        df_ex = self.processed[self.processed["Time_sec"] <= t_stop].copy()
+        # CoW: płytkie kopie — silniki zapisujące do ramki kopiują tylko swoje kolumny.
+        # Ramka jest posortowana po Time_sec, więc zwykle maska to prefiks → widok iloc.
+        _ex_mask = self.processed["Time_sec"] <= t_stop
+        _n_ex = int(_ex_mask.sum())
+        if _ex_mask.iloc[:_n_ex].all():
+            df_ex = cow_copy(self.processed.iloc[:_n_ex])
+            self.signals_ex = self.signals.prefix(df_ex)
+        else:
+            df_ex = cow_copy(self.processed[_ex_mask])
+            self.signals_ex = SignalStore(df_ex)
         self.results["_df_ex"] = df_ex
         self.results["_df_full"] = self.processed  # full test including recovery
-        df_full = self.processed.copy()
+        df_full = cow_copy(self.processed)
 
-        # Engines
-        self.results["E01"] = self._safe_run("E01", Engine_E01_GasExchangeQC.run, df_ex)
+        # Engines E01–E19: graf zależności (ENGINE_DEPS), argumenty budowane dopiero
+        # gdy silnik jest gotowy; cfg.engine_workers > 1 → pula wątków/procesów.
         # E02 v4: pass file_metadata for fallback thresholds
         _file_meta = {}
         for _mk in ["VT1_HR", "VT2_HR", "VT1_VO2_ml_min", "VT2_VO2_ml_min"]:
@@ -14037,9 +15281,6 @@ class CPET_Orchestrator:
                 if len(_v) > 0:
                     try: _file_meta[_mk] = float(_v.iloc[0])
                     except: pass
-        self.results["E02"] = self._safe_run("E02", Engine_E02_Thresholds_v4.run, df_ex, self.results["E00"], _file_meta)
-        self._apply_manual_vt_override(df_ex)
-        self.results["E03"] = self._safe_run("E03", Engine_E03_VentSlope.run, df_ex, self.results.get("E02", {}), getattr(self.cfg, "age_y", None), getattr(self.cfg, "height_cm", None), getattr(self.cfg, "sex", "male"))
         # E04 v2: OUES with submaximal variants, normalization, predicted values
         _e04_meta = {}
         for _k, _attrs in [("weight_kg", ["body_mass_kg", "weight_kg"]),
@@ -14051,13 +15292,6 @@ class CPET_Orchestrator:
                 if _v is not None:
                     _e04_meta[_k] = _v
                     break
-        self.results["E04"] = self._safe_run("E04", Engine_E04_OUES_v2.run,
-            df_ex, self.results.get("E00", {}), self.results.get("E02", {}), _e04_meta)
-        self.results["E05"] = self._safe_run("E05", Engine_E05_O2Pulse.run,
-            df_ex, self.results.get("E02", {}),
-            getattr(self.cfg, "age_y", None),
-            getattr(self.cfg, "sex", "male"),
-            self.results.get("E01", {}).get("hr_peak"))
         # E06 needs TEST modality (treadmill→run, bike_erg→bike), not sport
         _prot_upper = getattr(self.cfg, "protocol_name", "").upper()
         if any(k in _prot_upper for k in ('RUN_', 'BRUCE', 'BIEZNIA', 'TREADMILL', 'HYROX')):
@@ -14068,49 +15302,64 @@ class CPET_Orchestrator:
             _e06_mod = 'row'
         else:
             _e06_mod = getattr(self.cfg, "modality", "run")  # fallback to sport
-        _e06_kw = dict(df_ex=df_ex, modality=_e06_mod, e02=self.results.get("E02",{}), e01=self.results.get("E01",{}), weight_kg=getattr(self.cfg,"body_mass_kg",None))
-        self.results["E06"] = self._safe_run("E06", Engine_E06_Gain_v2.run, **_e06_kw)
-        self.results["E07"] = self._safe_run("E07", Engine_E07_BreathingPattern.run, df_ex, self.results.get("E02"), self.results.get("E01"), self.cfg)
-        self.results["E08"] = self._safe_run("E08", Engine_E08_CardioHRR.run, df_full, t_stop)
-        self.results["E09"] = self._safe_run("E09", Engine_E09_VentLimitation.run, df_ex=df_ex, cfg=self.cfg, e01=self.results.get("E01",{}), e03=self.results.get("E03",{}), e07=self.results.get("E07",{}))
-        # E10 v2: full substrate oxidation profile
-        _e10_kw = dict(
-            df_ex=df_ex,
-            e02=self.results.get("E02", {}),
-            e01=self.results.get("E01", {}),
-            sex=getattr(self.cfg, "sex", "male"),
-            weight_kg=getattr(self.cfg, "body_mass_kg", None),
-        )
-        self.results["E10"] = self._safe_run("E10", Engine_E10_Substrate_v2.run, **_e10_kw)
-        self.results["E11"] = self._safe_run("E11", Engine_E11_Lactate.run, self.processed, getattr(self, "_lactate_input", None), self.results.get("E00"), self.results.get("E01"), self.results.get("E02"), self.cfg)
-        self.results["E12"] = self._safe_run("E12", Engine_E12_NIRS.run, self.processed, self.results.get("E02"), self.results.get("E01"), self.results.get("E00"), self.cfg)
-        self.results["E13"] = self._safe_run("E13", Engine_E13_Drift.run, self.processed, self.results.get("E00"), self.results.get("E01"), self.results.get("E02"), self.cfg)
-        self.results["E14"] = self._safe_run("E14",
-            Engine_E14_Kinetics.run,
-            self.results,
-            {"_df_processed": self.processed, "_acfg": self.cfg})
-        self.results["E15"] = self._safe_run("E15", Engine_E15_Normalization.run, self.results, self.cfg.body_mass_kg, getattr(self.cfg, "age_y", None), getattr(self.cfg, "sex", "male"), getattr(self.cfg, "modality", "run"), getattr(self.cfg, "height_cm", None))
-
-        # E18: VT↔LT Cross-Validation (requires E02 + E11)
-        self.results["E18"] = self._safe_run("E18",
-            Engine_E18_VT_LT_CrossValidation.run,
-            self.results.get("E02", {}),
-            self.results.get("E11", {}),
-            self.results.get("E01", {}),
-            df_ex)
-
-        # E19: Test Validity + Physiological Concordance
-        self.results["E19"] = self._safe_run("E19",
-            Engine_E19_Concordance.run,
-            self.results,
-            self.cfg)
+
+        R = self.results
+        _calls = {
+            "E01": lambda: (Engine_E01_GasExchangeQC.run, (df_ex,), {}),
+            "E02": lambda: (Engine_E02_Thresholds_v4.run, (df_ex, R["E00"], _file_meta),
+                            dict(smooth_mode=getattr(self.cfg, "smooth_mode", None),
+                                 signals=self.signals_ex)),
+            "E03": lambda: (Engine_E03_VentSlope.run, (df_ex, R.get("E02", {}), getattr(self.cfg, "age_y", None), getattr(self.cfg, "height_cm", None), getattr(self.cfg, "sex", "male")), {}),
+            "E04": lambda: (Engine_E04_OUES_v2.run, (df_ex, R.get("E00", {}), R.get("E02", {}), _e04_meta), {}),
+            "E05": lambda: (Engine_E05_O2Pulse.run, (df_ex, R.get("E02", {}),
+                            getattr(self.cfg, "age_y", None),
+                            getattr(self.cfg, "sex", "male"),
+                            R.get("E01", {}).get("hr_peak")), {}),
+            "E06": lambda: (Engine_E06_Gain_v2.run, (), dict(df_ex=df_ex, modality=_e06_mod, e02=R.get("E02",{}), e01=R.get("E01",{}), weight_kg=getattr(self.cfg,"body_mass_kg",None))),
+            "E07": lambda: (Engine_E07_BreathingPattern.run, (df_ex, R.get("E02"), R.get("E01"), self.cfg), {}),
+            "E08": lambda: (Engine_E08_CardioHRR.run, (df_full, t_stop), {}),
+            "E09": lambda: (Engine_E09_VentLimitation.run, (), dict(df_ex=df_ex, cfg=self.cfg, e01=R.get("E01",{}), e03=R.get("E03",{}), e07=R.get("E07",{}))),
+            # E10 v2: full substrate oxidation profile
+            "E10": lambda: (Engine_E10_Substrate_v2.run, (), dict(
+                df_ex=df_ex,
+                e02=R.get("E02", {}),
+                e01=R.get("E01", {}),
+                sex=getattr(self.cfg, "sex", "male"),
+                weight_kg=getattr(self.cfg, "body_mass_kg", None),
+                signals=self.signals_ex,
+            )),
+            "E11": lambda: (Engine_E11_Lactate.run, (self.processed, getattr(self, "_lactate_input", None), R.get("E00"), R.get("E01"), R.get("E02"), self.cfg), {}),
+            "E12": lambda: (Engine_E12_NIRS.run, (self.processed, R.get("E02"), R.get("E01"), R.get("E00"), self.cfg), dict(signals=self.signals)),
+            "E13": lambda: (Engine_E13_Drift.run, (self.processed, R.get("E00"), R.get("E01"), R.get("E02"), self.cfg), {}),
+            "E14": lambda: (Engine_E14_Kinetics.run, (R, {"_df_processed": self.processed, "_acfg": self._inner_pool_cfg()}), {}),
+            "E15": lambda: (Engine_E15_Normalization.run, (R, self.cfg.body_mass_kg, getattr(self.cfg, "age_y", None), getattr(self.cfg, "sex", "male"), getattr(self.cfg, "modality", "run"), getattr(self.cfg, "height_cm", None)), {}),
+            # E18: VT↔LT Cross-Validation (requires E02 + E11)
+            "E18": lambda: (Engine_E18_VT_LT_CrossValidation.run, (R.get("E02", {}), R.get("E11", {}), R.get("E01", {}), df_ex), {}),
+            # E19: Test Validity + Physiological Concordance
+            "E19": lambda: (Engine_E19_Concordance.run, (R, self.cfg), {}),
+        }
+        self._run_engines(_calls, post={"E02": lambda: self._apply_manual_vt_override(df_ex)})
 
         # ── FEEDBACK LOOP: post-validation threshold adjustment ──
         try:
-            self._feedback_loop(df_ex)
-            self._performance_context()
+            with self._profile("feedback_loop", "post"):
+                self._feedback_loop(df_ex)
+                self._performance_context()
         except Exception as _fb_err:
             self.results["_feedback"] = {"executed": False, "error": str(_fb_err)}
+        # feedback może przesunąć progi E02 na podstawie wszystkich silników
+        self._out_keys["_feedback"] = ("_feedback", tuple(self._out_keys.get(e) for e in ["E00", *self.ENGINE_DEPS]))
+
+        # Opcjonalnie: percentylowe CI dla VT1/VT2 (block bootstrap na surowej ramce, pula procesów).
+        # Replikacje = auto-detekcja E02 → memo wg klucza WEJŚĆ E02 (sprzed hooka vt*_manual),
+        # więc edycja VT nie liczy bootstrapu od nowa; "point" = finalne E02 po feedback loop.
+        if int(getattr(self.cfg, "vt_bootstrap_n", 0) or 0) > 0 and self.results.get("E02", {}).get("status") != "ERROR":
+            self._out_keys["E02_AUTO"] = (self._out_keys.get("E02") or (None,))[0]
+            self.results["E02"]["bootstrap"] = attach_point(self._memo_run(
+                "E02_BOOTSTRAP", ("E00", "E02_AUTO"), bootstrap_vt, df_patched, self.cfg, self.results["E00"],
+                n_boot=self.cfg.vt_bootstrap_n, block_sec=self.cfg.vt_bootstrap_block_sec,
+                workers=self.cfg.vt_bootstrap_workers, seed=self.cfg.vt_bootstrap_seed,
+                ci_level=self.cfg.vt_bootstrap_ci), self.results["E02"])
 
         vt1 = self.results.get("E02", {}).get("vt1_hr")
         vt2 = self.results.get("E02", {}).get("vt2_hr")
@@ -14118,7 +15367,7 @@ class CPET_Orchestrator:
         if vt1 is None or vt2 is None or hr_max is None or not (vt1 < vt2 <= hr_max):
             self.results["E16"] = {"status": "LIMITED", "reason": f"vt1={vt1}, vt2={vt2}, hr_max={hr_max}"}
         else:
-            self.results["E17"] = self._safe_run("E17", Engine_E17_GasExchange.run, self.processed, self.results.get("E00"), self.results.get("E01"), self.results.get("E02"), self.cfg)
+            self.results["E17"] = self._memo_run("E17", ("_feedback",), Engine_E17_GasExchange.run, self.processed, self.results.get("E00"), self.results.get("E01"), self.results.get("E02"), self.cfg)
             # E16 v2: full zone model with speed/VO2 interpolation
             _e02 = self.results.get("E02", {})
             _e16_kw = dict(
@@ -14131,35 +15380,47 @@ class CPET_Orchestrator:
                 vt2_vo2=_e02.get('vt2_vo2_ml'),
                 vo2_peak=self.results.get("E01", {}).get("vo2_peak_ml_min"),
                 df_ex=df_ex,
+                signals=self.signals_ex,
             )
-            self.results["E16"] = self._safe_run("E16", Engine_E16_Zones_v2.run, **_e16_kw)
+            self.results["E16"] = self._memo_run("E16", ("_feedback",), Engine_E16_Zones_v2.run, **_e16_kw)
 
         # final export
-        outputs = self.build_outputs()
-        trainer_canon_flat = self.build_trainer_canon_flat(outputs)
+        with self._profile("build_outputs", "export"):
+            outputs = self.build_outputs()
+            trainer_canon_flat = self.build_trainer_canon_flat(outputs)
 
         # E21: Kinetic Phenotype
         try:
-            self.results["E21"] = Engine_E21_KineticPhenotype.run(
-                self.results, {"_df_processed": self.processed, "_acfg": self.cfg})
+            with self._profile("E21"):
+                self.results["E21"] = Engine_E21_KineticPhenotype.run(
+                    self.results, {"_df_processed": self.processed, "_acfg": self.cfg})
         except Exception as _e21_err:
             self.results["E21"] = {"status": "ERROR", "reason": str(_e21_err)}
 
         # E22: Cross-Engine Correlation Analysis
         try:
             from e22_cross_correlation import Engine_E22_CrossCorrelation
-            self.results["E22"] = Engine_E22_CrossCorrelation.run(
-                self.results, {"_df_processed": self.processed, "_acfg": self.cfg})
+            with self._profile("E22"):
+                self.results["E22"] = Engine_E22_CrossCorrelation.run(
+                    self.results, {"_df_processed": self.processed, "_acfg": self.cfg})
         except Exception as _e22_err:
             self.results["E22"] = {"status": "ERROR", "reason": str(_e22_err)}
 
-        # Raport tekstowy (T12 template)
+        # Raport tekstowy (T12 template); błędy renderowania → report_errors (placeholdery zostają dla UI)
+        report_errors = {}
         try:
-            canon_table = ReportAdapter.build_canon_table(self.processed, self.results, self.cfg)
-            text_report = ReportAdapter.render_text_report(canon_table)
-            html_report = ReportAdapter.render_html_report(canon_table)
-            html_report_lite = ReportAdapter.render_lite_html_report(canon_table)
+            from report import ReportAdapter
+            with self._profile("build_canon_table", "report"):
+                canon_table = ReportAdapter.build_canon_table(self.processed, self.results, self.cfg)
+            with self._profile("render_text_report", "report"):
+                text_report = ReportAdapter.render_text_report(canon_table)
+            with self._profile("render_html_report", "report"):
+                html_report = ReportAdapter.render_html_report(canon_table)
+            with self._profile("render_lite_html_report", "report"):
+                html_report_lite = ReportAdapter.render_lite_html_report(canon_table)
         except Exception as e:
+            report_errors.update(dict.fromkeys(("text", "html", "lite"), f"{type(e).__name__}: {e}"))
+            _log.warning("  ⚠️ Raport niedostępny: %s: %s", type(e).__name__, e)
             canon_table = {}
             text_report = f"[RAPORT NIEDOSTĘPNY: {e}]"
             html_report = f"<html><body><h1>Raport niedostępny</h1><p>{e}</p></body></html>"
@@ -14174,12 +15435,26 @@ class CPET_Orchestrator:
                 from report import render_kinetics_report, generate_kinetics_charts, inject_kinetics_charts
                 _kin_ct = dict(canon_table) if canon_table else {}
                 _kin_ct['sport'] = getattr(self.cfg, 'sport', '') or getattr(self.cfg, 'modality', 'run') or 'run'
-                html_report_kinetics = render_kinetics_report(self.results, _kin_ct, self.processed)
-                _kin_charts = generate_kinetics_charts(self.processed, self.results)
+                with self._profile("render_kinetics_report", "report"):
+                    html_report_kinetics = render_kinetics_report(self.results, _kin_ct, self.processed)
+                with self._profile("kinetics_charts", "report") as _rec:
+                    # wykresy czytają tylko E14, E01 i VO2 progów z E02 → memo dla reanalyze
+                    _e02 = self.results.get("E02", {})
+                    _ck = (self._out_keys.get("E14"), self._out_keys.get("E01"),
+                           repr((_e02.get("vt1_vo2_abs"), _e02.get("vt2_vo2_abs"))))
+                    _hit = self._memo.get("kinetics_charts")
+                    if _hit is not None and _hit[0] == _ck:
+                        _rec["status"] = "CACHED"
+                        _kin_charts = _hit[1]
+                    else:
+                        _kin_charts = generate_kinetics_charts(self.processed, self.results)
+                        self._memo["kinetics_charts"] = (_ck, _kin_charts)
                 if _kin_charts:
                     html_report_kinetics = inject_kinetics_charts(html_report_kinetics, _kin_charts)
         except Exception as _kin_e:
             import traceback as _ktb
+            report_errors["kinetics"] = f"{type(_kin_e).__name__}: {_kin_e}"
+            _log.warning("  ⚠️ Raport kinetyki niedostępny: %s", report_errors["kinetics"])
             html_report_kinetics = f"""<!DOCTYPE html><html><head><meta charset="utf-8">
 <style>body{{font-family:monospace;padding:20px;background:#1e1e1e;color:#f0f0f0;}}
 pre{{background:#2d2d2d;padding:16px;border-radius:8px;white-space:pre-wrap;}}</style></head><body>
@@ -14192,6 +15467,8 @@ pre{{background:#2d2d2d;padding:16px;border-radius:8px;white-space:pre-wrap;}}</
             "canon_table": canon_table,
             "text_report": text_report, "html_report": html_report, "html_report_lite": html_report_lite,
             "html_report_kinetics": html_report_kinetics,
+            "report_errors": report_errors,
+            "file_meta": self.file_meta,
             "raw_results": self.results
         }
         return self._last_report
@@ -14199,11 +15476,11 @@ pre{{background:#2d2d2d;padding:16px;border-radius:8px;white-space:pre-wrap;}}</
     def save_html_report(self, path: str = None):
         """Save HTML report to file. If path is None, auto-generate from athlete name."""
         if not hasattr(self, '_last_report') or not self._last_report:
-            print("⚠️ Najpierw uruchom process_file().")
+            _log.warning("⚠️ Najpierw uruchom process_file().")
             return None
         html = self._last_report.get('html_report', '')
-        if not html or html.startswith('[RAPORT'):
-            print("⚠️ Raport HTML niedostępny.")
+        if not html or html.startswith('[RAPORT') or (self._last_report.get('report_errors') or {}).get('html'):
+            _log.warning("⚠️ Raport HTML niedostępny.")
             return None
         if path is None:
             name = getattr(self.cfg, 'athlete_name', 'athlete').replace(' ', '_')
@@ -14231,7 +15508,7 @@ pre{{background:#2d2d2d;padding:16px;border-radius:8px;white-space:pre-wrap;}}</
 </html>"""
         with open(path, 'w', encoding='utf-8') as f:
             f.write(full_html)
-        print(f"✅ Raport HTML zapisany: {path}")
+        _log.info("✅ Raport HTML zapisany: %s", path)
         return path
 
 
@@ -14391,6 +15668,15 @@ class Engine_E21_KineticPhenotype:
         if tau_heavy is not None:
             kp['tau_heavy'] = tau_heavy
             kp['tau_heavy_class'] = cls._classify(tau_heavy, cls.TAU_BANDS['heavy'])
+        # τ CI from E14 Monte Carlo refits (cfg.kinetics_mc_n > 0): every band the CI touches
+        for dom in ('moderate', 'heavy'):
+            ci = e14_sum.get(f'tau_{dom}_ci')
+            if kp.get(f'tau_{dom}') is None or not ci:
+                continue
+            kp[f'tau_{dom}_ci'] = ci
+            kp[f'tau_{dom}_class_range'] = cls._ci_classes(ci, cls.TAU_BANDS[dom])
+            if len(kp[f'tau_{dom}_class_range']) > 1:
+                out['flags'].append(f"TAU_{dom.upper()}_BAND_UNCERTAIN")
         if tau_severe is not None:
             kp['tau_severe'] = tau_severe
         if tau_mod and tau_heavy and tau_mod > 0:
@@ -14486,6 +15772,15 @@ class Engine_E21_KineticPhenotype:
         # 5. PHENOTYPE ASSIGNMENT
         # ═══════════════════════════════════════
         phenotype, confidence = cls._assign_phenotype(kp, lim, ftp)
+        # τ CI straddling bands: re-score with every class inside the CI;
+        # confidence scaled by the share of variants that keep the phenotype
+        variants = cls._phenotype_ci_variants(kp, lim, ftp)
+        if variants:
+            agree = sum(1 for p in variants if p == phenotype) / len(variants)
+            out['phenotype_ci'] = {'variants': sorted(set(variants)), 'agreement': round(agree, 2)}
+            if agree < 1:
+                confidence = round(confidence * (0.5 + 0.5 * agree), 2)
+                out['flags'].append('PHENOTYPE_SENSITIVE_TO_TAU_CI')
         out['phenotype'] = phenotype
         out['phenotype_confidence'] = confidence
         out['phenotype_info'] = cls.PHENOTYPES.get(phenotype, {})
@@ -14508,6 +15803,27 @@ class Engine_E21_KineticPhenotype:
         }
         return out
 
+    @classmethod
+    def _ci_classes(cls, ci, bands):
+        """Bands covered by a τ CI [lo, hi], in band order."""
+        labels = [label for _, label in bands]
+        lo, hi = cls._classify(ci[0], bands), cls._classify(ci[1], bands)
+        return labels[labels.index(lo):labels.index(hi) + 1]
+
+    @classmethod
+    def _phenotype_ci_variants(cls, kp, lim, ftp):
+        """Phenotype for every combination of τ classes inside the CIs ([] if all bands certain)."""
+        import itertools
+        ranges = [kp.get('tau_moderate_class_range') or [kp.get('tau_moderate_class')],
+                  kp.get('tau_heavy_class_range') or [kp.get('tau_heavy_class')]]
+        if all(len(r) <= 1 for r in ranges):
+            return []
+        out = []
+        for c_mod, c_hvy in itertools.product(*ranges):
+            kv = dict(kp, tau_moderate_class=c_mod, tau_heavy_class=c_hvy)
+            out.append(cls._assign_phenotype(kv, lim, ftp)[0])
+        return out
+
     @classmethod
     def _assign_phenotype(cls, kp, lim, ftp):
         tc_mod = kp.get('tau_moderate_class')
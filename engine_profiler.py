@@ -0,0 +1,158 @@
+"""
+engine_profiler.py — Per-engine wall/CPU/memory profile of one pipeline run
+===========================================================================
+``CPET_Orchestrator`` (``cfg.profile_engines = True``) opens one section per
+engine (``_safe_run`` and the engine graph), per preprocessing step and per
+report renderer. Every section records:
+
+- ``wall_s``  — wall-clock time (``time.perf_counter``),
+- ``cpu_s``   — CPU time of the executing thread (``time.thread_time``; work
+  done in child processes, e.g. bootstrap pools, is not included),
+- ``peak_kb`` — peak Python heap allocated above the level at section entry
+  (``tracemalloc``; ``None`` when memory tracking is off or the section ran
+  concurrently with others, where a process-wide peak cannot be attributed).
+
+Nested sections are allowed: the inner section's peak is folded into the
+outer one, so resetting the tracemalloc peak does not lose the outer maximum.
+
+Usage:
+    prof = EngineProfiler(memory=True)
+    prof.start(source="test.xml")
+    with prof.section("E02", "engine") as rec:
+        ...
+        rec["status"] = "ERROR"          # optional
+    profile = prof.finish()              # JSON-serialisable dict
+    EngineProfiler.write_json(profile, "profile.json")
+"""
+
+import contextlib
+import json
+import os
+import platform
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+PROFILE_SCHEMA = 1
+
+
+class EngineProfiler:
+    """Collects sections of one run; thread-safe for the engine thread pool."""
+
+    def __init__(self, memory: bool = True):
+        self.memory = bool(memory)
+        self.sections: List[Dict[str, Any]] = []
+        self.meta: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._stack: List[Dict[str, Any]] = []   # memory-tracked sections (sequential only)
+        self._tls = threading.local()             # nesting depth per thread
+        self._own_trace = False
+        self._t0 = self._c0 = None
+
+    # ─── LIFECYCLE ───
+
+    def start(self, **meta) -> "EngineProfiler":
+        self.meta.update(meta)
+        self.meta.setdefault("started_at", datetime.now().isoformat(timespec="seconds"))
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_trace = True
+        self._t0 = time.perf_counter()
+        self._c0 = time.process_time()
+        return self
+
+    def finish(self) -> Dict[str, Any]:
+        """Stop timing (and tracemalloc, if started here) → profile dict."""
+        wall = time.perf_counter() - self._t0
+        cpu = time.process_time() - self._c0
+        peak_mb = None
+        if self._own_trace:
+            peak_mb = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+            tracemalloc.stop()
+            self._own_trace = False
+
+        top = [s for s in self.sections if s["depth"] == 0]
+        by_kind: Dict[str, Dict[str, float]] = {}
+        for s in top:
+            k = by_kind.setdefault(s["kind"], {"n": 0, "wall_s": 0.0, "cpu_s": 0.0})
+            k["n"] += 1
+            k["wall_s"] = round(k["wall_s"] + s["wall_s"], 4)
+            k["cpu_s"] = round(k["cpu_s"] + s["cpu_s"], 4)
+        return {
+            "schema": PROFILE_SCHEMA,
+            **self.meta,
+            "python": platform.python_version(),
+            "pid": os.getpid(),
+            "memory_tracking": self.memory,
+            "total_wall_s": round(wall, 4),
+            "total_cpu_s": round(cpu, 4),
+            "trace_peak_mb": peak_mb,
+            # time outside top-level sections (negative when engines ran in parallel)
+            "unaccounted_wall_s": round(wall - sum(s["wall_s"] for s in top), 4),
+            "by_kind": by_kind,
+            "slowest": [s["name"] for s in sorted(top, key=lambda s: -s["wall_s"])[:5]],
+            "sections": self.sections,
+        }
+
+    # ─── SECTIONS ───
+
+    @contextlib.contextmanager
+    def section(self, name: str, kind: str = "engine", memory: Optional[bool] = None):
+        """
+        Time one block. ``memory=False`` → timing only (use for sections that run
+        concurrently). Yields the record dict; callers may set ``rec["status"]``.
+        """
+        track = self.memory and tracemalloc.is_tracing() and (memory is None or memory)
+        depth = getattr(self._tls, "depth", 0)
+        rec: Dict[str, Any] = {"name": name, "kind": kind, "status": "OK", "depth": depth,
+                               "thread": threading.current_thread().name}
+        self._tls.depth = depth + 1
+        frame = None
+        if track:
+            cur, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+            frame = {"base": cur, "peak": cur}
+            self._stack.append(frame)
+            tracemalloc.reset_peak()
+        t0, c0 = time.perf_counter(), time.thread_time()
+        try:
+            yield rec
+        except BaseException:
+            rec["status"] = "ERROR"
+            raise
+        finally:
+            self._tls.depth = depth
+            rec["wall_s"] = round(time.perf_counter() - t0, 4)
+            rec["cpu_s"] = round(time.thread_time() - c0, 4)
+            rec["peak_kb"] = None
+            if frame is not None:
+                peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                self._stack.pop()
+                if self._stack:
+                    self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+                rec["peak_kb"] = round((peak - frame["base"]) / 1024, 1)
+            with self._lock:
+                self.sections.append(rec)
+
+    def wrap(self, name: str, fn: Callable, kind: str = "engine",
+             memory: Optional[bool] = None) -> Callable:
+        """fn → fn measured as one section (for engine-graph thread/sequential runs)."""
+        def _measured(*args, **kwargs):
+            with self.section(name, kind, memory):
+                return fn(*args, **kwargs)
+        return _measured
+
+    # ─── EXPORT ───
+
+    @staticmethod
+    def write_json(profile: Dict[str, Any], path: str) -> str:
+        """Write the profile; ``path`` = file, or existing directory → <source stem>_profile.json."""
+        if os.path.isdir(path):
+            stem = os.path.splitext(os.path.basename(str(profile.get("source") or "cpet")))[0]
+            path = os.path.join(path, f"{stem}_profile.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False, indent=1)
+        return path
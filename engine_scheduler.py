@@ -0,0 +1,108 @@
+"""
+engine_scheduler.py — Dependency-graph runner for CPET engines
+==============================================================
+``CPET_Orchestrator`` declares for every engine which earlier engines it
+reads (``CPET_Orchestrator.ENGINE_DEPS``). This module runs such a graph
+either sequentially (declaration order, as before) or on a thread/process
+pool, submitting every engine as soon as its dependencies are finished.
+
+Determinism: dependencies may only point to engines declared earlier, so the
+declaration order is always a valid sequential schedule; engine arguments are
+built only when the node becomes ready (all inputs final) and ``on_done`` runs
+in the calling thread. Error isolation: ``call_engine`` never raises — the
+exception is returned as an ``engine_errors`` entry (same shape as
+``CPET_Orchestrator._safe_run``).
+
+Usage:
+    order = run_graph(deps, build, on_done, workers=4, executor="thread")
+    # deps:    {"E01": (), "E03": ("E02",), "E15": ("*",), ...}   ("*" = all earlier)
+    # build:   engine_id -> (fn, args, kwargs)
+    # on_done: (engine_id, out, err) -> None
+"""
+
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+EngineCall = Tuple[Callable, tuple, dict]
+
+
+def call_engine(engine_id: str, fn: Callable, args: tuple = (), kwargs: dict = None):
+    """Run one engine → (out, None) or (None, {"engine", "error", "traceback"})."""
+    try:
+        return fn(*args, **(kwargs or {})), None
+    except Exception as e:
+        return None, {
+            "engine": engine_id,
+            "error": f"{type(e).__name__}: {e}",
+            "traceback": traceback.format_exc(),
+        }
+
+
+def resolve_deps(deps: Dict[str, Iterable[str]]) -> Dict[str, Tuple[str, ...]]:
+    """Expand "*" (all earlier engines) and check that deps only point backwards."""
+    order = list(deps)
+    resolved = {}
+    for i, eid in enumerate(order):
+        earlier = order[:i]
+        out: List[str] = []
+        for d in deps[eid] or ():
+            if d == "*":
+                out.extend(e for e in earlier if e not in out)
+            elif d in earlier:
+                if d not in out:
+                    out.append(d)
+            else:
+                raise ValueError(f"{eid}: dependency {d!r} is not declared before it")
+        resolved[eid] = tuple(out)
+    return resolved
+
+
+def run_graph(deps: Dict[str, Iterable[str]],
+              build: Callable[[str], EngineCall],
+              on_done: Callable[[str, Any, Optional[dict]], None],
+              workers: int = 1,
+              executor: str = "thread") -> List[str]:
+    """
+    Run the engine graph; returns engine ids in completion order.
+    ``workers <= 1`` → sequential in declaration order (no pool).
+    ``executor`` = "thread" | "process" (fn/args must be picklable for "process").
+    """
+    graph = resolve_deps(deps)
+    order = list(graph)
+    done_order: List[str] = []
+
+    if int(workers or 1) <= 1:
+        for eid in order:
+            fn, args, kwargs = build(eid)
+            out, err = call_engine(eid, fn, args, kwargs)
+            on_done(eid, out, err)
+            done_order.append(eid)
+        return done_order
+
+    pool_cls = ProcessPoolExecutor if str(executor).lower() == "process" else ThreadPoolExecutor
+    finished = set()
+    pending = {}
+    waiting = list(order)
+    with pool_cls(max_workers=int(workers)) as pool:
+        while waiting or pending:
+            # submit every ready engine, in declaration order
+            for eid in [e for e in waiting if all(d in finished for d in graph[e])]:
+                fn, args, kwargs = build(eid)
+                pending[pool.submit(call_engine, eid, fn, args, kwargs)] = eid
+                waiting.remove(eid)
+            if not pending:
+                raise RuntimeError(f"engine graph stalled: {waiting}")
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            # harvest in declaration order so on_done side effects do not depend on timing
+            for fut in sorted(done, key=lambda f: order.index(pending[f])):
+                eid = pending.pop(fut)
+                try:
+                    out, err = fut.result()
+                except Exception as e:  # pickling / broken pool
+                    out, err = None, {"engine": eid, "error": f"{type(e).__name__}: {e}",
+                                      "traceback": traceback.format_exc()}
+                on_done(eid, out, err)
+                finished.add(eid)
+                done_order.append(eid)
+    return done_order
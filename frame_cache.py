@@ -0,0 +1,169 @@
+"""
+frame_cache.py — On-disk cache of canonicalized CPET frames
+===========================================================
+Re-running the same export (manual VT overrides, lactate points, protocol
+choice) repeats XML/CSV parsing and ``DataTools.canonicalize``. This cache
+keeps the canonical frame as a Feather (Arrow IPC) file keyed by the hash
+of the source file bytes + parser/canonicalize versions, with the file
+metadata embedded in the Arrow schema.
+
+Usage:
+    from frame_cache import FrameCache
+    cache = FrameCache("/tmp/cpet_cache", max_mb=512)
+    key = cache.key_for_file("test.xml")
+    hit = cache.get(key)            # → (df, meta) or None
+    if hit is None:
+        cache.put(key, df_canon, meta)
+
+Eviction is LRU by file mtime (touched on every hit) and bounded by
+``max_mb``. Needs ``pyarrow`` (optional dependency, commented out in
+requirements.txt); without it ``enabled`` is False, every lookup is a miss
+and ``put`` is a no-op — the orchestrator warns when a cache dir is set.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+try:
+    from cortex_xml_parser import PARSER_VERSION
+except ImportError:
+    PARSER_VERSION = "0"
+
+# Bump when DataTools.canonicalize changes its output.
+CANON_VERSION = "1"
+
+_META_KEY = b"cpet_meta"
+_SUFFIX = ".feather"
+
+
+class FrameCache:
+    """Size-bounded LRU cache of canonical frames (one Feather file per test)."""
+
+    def __init__(self, cache_dir: str, max_mb: float = 512.0):
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = int(float(max_mb) * 1024 * 1024)
+
+    @property
+    def enabled(self) -> bool:
+        return feather is not None
+
+    # ---------- keys ----------
+    @staticmethod
+    def key_for_bytes(data: bytes) -> str:
+        h = hashlib.sha256()
+        h.update(f"parser={PARSER_VERSION};canon={CANON_VERSION};".encode())
+        h.update(data)
+        return h.hexdigest()
+
+    @classmethod
+    def key_for_file(cls, path: str) -> str:
+        with open(path, "rb") as f:
+            return cls.key_for_bytes(f.read())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + _SUFFIX)
+
+    # ---------- get / put ----------
+    def get(self, key: str) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            table = feather.read_table(path, memory_map=False)
+            raw_meta = (table.schema.metadata or {}).get(_META_KEY)
+            meta = json.loads(raw_meta.decode("utf-8")) if raw_meta else {}
+            df = table.to_pandas()
+        except Exception:
+            # broken/partial file — drop it and treat as a miss
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path, None)  # LRU: mark as recently used
+        except OSError:
+            pass
+        return df, meta
+
+    def put(self, key: str, df: pd.DataFrame, meta: Dict[str, Any] = None) -> bool:
+        if not self.enabled:
+            return False
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            schema_meta = dict(table.schema.metadata or {})
+            schema_meta[_META_KEY] = json.dumps(meta or {}, default=str).encode("utf-8")
+            table = table.replace_schema_metadata(schema_meta)
+
+            fd, tmp = tempfile.mkstemp(suffix=_SUFFIX + ".tmp", dir=self.cache_dir)
+            os.close(fd)
+            try:
+                feather.write_feather(table, tmp, compression="lz4")
+                os.replace(tmp, self._path(key))
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        except Exception:
+            # unsupported column types etc. — caching is best effort
+            return False
+        self.evict()
+        return True
+
+    # ---------- eviction ----------
+    def _entries(self):
+        out = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return out
+        for name in names:
+            if not name.endswith(_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            out.append((st.st_mtime, st.st_size, path))
+        return out
+
+    def size_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """Remove least recently used files until the cache fits ``max_mb``."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
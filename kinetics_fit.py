@@ -0,0 +1,341 @@
+"""
+kinetics_fit.py — Mono-exponential VO₂ kinetics fits for E14
+============================================================
+Replaces the generic ``curve_fit`` calls of ``Engine_E14_Kinetics`` with
+fits that use the structure of the models:
+
+- on-kinetics   y = b + A·(1 − e^(−(t−TD)/τ))  for t ≥ TD,  y = b before
+  (b fixed = baseline).  For fixed (τ, TD) the amplitude is linear → solved
+  in closed form (clipped to its bounds), so the (τ, TD) surface is scanned
+  on a grid in one vectorized pass;
+- off-kinetics  y = c + A·e^(−t/τ).  For fixed τ, (A, c) is a 2-parameter
+  box-constrained linear LS (exact: interior or edge solution), so only τ is
+  scanned.
+
+The best grid point (or the warm start from the previous stage/transition,
+if it profiles better) is polished with ``scipy.optimize.least_squares``
+using the analytic Jacobian. The polished point is kept only if it does not
+increase the residual sum of squares.
+
+Every fit returns ``KineticFit`` (params, rss, predicted) or raises
+``ValueError`` on non-finite data / empty bounds — the same failure modes the
+E14 callers handle for ``curve_fit``.
+
+τ uncertainty (``mc_tau_intervals``): each on-kinetics fit is refitted on
+many resampled series — moving-block bootstrap of its residuals (the
+processed VO₂ is smoothed, so residuals are autocorrelated) or Gaussian
+noise with the residual SD — on a process pool, warm-started from the point
+fit. Replicates use their own ``SeedSequence`` children, so the intervals do
+not depend on the number of workers.
+
+Usage:
+    fit = fit_on_kinetics(t, y, baseline, a_bounds=(lo, hi), warm=(tau, td))
+    A, tau, td = fit.params
+    fit = fit_off_kinetics(t, y, a_bounds=(50, 2 * amp), c_bounds=(0, peak), warm=tau)
+    A, tau, c = fit.params
+    ci = mc_tau_intervals([dict(t=t, y=y, baseline=b, a_bounds=(lo, hi), fit=fit)], n_rep=200)
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from block_bootstrap import block_indices, block_rows
+
+TAU_GRID_N = 24       # log-spaced τ grid points (coarse scan)
+TD_STEP = 2.0         # TD grid step [s] (coarse scan)
+STABLE_TAU_FRAC = 0.20  # MC refit counts as stable if |τ_b − τ| ≤ 20 % τ
+ZOOM_LEVELS = 4       # on-kinetics: refinements of the (τ, TD) grid, ÷3 per level
+ZOOM_N = 7            # grid points per axis and zoom level
+
+
+class KineticFit(NamedTuple):
+    params: Tuple[float, float, float]
+    rss: float
+    predicted: np.ndarray
+
+
+# ── models + analytic Jacobians ───────────────────────────────────────────
+
+def mono_exp_on(t, baseline, A, tau, td):
+    """b + A·(1 − e^(−(t−TD)/τ)) after TD, b before (same as the E14 np.where model)."""
+    t = np.asarray(t, dtype=float)
+    return np.where(t < td, baseline, baseline + A * (1.0 - np.exp(-(t - td) / tau)))
+
+
+def jac_on(t, A, tau, td):
+    """∂y/∂(A, τ, TD) of ``mono_exp_on`` (zero before TD)."""
+    t = np.asarray(t, dtype=float)
+    on = t >= td
+    u = np.where(on, t - td, 0.0)
+    e = np.exp(-u / tau)
+    J = np.empty((len(t), 3))
+    J[:, 0] = np.where(on, 1.0 - e, 0.0)
+    J[:, 1] = np.where(on, -A * e * u / tau ** 2, 0.0)
+    J[:, 2] = np.where(on, -A * e / tau, 0.0)
+    return J
+
+
+def mono_exp_off(t, A, tau, c):
+    """c + A·e^(−t/τ)."""
+    return c + A * np.exp(-np.asarray(t, dtype=float) / tau)
+
+
+def jac_off(t, A, tau, c):
+    """∂y/∂(A, τ, c) of ``mono_exp_off``."""
+    t = np.asarray(t, dtype=float)
+    e = np.exp(-t / tau)
+    return np.column_stack([e, A * e * t / tau ** 2, np.ones_like(t)])
+
+
+# ── helpers ───────────────────────────────────────────────────────────────
+
+def _check(t, y, bounds):
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if not (np.all(np.isfinite(t)) and np.all(np.isfinite(y))):
+        raise ValueError("array must not contain infs or NaNs")
+    for lo, hi in bounds:
+        if not lo < hi:
+            raise ValueError("Each lower bound must be strictly less than each upper bound.")
+    return t, y
+
+
+def _tau_grid(lo, hi, warm=None):
+    g = np.geomspace(lo, hi, TAU_GRID_N)
+    if warm is not None and lo <= warm <= hi:
+        g = np.append(g, warm)
+    return g
+
+
+def _polish(resid, jac, x0, lo, hi, rss0):
+    """least_squares from x0 with the analytic Jacobian; keeps x0 if not better."""
+    from scipy.optimize import least_squares
+
+    x0 = np.clip(np.asarray(x0, dtype=float), lo, hi)
+    try:
+        res = least_squares(resid, x0, jac=jac, bounds=(lo, hi), method="trf",
+                            x_scale="jac", max_nfev=200)
+    except (ValueError, np.linalg.LinAlgError):
+        return x0, rss0
+    rss = float(np.dot(res.fun, res.fun))
+    return (res.x, rss) if np.isfinite(rss) and rss <= rss0 else (x0, rss0)
+
+
+# ── on-kinetics ───────────────────────────────────────────────────────────
+
+def _profile_on(t, r, rr, taus, tds, a_bounds):
+    """Profiled RSS over a (τ, TD) grid: A solved in closed form per point → (A, rss)."""
+    u = np.maximum(t[:, None] - tds[None, :], 0.0)                    # (n, nTD)
+    g = -np.expm1(-u[:, None, :] / taus[None, :, None])                # (n, nτ, nTD)
+    gr = np.einsum("i,ijk->jk", r, g)
+    gg = np.einsum("ijk,ijk->jk", g, g)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        A = np.clip(np.where(gg > 0, gr / gg, a_bounds[0]), *a_bounds)
+    return A, rr - 2.0 * A * gr + A * A * gg
+
+
+def fit_on_kinetics(t, y, baseline: float,
+                    a_bounds: Tuple[float, float],
+                    tau_bounds: Tuple[float, float] = (3.0, 150.0),
+                    td_bounds: Tuple[float, float] = (0.0, 30.0),
+                    warm: Optional[Tuple[float, float]] = None) -> KineticFit:
+    """
+    Fit A, τ, TD of ``mono_exp_on`` with fixed baseline.
+    warm — (τ, TD) of the previous stage; added to the profile scan.
+    """
+    t, y = _check(t, y, (a_bounds, tau_bounds, td_bounds))
+    r = y - float(baseline)
+    rr = float(np.dot(r, r))
+
+    taus = _tau_grid(*tau_bounds, warm[0] if warm else None)
+    tds = np.arange(td_bounds[0], td_bounds[1] + 1e-9, TD_STEP)
+    if warm and td_bounds[0] <= warm[1] <= td_bounds[1]:
+        tds = np.append(tds, warm[1])
+    A, rss = _profile_on(t, r, rr, taus, tds, a_bounds)
+    j, k = np.unravel_index(int(np.argmin(rss)), rss.shape)
+    x0, rss0 = (float(A[j, k]), float(taus[j]), float(tds[k])), float(rss[j, k])
+
+    # TD is a kink parameter (RSS is only piecewise smooth in TD), so the
+    # basin is located by zooming the profiled grid before the local polish
+    h_tau, h_td = np.log(taus.max() / taus.min()) / len(taus), TD_STEP
+    for _ in range(ZOOM_LEVELS):
+        zt = np.clip(x0[1] * np.exp(np.linspace(-h_tau, h_tau, ZOOM_N)), *tau_bounds)
+        zd = np.clip(x0[2] + np.linspace(-h_td, h_td, ZOOM_N), *td_bounds)
+        A, rss = _profile_on(t, r, rr, zt, zd, a_bounds)
+        j, k = np.unravel_index(int(np.argmin(rss)), rss.shape)
+        if rss[j, k] < rss0:
+            x0, rss0 = (float(A[j, k]), float(zt[j]), float(zd[k])), float(rss[j, k])
+        h_tau, h_td = h_tau / 3.0, h_td / 3.0
+
+    lo = np.array([a_bounds[0], tau_bounds[0], td_bounds[0]], dtype=float)
+    hi = np.array([a_bounds[1], tau_bounds[1], td_bounds[1]], dtype=float)
+    x, rss_best = _polish(
+        lambda p: mono_exp_on(t, baseline, *p) - y,
+        lambda p: jac_on(t, *p),
+        x0, lo, hi, rss0)
+    A_fit, tau_fit, td_fit = (float(v) for v in x)
+    return KineticFit((A_fit, tau_fit, td_fit), rss_best,
+                      mono_exp_on(t, baseline, A_fit, tau_fit, td_fit))
+
+
+# ── off-kinetics ──────────────────────────────────────────────────────────
+
+def _box_ls_2(S_e, S_ee, S_y, S_ey, n, a_bounds, c_bounds):
+    """
+    min Σ(y − c − A·e)² over A ∈ a_bounds, c ∈ c_bounds, vectorized over τ.
+    Convex 2-D QP: the optimum is the interior solution or on one of the four edges.
+    """
+    def rss(A, c):
+        return (-2 * A * S_ey - 2 * c * S_y + A * A * S_ee + 2 * A * c * S_e + n * c * c)
+
+    cand = []
+    det = n * S_ee - S_e * S_e
+    with np.errstate(divide="ignore", invalid="ignore"):
+        A_u = (n * S_ey - S_e * S_y) / det
+        c_u = (S_y - A_u * S_e) / n
+        ok = (det > 0) & (A_u >= a_bounds[0]) & (A_u <= a_bounds[1]) \
+            & (c_u >= c_bounds[0]) & (c_u <= c_bounds[1])
+        cand.append((np.where(ok, A_u, np.nan), np.where(ok, c_u, np.nan)))
+        for A_b in a_bounds:
+            A_e = np.full_like(S_e, A_b)
+            cand.append((A_e, np.clip((S_y - A_e * S_e) / n, *c_bounds)))
+        for c_b in c_bounds:
+            c_e = np.full_like(S_e, c_b)
+            cand.append((np.clip(np.where(S_ee > 0, (S_ey - c_e * S_e) / S_ee, a_bounds[0]), *a_bounds), c_e))
+    As = np.stack([a for a, _ in cand])
+    cs = np.stack([c for _, c in cand])
+    f = np.where(np.isfinite(As), rss(As, cs), np.inf)
+    best = np.argmin(f, axis=0)
+    cols = np.arange(As.shape[1])
+    return As[best, cols], cs[best, cols]
+
+
+def fit_off_kinetics(t, y,
+                     a_bounds: Tuple[float, float],
+                     c_bounds: Tuple[float, float],
+                     tau_bounds: Tuple[float, float] = (5.0, 500.0),
+                     warm: Optional[float] = None) -> KineticFit:
+    """
+    Fit A, τ, c of ``mono_exp_off``.
+    warm — τ of the previous transition; added to the τ scan.
+    """
+    t, y = _check(t, y, (a_bounds, tau_bounds, c_bounds))
+    taus = _tau_grid(*tau_bounds, warm)
+    E = np.exp(-t[:, None] / taus[None, :])                             # (n, nτ)
+    n = float(len(t))
+    S_e = E.sum(axis=0)
+    S_ee = np.einsum("ij,ij->j", E, E)
+    S_y = np.full_like(S_e, y.sum())
+    S_ey = y @ E
+    A, c = _box_ls_2(S_e, S_ee, S_y, S_ey, n, a_bounds, c_bounds)
+    rss = np.sum((y[:, None] - c[None, :] - A[None, :] * E) ** 2, axis=0)
+    j = int(np.argmin(rss))
+    x0 = (float(A[j]), float(taus[j]), float(c[j]))
+
+    lo = np.array([a_bounds[0], tau_bounds[0], c_bounds[0]], dtype=float)
+    hi = np.array([a_bounds[1], tau_bounds[1], c_bounds[1]], dtype=float)
+    x, rss_best = _polish(
+        lambda p: mono_exp_off(t, *p) - y,
+        lambda p: jac_off(t, *p),
+        x0, lo, hi, float(rss[j]))
+    A_fit, tau_fit, c_fit = (float(v) for v in x)
+    return KineticFit((A_fit, tau_fit, c_fit), rss_best, mono_exp_off(t, A_fit, tau_fit, c_fit))
+
+
+# ── Monte Carlo τ intervals ───────────────────────────────────────────────
+
+def _mc_chunk(job) -> List[float]:
+    """Refit one on-kinetics task on a chunk of resampled series → list of τ (NaN = failed)."""
+    task, seeds, method, block = job
+    t, y = task["t"], task["y"]
+    pred = task["fit"].predicted
+    resid = y - pred
+    sd = float(np.std(resid))
+    A0, tau0, td0 = task["fit"].params
+    taus = []
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        if method == "noise":
+            y_b = pred + rng.normal(0.0, sd, len(y))
+        else:
+            y_b = pred + resid[block_indices(len(y), block, rng)]
+        try:
+            f = fit_on_kinetics(t, y_b, task["baseline"], task["a_bounds"],
+                                task.get("tau_bounds", (3.0, 150.0)),
+                                task.get("td_bounds", (0.0, 30.0)), warm=(tau0, td0))
+            taus.append(f.params[1])
+        except ValueError:
+            taus.append(np.nan)
+    return taus
+
+
+def _summarize_taus(taus: np.ndarray, tau0: float, tau_bounds, ci_level: float) -> Dict[str, Any]:
+    ok = np.isfinite(taus)
+    v = taus[ok]
+    out = {"tau_mc_n": int(len(taus)), "tau_mc_ok": int(ok.sum()), "tau_ci_level": float(ci_level),
+           "tau_ci_lo_s": None, "tau_ci_hi_s": None, "tau_sd_s": None,
+           "tau_stability": None, "tau_at_bound_pct": None}
+    if len(v) < 2:
+        return out
+    q = 50.0 * (1.0 - ci_level), 50.0 * (1.0 + ci_level)
+    lo, hi = np.percentile(v, q)
+    at_bound = (v <= tau_bounds[0] * 1.001) | (v >= tau_bounds[1] * 0.999)
+    out.update(tau_ci_lo_s=round(float(lo), 1), tau_ci_hi_s=round(float(hi), 1),
+               tau_sd_s=round(float(np.std(v, ddof=1)), 2),
+               tau_stability=round(float(np.mean(np.abs(v - tau0) <= STABLE_TAU_FRAC * tau0)), 3),
+               tau_at_bound_pct=round(100.0 * float(at_bound.mean()), 1))
+    return out
+
+
+def mc_tau_intervals(tasks: List[Dict[str, Any]], n_rep: int = 200, method: str = "block",
+                     block_sec: float = 20.0, workers: int = 0, seed: int = 0,
+                     ci_level: float = 0.95) -> List[Dict[str, Any]]:
+    """
+    Percentile CI of τ for every on-kinetics fit in ``tasks``.
+
+    task      — dict(t, y, baseline, a_bounds, fit[, tau_bounds, td_bounds]),
+                ``fit`` = KineticFit returned by ``fit_on_kinetics`` for (t, y)
+    method    — "block" (moving-block residual bootstrap, ``block_sec``) | "noise"
+    workers   — process pool size; 0 → os.cpu_count(), 1 → in-process
+                (use 1 inside another pool: cpet_batch workers, engine_workers > 1)
+    Returns one dict per task: tau_ci_lo_s / tau_ci_hi_s / tau_sd_s,
+    tau_stability (share of refits within ±20 % of τ), tau_at_bound_pct.
+    """
+    n_rep = int(n_rep)
+    if not tasks or n_rep <= 0:
+        return [{} for _ in tasks]
+    method = "noise" if str(method).lower() == "noise" else "block"
+    task_seeds = np.random.SeedSequence(int(seed)).spawn(len(tasks))
+
+    workers = int(workers or 0) or (os.cpu_count() or 1)
+    workers = max(1, min(workers, n_rep * len(tasks)))
+    n_chunks = max(1, -(-4 * workers // len(tasks)))  # ~4 jobs per worker overall
+    jobs, owner = [], []
+    for k, task in enumerate(tasks):
+        task = dict(task, t=np.asarray(task["t"], dtype=float), y=np.asarray(task["y"], dtype=float))
+        dt = float(np.median(np.diff(task["t"]))) if len(task["t"]) > 1 else 1.0
+        block = block_rows(block_sec, dt)
+        seeds = task_seeds[k].spawn(n_rep)
+        for c in np.array_split(np.arange(n_rep), min(n_chunks, n_rep)):
+            jobs.append((task, [seeds[i] for i in c], method, block))
+            owner.append(k)
+
+    if workers == 1:
+        parts = [_mc_chunk(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_mc_chunk, jobs))
+
+    taus: List[List[float]] = [[] for _ in tasks]
+    for k, part in zip(owner, parts):
+        taus[k].extend(part)
+    out = []
+    for k, task in enumerate(tasks):
+        res = _summarize_taus(np.asarray(taus[k], dtype=float), task["fit"].params[1],
+                              task.get("tau_bounds", (3.0, 150.0)), ci_level)
+        res["tau_mc_method"] = method
+        out.append(res)
+    return out
@@ -7,6 +7,11 @@ for _pname, _psegs in RAW_PROTOCOLS.items():
 # 5. ORCHESTRATOR (CALC_ONLY + TRAINER_CANON)
 # ==========================================
 
+from cpet_logging import get_logger
+
+_log = get_logger("pipeline")
+
+
 class CPET_Orchestrator:
     def __init__(self, config: AnalysisConfig):
         self.cfg = config
@@ -56,7 +61,8 @@ class CPET_Orchestrator:
             self._qc_log.setdefault("engine_errors", []).append({
                 "engine": engine_id, "error": err_msg, "traceback": tb_str
             })
-            print(f"  ⚠️ {engine_id} ERROR: {err_msg}")
+            get_logger(f"engine.{engine_id}").warning("  ⚠️ %s ERROR: %s", engine_id, err_msg,
+                                                      extra={"engine": engine_id})
             return {"status": "ERROR", "reason": err_msg, "traceback": tb_str}
 
     # ---------- manual VT override ----------
@@ -109,11 +115,12 @@ class CPET_Orchestrator:
             if "flags" not in e02: e02["flags"] = []
             e02["flags"].append(f"MANUAL_OVERRIDE_{vt.upper()}")
             m, s = int(vt_sec // 60), int(vt_sec % 60)
-            print(f"  \u2705 {vt.upper()} MANUAL: t={m}:{s:02d} | HR={hr} | VO2={vo2} | Speed={e02[f'{vt}_speed_kmh']}")
+            _log.info("  \u2705 %s MANUAL: t=%d:%02d | HR=%s | VO2=%s | Speed=%s",
+                      vt.upper(), m, s, hr, vo2, e02[f"{vt}_speed_kmh"], extra={"engine": "E02"})
         if vt1_t and vt2_t: e02["confidence"] = "MANUAL"
         e02["status"] = "OK"
         self.results["E02"] = e02
-        print("  \u26A1 Progi nadpisane (manual > auto)")
+        _log.info("  \u26A1 Progi nadpisane (manual > auto)", extra={"engine": "E02"})
 
     # ---------- new outputs ----------
     def build_outputs(self) -> dict:
@@ -561,9 +568,8 @@ class CPET_Orchestrator:
                         f"{', '.join(confirmations)}."
                     )
                     
-                    print(f"  🔄 FEEDBACK: VT2 adjusted "
-                          f"{fb_log['vt2_original']['time_sec']:.0f}s → {new_t:.0f}s "
-                          f"({n_sources} sources)")
+                    _log.info("  🔄 FEEDBACK: VT2 adjusted %.0fs → %.0fs (%s sources)",
+                              fb_log["vt2_original"]["time_sec"], new_t, n_sources)
                     
                 except Exception as ex:
                     fb_log["error"] = str(ex)
@@ -678,7 +684,7 @@ class CPET_Orchestrator:
                                 f"VT2 via E18: {orig_vt2:.0f}→{new_t:.0f}s "
                                 f"(Δ{new_t-orig_vt2:+.0f}s). LT2={lt2_time:.0f}s+{cstr}")
                             
-                            print(f"  🔄 FEEDBACK(E18): VT2 {orig_vt2:.0f}→{new_t:.0f}s ({tot} src)")
+                            _log.info("  🔄 FEEDBACK(E18): VT2 %.0f→%.0fs (%s src)", orig_vt2, new_t, tot)
                         except Exception as ex:
                             fb_log.setdefault("errors", []).append(str(ex))
 
@@ -905,10 +911,10 @@ class CPET_Orchestrator:
         self.results["_performance_context"] = ctx
         
         if ctx.get("interpretation"):
-            print(f"  📊 CONTEXT: {ctx['interpretation']}")
+            _log.info("  📊 CONTEXT: %s", ctx["interpretation"])
 
     def process_file(self, filename: str) -> Dict[str, Any]:
-        print(f"\n🚀 START PIPELINE: Analiza pliku '{filename}'")
+        _log.info("\n🚀 START PIPELINE: Analiza pliku '%s'", filename, extra={"source": str(filename)})
         self.results = {}
 
         # 0-3 preprocessing
@@ -945,7 +951,7 @@ class CPET_Orchestrator:
             df_patched = DataTools.apply_protocol(self.raw, segments) if segments else self.raw
             self.processed = DataTools.smooth(df_patched, self.cfg)
         except Exception as e:
-            print(f"❌ ERROR (Import/Preproc): {e}")
+            _log.error("❌ ERROR (Import/Preproc): %s", e)
             return {"fatal_error": str(e)}
 
         # E00
@@ -1013,8 +1019,10 @@ class CPET_Orchestrator:
             {"_df_processed": self.processed, "_acfg": self.cfg})
         # E14 diagnostic
         _e14r = self.results.get("E14", {})
-        print(f"  🔬 E14 result: mode={_e14r.get('mode','?')}, status={_e14r.get('status','?')}, stages={len(_e14r.get('stages',[]))}")
-        print(f"  🔬 Config: protocol={self.cfg.protocol_name}, speeds={getattr(self.cfg, 'kinetics_speeds_kmh', 'MISSING')}")
+        _log.debug("  🔬 E14 result: mode=%s, status=%s, stages=%d",
+                   _e14r.get("mode", "?"), _e14r.get("status", "?"), len(_e14r.get("stages", [])), extra={"engine": "E14"})
+        _log.debug("  🔬 Config: protocol=%s, speeds=%s",
+                   self.cfg.protocol_name, getattr(self.cfg, "kinetics_speeds_kmh", "MISSING"), extra={"engine": "E14"})
         self.results["E15"] = self._safe_run("E15", Engine_E15_Normalization.run, self.results, self.cfg.body_mass_kg, getattr(self.cfg, "age_y", None), getattr(self.cfg, "sex", "male"), getattr(self.cfg, "modality", "run"), getattr(self.cfg, "height_cm", None))
 
         # E18: VT↔LT Cross-Validation (requires E02 + E11)
@@ -1098,25 +1106,25 @@ class CPET_Orchestrator:
             _e14_mode = e14_data.get('mode', 'NONE')
             _e14_stages = len(e14_data.get('stages', []))
             _is_kin_proto = 'KINET' in self.cfg.protocol_name or 'CWR' in self.cfg.protocol_name
-            print(f"  🔬 Kinetics check: E14.mode={_e14_mode}, stages={_e14_stages}, proto={self.cfg.protocol_name}, is_kin={_is_kin_proto}")
+            _log.debug("  🔬 Kinetics check: E14.mode=%s, stages=%d, proto=%s, is_kin=%s",
+                       _e14_mode, _e14_stages, self.cfg.protocol_name, _is_kin_proto)
             if (_e14_mode == 'CWR_KINETICS' and e14_data.get('stages')) or (_is_kin_proto and _e14_stages > 0):
                 from report import render_kinetics_report, generate_kinetics_charts, inject_kinetics_charts
                 _kin_ct = dict(canon_table) if canon_table else {}
                 _kin_ct['sport'] = getattr(self.cfg, 'sport', '') or getattr(self.cfg, 'modality', 'run') or 'run'
                 html_report_kinetics = render_kinetics_report(self.results, _kin_ct, self.processed)
-                print(f"  🔬 Kinetics report rendered: {len(html_report_kinetics)} chars")
+                _log.debug("  🔬 Kinetics report rendered: %d chars", len(html_report_kinetics))
                 # Generate and inject charts
                 _kin_charts = generate_kinetics_charts(self.processed, self.results)
                 if _kin_charts:
                     html_report_kinetics = inject_kinetics_charts(html_report_kinetics, _kin_charts)
-                    print(f"  🔬 Kinetics charts injected: {list(_kin_charts.keys())}")
+                    _log.debug("  🔬 Kinetics charts injected: %s", list(_kin_charts))
             else:
-                print(f"  🔬 Kinetics report SKIPPED: mode={_e14_mode}, stages={_e14_stages}")
+                _log.debug("  🔬 Kinetics report SKIPPED: mode=%s, stages=%d", _e14_mode, _e14_stages)
         except Exception as e:
             import traceback as _tbb
             _tb_str = _tbb.format_exc()
-            print(f"⚠️ Kinetics report generation error: {e}")
-            print(_tb_str)
+            _log.warning("⚠️ Kinetics report generation error: %s\n%s", e, _tb_str)
             # Produce ERROR HTML so the user can SEE the traceback in the UI
             html_report_kinetics = f"""<!DOCTYPE html><html><head><meta charset="utf-8">
 <style>body{{font-family:monospace;padding:20px;background:#1e1e1e;color:#f0f0f0;}}
@@ -1160,11 +1168,11 @@ speeds = {getattr(self.cfg, 'kinetics_speeds_kmh', 'MISSING')}</p>
     def save_html_report(self, path: str = None):
         """Save HTML report to file. If path is None, auto-generate from athlete name."""
         if not hasattr(self, '_last_report') or not self._last_report:
-            print("⚠️ Najpierw uruchom process_file().")
+            _log.warning("⚠️ Najpierw uruchom process_file().")
             return None
         html = self._last_report.get('html_report', '')
         if not html or html.startswith('[RAPORT'):
-            print("⚠️ Raport HTML niedostępny.")
+            _log.warning("⚠️ Raport HTML niedostępny.")
             return None
         if path is None:
             name = getattr(self.cfg, 'athlete_name', 'athlete').replace(' ', '_')
@@ -1192,5 +1200,5 @@ speeds = {getattr(self.cfg, 'kinetics_speeds_kmh', 'MISSING')}</p>
 </html>"""
         with open(path, 'w', encoding='utf-8') as f:
             f.write(full_html)
-        print(f"✅ Raport HTML zapisany: {path}")
+        _log.info("✅ Raport HTML zapisany: %s", path)
         return path
@@ -1,6 +1,9 @@
 # =========
 import numpy as np
 import pandas as pd
+from cpet_logging import get_logger
+
+_log = get_logger("report")
 
 # Lazy import to avoid circular dependency
 try:
@@ -5193,7 +5196,7 @@ KONIEC RAPORTU (v1.1 T12)
 """
         return report
 
-print("✅ Komórka 4: Report Adapter (FULL T12 TEMPLATE RESTORED) załadowana.")
+_log.debug("✅ Komórka 4: Report Adapter (FULL T12 TEMPLATE RESTORED) załadowana.")
 
 # ═══════════════════════════════════════════════════════════════
 # KINETICS REPORT
@@ -6659,8 +6662,7 @@ def generate_kinetics_charts(df, results):
         except: pass
 
     except Exception as _chart_err:
-        print(f"⚠️ generate_kinetics_charts error: {_chart_err}")
-        import traceback; traceback.print_exc()
+        _log.warning("⚠️ generate_kinetics_charts error: %s", _chart_err, exc_info=True)
     return charts
 
 
@@ -6708,4 +6710,4 @@ def inject_kinetics_charts(html, charts):
                 f'<div class="card"><div class="section-title">Aerobic Fitness Fingerprint</div>{c6}')
     return html
 
-print("\u2705 Kinetics Report module (render + charts + inject) za\u0142adowany.")
+_log.debug("\u2705 Kinetics Report module (render + charts + inject) za\u0142adowany.")
@@ -0,0 +1,218 @@
+"""
+vt_bootstrap.py — Block-bootstrap confidence intervals for VT1/VT2
+==================================================================
+E02 returns one consensus VT1/VT2 with a categorical confidence. This module
+estimates the sampling uncertainty of that detection:
+
+1. the raw (unsmoothed) breath-by-breath frame is split into a trend
+   (centred rolling median, ``TREND_SEC``) and residuals,
+2. each replicate keeps the trend and the time axis and draws residual rows
+   in moving blocks of ``block_sec`` (one block index for all gas/HR signals,
+   so breath-level cross-correlation and short-range autocorrelation stay),
+3. the replicate goes through the same ``DataTools.smooth`` → t_stop cut →
+   ``Engine_E02_Thresholds_v4.run`` path as the pipeline (without the file
+   metadata fallback, which would pin the result),
+4. percentile CIs of VT time, HR, VO2 and speed are taken over replicates.
+
+Replicates run on a process pool (``workers``); every replicate has its own
+``SeedSequence`` child, so results do not depend on the number of workers.
+
+Usage:
+    from vt_bootstrap import bootstrap_vt
+    boot = bootstrap_vt(df_patched, cfg, e00, n_boot=200, workers=4, point=e02)
+    boot["vt1"]["time_sec"]   # {"point", "median", "lo", "hi", "sd"}
+    attach_point(boot, e02_final)   # re-point after later E02 edits (feedback loop)
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from block_bootstrap import block_indices, block_rows
+
+# Columns perturbed by the bootstrap (every alias E02/DataTools.smooth may read).
+# Time, speed and power are protocol-driven and stay as recorded.
+SIGNAL_COLS = [
+    "VO2_mlmin", "VO2_ml_min", "VO2_L_min", "VO2_Lmin", "VO2",
+    "VCO2_mlmin", "VCO2_ml_min", "VCO2_L_min", "VCO2_Lmin", "VCO2",
+    "VE_Lmin", "VE_L_min", "VE_lmin", "VE",
+    "HR_bpm", "HR", "RER", "O2Pulse",
+    "PetO2_mmHg", "PETO2_mmHg", "PetCO2_mmHg", "PETCO2_mmHg",
+    "V'E/V'O2", "V'E/V'CO2", "ExCO2",
+]
+
+# result field → E02 key template
+VT_FIELDS = {
+    "time_sec": "{vt}_time_sec",
+    "hr": "{vt}_hr",
+    "vo2_mlmin": "{vt}_vo2_mlmin",
+    "speed_kmh": "{vt}_speed_kmh",
+}
+
+TREND_SEC = 30.0        # = Engine_E02_Thresholds_v4.SMOOTH_WINDOW_SEC
+MIN_VALID = 10          # fewer successful replicates → no CI for that threshold
+
+_STATE: Dict[str, Any] = {}   # per-process replicate context (set by _init_worker)
+
+
+def split_trend(df: pd.DataFrame, cols: List[str], trend_sec: float = TREND_SEC):
+    """Centred rolling-median trend and residuals of ``cols`` → (dt, trend, resid)."""
+    from engine_core import DataTools
+
+    t = pd.to_numeric(df["Time_sec"], errors="coerce").to_numpy(dtype=float)
+    dt = float(np.nanmedian(np.diff(t))) if len(t) > 2 else np.nan
+    if not np.isfinite(dt) or dt <= 0:
+        dt = 1.0
+    X = np.column_stack([pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float) for c in cols])
+    trend = DataTools.rolling_median_centered(X, max(3, int(round(trend_sec / dt))))
+    return dt, trend, X - trend
+
+
+def _init_worker(state: Dict[str, Any]) -> None:
+    _STATE.clear()
+    _STATE.update(state)
+
+
+def _run_replicate(seed: np.random.SeedSequence) -> Dict[str, Optional[float]]:
+    from engine_core import DataTools, Engine_E02_Thresholds_v4, cow_copy
+
+    st = _STATE
+    df = st["df"]
+    idx = block_indices(len(df), st["block"], np.random.default_rng(seed))
+    rep = cow_copy(df)
+    rep[st["cols"]] = pd.DataFrame(st["trend"] + st["resid"][idx], columns=st["cols"], index=df.index)
+
+    proc = DataTools.smooth(rep, st["cfg"])
+    ex = proc[proc["Time_sec"] <= st["t_stop"]]
+    res = Engine_E02_Thresholds_v4.run(ex, st["e00"], None, smooth_mode=st["smooth_mode"])
+
+    rec = {}
+    for vt in ("vt1", "vt2"):
+        for name, key in VT_FIELDS.items():
+            v = res.get(key.format(vt=vt))
+            try:
+                v = float(v)
+            except (TypeError, ValueError):
+                v = np.nan
+            rec[f"{vt}_{name}"] = v if np.isfinite(v) else np.nan
+    return rec
+
+
+def _run_chunk(seeds: List[np.random.SeedSequence]) -> List[Dict[str, Optional[float]]]:
+    return [_run_replicate(s) for s in seeds]
+
+
+def summarize(records: List[Dict[str, float]], point: Dict[str, Any] = None,
+              ci_level: float = 0.95) -> Dict[str, Any]:
+    """Percentile CI per threshold/field over replicates (NaN = threshold not found)."""
+    point = point or {}
+    n = len(records)
+    q_lo, q_hi = 50.0 * (1.0 - ci_level), 50.0 * (1.0 + ci_level)
+    out = {}
+    for vt in ("vt1", "vt2"):
+        t = np.array([r[f"{vt}_time_sec"] for r in records], dtype=float)
+        ok = np.isfinite(t)
+        block = {"n_valid": int(ok.sum()), "detect_rate": round(float(ok.mean()), 3) if n else None}
+        for name, key in VT_FIELDS.items():
+            v = np.array([r[f"{vt}_{name}"] for r in records], dtype=float)[ok]
+            v = v[np.isfinite(v)]
+            p = point.get(key.format(vt=vt))
+            entry = {"point": p, "median": None, "lo": None, "hi": None, "sd": None}
+            if len(v) >= MIN_VALID:
+                lo, med, hi = np.percentile(v, [q_lo, 50.0, q_hi])
+                entry.update(median=round(float(med), 2), lo=round(float(lo), 2),
+                             hi=round(float(hi), 2), sd=round(float(np.std(v, ddof=1)), 2))
+            block[name] = entry
+        out[vt] = block
+    return out
+
+
+def bootstrap_vt(df: pd.DataFrame, cfg, e00: Dict[str, Any],
+                 n_boot: int = 200, block_sec: float = 30.0,
+                 workers: int = 0, seed: int = 0, ci_level: float = 0.95,
+                 point: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Block-bootstrap CIs for VT1/VT2.
+
+    df        — frame before smoothing (DataTools.apply_protocol output)
+    cfg       — AnalysisConfig (smoothing settings are reused per replicate)
+    e00       — E00 result (t_stop is kept fixed)
+    workers   — process pool size; 0 → os.cpu_count(), 1 → in-process
+                (use 1 inside another pool, e.g. cpet_batch workers)
+    point     — E02 result, copied as "point" next to each CI (``attach_point``);
+                the orchestrator attaches the final E02 after its feedback loop
+    """
+    t0 = time.perf_counter()
+    n_boot = int(n_boot)
+    cols = [c for c in SIGNAL_COLS if c in df.columns]
+    if n_boot <= 0 or not cols or "Time_sec" not in df.columns or not e00 or "t_stop" not in e00:
+        return {"status": "SKIPPED", "reason": "no replicates, signals, Time_sec or t_stop"}
+
+    df = df.sort_values("Time_sec").reset_index(drop=True)
+    dt, trend, resid = split_trend(df, cols)
+    state = {
+        "df": df, "cols": cols, "trend": trend, "resid": resid,
+        "block": block_rows(block_sec, dt),
+        "cfg": cfg, "e00": e00, "t_stop": float(e00["t_stop"]),
+        "smooth_mode": getattr(cfg, "smooth_mode", None),
+    }
+    seeds = np.random.SeedSequence(int(seed)).spawn(n_boot)
+
+    workers = int(workers or 0) or (os.cpu_count() or 1)
+    workers = max(1, min(workers, n_boot))
+    if workers == 1:
+        _init_worker(state)
+        try:
+            records = _run_chunk(seeds)
+        finally:
+            _STATE.clear()
+    else:
+        # ~4 chunks per worker: small enough to balance, large enough to amortise IPC
+        n_chunks = min(n_boot, 4 * workers)
+        chunks = [list(c) for c in np.array_split(np.arange(n_boot), n_chunks)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(state,)) as pool:
+            parts = pool.map(_run_chunk, [[seeds[i] for i in c] for c in chunks])
+            records = [rec for part in parts for rec in part]
+
+    out = {
+        "status": "OK",
+        "method": "moving_block_residual_bootstrap",
+        "n_boot": n_boot,
+        "block_sec": float(block_sec),
+        "trend_sec": TREND_SEC,
+        "ci_level": float(ci_level),
+        "seed": int(seed),
+        "workers": workers,
+    }
+    out.update(summarize(records, None, ci_level))
+    out["flags"] = [f"{vt.upper()}_TOO_FEW_REPLICATES" for vt in ("vt1", "vt2")
+                    if out[vt]["n_valid"] < MIN_VALID]
+    out["elapsed_sec"] = round(time.perf_counter() - t0, 2)
+    return attach_point(out, point) if point else out
+
+
+def attach_point(boot: Dict[str, Any], point: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy the reported VT values of ``point`` (final E02 result) next to each CI
+    and flag points the replicates do not describe: manual VTs and VTs moved
+    by the orchestrator feedback loop (replicates rerun auto-detection only).
+    """
+    if boot.get("status") != "OK":
+        return boot
+    point = point or {}
+    flags = [f for f in boot.get("flags", []) if f.endswith("_TOO_FEW_REPLICATES")]
+    for vt in ("vt1", "vt2"):
+        for name, key in VT_FIELDS.items():
+            boot[vt][name]["point"] = point.get(key.format(vt=vt))
+        source = str(point.get(f"{vt}_source") or "")
+        if source == "manual":
+            flags.append(f"{vt.upper()}_MANUAL_CI_IS_AUTO_DETECTION")
+        elif source.startswith("feedback_adjusted"):
+            flags.append(f"{vt.upper()}_FEEDBACK_ADJUSTED_CI_IS_PRE_FEEDBACK")
+    boot["flags"] = flags
+    return boot